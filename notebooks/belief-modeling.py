@@ -2,6 +2,9 @@
 
 import numpy as np
 import numpy.typing as npt
+from scipy.sparse import csr_matrix
+
+from social_dynamics.beliefs import boltzmann, social_field
 
 # %% Toy example
 
@@ -45,3 +48,9 @@ h = (1 - w) * d_ind + w * d_soc
 boltzmann_factors = np.exp(-beta * h)
 partition_functions = np.sum(boltzmann_factors, axis=1)
 sigma = boltzmann_factors / partition_functions[:, np.newaxis]
+
+# %% Same update with the vectorized kernel, social field from the network
+
+beliefs = np.array([0, 1, 0])  # Focal beliefs of the toy, as belief indices
+h_soc = social_field(csr_matrix(connections), beliefs, n_beliefs)
+probs = boltzmann(h_ind, h_soc, w, beta)
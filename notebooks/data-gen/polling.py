@@ -4,8 +4,13 @@ import typing as t
 
 import numpy as np
 import numpy.typing as npt
+import polars as pl
 from scipy.io import loadmat
 
+from social_dynamics.beliefs import sample, update
+from social_dynamics.results import ResultsWriter
+from social_dynamics.wiring import capacities, wire
+
 # %% Load data
 
 
@@ -74,72 +79,25 @@ values = np.column_stack(
 # Normalize each voter characteristic column with Z-score
 values = (values - np.nanmean(values, axis=0)) / np.sqrt(np.nanvar(values, axis=0))
 
-difs = np.zeros((n, n))  # Distance between each pair of voters
-sims = np.zeros((n, n))  # Similarity between each pair of voters
-
-# Calculate absolute difference between each voter and each other voter
-for i in range(n):
-    difs[i, :] = np.mean(np.abs(values - values[i]), axis=1)
-    sims[i, :] = 1 / difs[i, :]
-
-# Square differences to emphasize larger similarities and devalue smaller
-if xhom == 1:
-    sims = sims**2
-
-sims[sims == np.inf] = 0  # Similarity to self set to 0 so that self is not chosen
-
-# Calculate the number of connections each voter should have in each category based on their reported social circle's beliefs
-remcon = np.zeros((4, n), dtype=int)
-
-remcon[0] = np.round(k * s_soc_p[:, 0] / 100).astype(int)  # R
-remcon[1] = np.round(k * s_soc_p[:, 1] / 100).astype(int)  # D
-remcon[2] = np.round(k * s_soc_p[:, 2] / 100).astype(int)  # O
-remcon[3] = np.round(k - np.sum([remcon[0], remcon[1], remcon[2]], axis=0)).astype(
-    int
-)  # Non voting
-
-while True:
-    conn = np.zeros((n, n))  # Create connection matrix
-
-    # For each voter
-    for voter_idx in range(n):
-        # For each category of belief
-        for g in range(on):
-            pop = np.arange(n)  # Population to choose contacts from
-
-            # Filter population to only include voters who have same belief as the voter and have capacity
-            pop = pop[(s_own_p[:, g] != 0) & (remcon[g] != 0)]
-
-            # Voter's similarities to every contact that made it through the filter
-            sims_pop = sims[voter_idx, pop]
-
-            # If there are enough potential contacts and the voter has capacity
-            if len(pop) > remcon[g][voter_idx] and remcon[g][voter_idx] > 0:
-                # Randomly select contacts
-                temp = np.random.choice(
-                    pop,
-                    size=remcon[g][voter_idx],
-                    replace=True,
-                    p=sims_pop / np.sum(sims_pop),
-                )
-
-                temp = np.unique(temp)  # Remove repetitions
-                conn[voter_idx, temp] = 1
-                conn[temp, voter_idx] = 1  # connections established
-                remcon[g][voter_idx] -= len(temp)  # i loses capacity for j-type others
-                for jj in range(4):  # others lose capacity for whatever type i is
-                    if s_own_p[:, jj][voter_idx] == 1:  # if i was j kind of person
-                        remcon[jj][temp] -= 1
-
-    # Check if every voter has at least one connection
-    a = np.sum(conn, axis=1)
-
-    # If network is fully connected, return
-    if np.sum(a == 0) == 0:
-        break
+# Number of connections each voter should have in each category (R, D, O, non
+# voting) based on their reported social circle's beliefs
+remcon = capacities(s_soc_p, k)
+
+# Similarity-weighted contacts among voters with each belief and capacity left,
+# with similarity 1 / mean absolute difference (squared to emphasize larger
+# similarities with pronounced homophily). Every voter is a candidate at this n;
+# for large n, lower n_candidates. Isolated voters are linked to a similar voter
+conn = wire(
+    values,
+    s_own_p[:, :on] > 0,
+    remcon,
+    power=2 if xhom == 1 else 1,
+    n_candidates=n,
+    seed=0,
+)
 
 # Calculate the sum of each row in the connection matrix
-row_sums = np.sum(conn, axis=1)
+row_sums = np.asarray(conn.sum(axis=1)).ravel()
 
 # %% Save data
 
@@ -150,7 +108,16 @@ row_sums = np.sum(conn, axis=1)
 #             if conn[i, j] == 1:
 #                 f.write(f"{i},{j}\n")
 
-np.savetxt("../../data/polling/net-structure.txt", conn)
+# Network as CSR, then each day's beliefs and probabilities as the dynamics run
+results = ResultsWriter(
+    "../../data/polling/run.h5",
+    n,
+    on,
+    attrs={"xhom": xhom, "xsocag": xsocag, "xevents": xevents, "w": w, "beta": beta},
+    probs=True,
+)
+results.write_network(conn)
+
 # Datasets
 #   - Structure updates ()
 #   - Events (when do users change their beliefs)
@@ -178,16 +145,7 @@ s_cog[ts] = s_cog[ts] * 0.7
 s_cog[ts][s_cog[ts] == 0] = 0.1
 
 # Initialize social fields -- average focal belief of each voter's social circle
-s_soc_init = []
-
-for voter_idx, connections in enumerate(conn):
-    soc_fields = []
-
-    for contact_idx, is_connected in enumerate(connections):
-        if is_connected:
-            soc_fields.append(s_own_p[contact_idx][:4])
-
-    s_soc_init.append(np.mean(np.array(soc_fields), axis=0))
+s_soc_init = (conn @ s_own_p[:, :4]) / row_sums[:, np.newaxis]
 
 s_soc.append(s_soc_init)
 
@@ -198,14 +156,33 @@ s_percs_std = np.std(s_own_pred[ts][:, 0], axis=0)
 
 # %% Implement belief dynamics
 
+rng = np.random.default_rng(0)
+beliefs = sample(s_own_pred[0], rng)  # Focal beliefs, sampled from probabilities
+
+s_percs_mean = [s_percs_mean]
+s_percs_std = [s_percs_std]
+results.append(beliefs, s_own_pred[0], percs_mean=s_percs_mean[0])
+
 for ts in range(1, tmax):
-    diss_ind = np.zeros((n, on))
-    diss_soc = np.zeros((n, on))
+    # Social field from the contacts' beliefs (average or majority), then
+    # dissonances and Boltzmann probabilities for every voter at once
+    probs, beliefs = update(conn, beliefs, s_cog[0], w, beta, xsocag, rng)
+
+    s_percs_mean.append(np.mean(probs[:, 0]))
+    s_percs_std.append(np.std(probs[:, 0]))
+    results.append(beliefs, probs, percs_mean=s_percs_mean[-1])
+
+results.close()
+
 
-    # Calcuate dissonance for each belief, individual
-    for belief in range(on):  # For each possible focal belief
-        diss_ind = (np.tile(o_prob[belief], (n, 1)) - s_cog[ts - 1]) ** 2
+# %% Replicated sweep
 
-        diss_soc = 0
+# Run from the repo root with, e.g.:
+#   python -m social_dynamics.sweep --grid w=0.1,0.3,0.5 xsocag=0,1 --reps 10 \
+#       --mat-dir data/matlab --out data/polling-sweep.jsonl
+sweep = pl.read_ndjson("../../data/polling-sweep.jsonl")
 
-        diss_tot = (1 - w) * diss_ind + w * diss_soc
+# Mean and spread over replications of the share of R voters, by day
+sweep.group_by("w", "xsocag", "day").agg(
+    pl.col("share_R").mean().alias("mean"), pl.col("share_R").std().alias("std")
+).sort("w", "xsocag", "day")
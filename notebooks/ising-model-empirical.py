@@ -1,64 +1,33 @@
 # %% Imports
 
-import json
-import os
-import random
-import typing as t
+from social_dynamics.activity import ActivityIndex
+from social_dynamics.dids import DidIndex
+from social_dynamics.empirical import BeliefModel
+from social_dynamics.temporal import TemporalEdges
 
-import raphtory as rp
+EVENTS_DIR = "../data/events"  # python -m social_dynamics.events
+DID_INDEX = "../data/dids.parquet"  # python -m social_dynamics.dids
+ACTIVITY_DIR = "../data/activity"  # python -m social_dynamics.activity
 
-STREAM_DIR = "../data/stream"
+# %% Replay the stream
 
-# %%
-
-
-g = rp.Graph()
-
-
-def init_belief():
-    return random.choice([-1, 1])
-
-
-def update_belief(n: rp.Node, p: rp.Properties):
-    p.as_dict()
+index = DidIndex.load(DID_INDEX)
+edges = TemporalEdges.from_store(EVENTS_DIR, index)
+activity = ActivityIndex(ACTIVITY_DIR)
 
-    return
+# Two beliefs (Ising); each day, consumer-active nodes update from the beliefs of
+# the producer-active nodes they follow
+model = BeliefModel(len(index), n_beliefs=2, w=0.3, beta=1.0, seed=0)
 
+for day, changes in edges.iter_days():
+    model.update(day, changes, activity.activity(day))
 
-for day in sorted(os.listdir(STREAM_DIR)):
-    # Insert new information into graph
-    with open(f"{STREAM_DIR}/{day}", "r") as file:
-        for line in file:
-            record = json.loads(line.strip())
+beliefs_by_day = model.table()
+beliefs_by_day
 
-            # Insert new nodes
-            if record["$type"] == "app.bsky.actor.profile":
-                g.add_node(
-                    timestamp=record["createdAt"],
-                    id=record["did"],
-                    properties={"belief": init_belief()},
-                )
-
-            # Draw new edges
-            elif record["$type"] == "app.bsky.graph.follow":
-                g.add_edge(
-                    timestamp=record["createdAt"],
-                    src=record["did"],
-                    dst=record["subject"],
-                )
-
-    # Update nodes
-    for node in t.cast(list[rp.Node], g.nodes):
-        # Get a random sample of
-        node.properties
-
-        # Chinatown soup: tea tasting
-
-    break
-
-
-# %%
+# %% Activity over time
 
+activity.counts("consumer").join(activity.counts("producer"), on="day")
 
 # %%
 
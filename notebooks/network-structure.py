@@ -8,12 +8,22 @@ from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
+import polars as pl
 import raphtory as rp
 import raphtory.algorithms as alg
 
 import graph_tool.all as gt
+from social_dynamics import metrics
+from social_dynamics.dids import DidIndex
+from social_dynamics.events import load_follows
+from social_dynamics.graph import load_follow_graph, to_graph_tool, to_raphtory
+from social_dynamics.incremental import MetricsTracker
+from social_dynamics.instrument import Stats
+from social_dynamics.temporal import TemporalEdges
 
 STREAM_DIR = "../data/stream-2023-07-01"
+EVENTS_DIR = "../data/events-2023-07-01"  # python -m social_dynamics.events
+DID_INDEX = "../data/dids.parquet"  # python -m social_dynamics.dids
 
 # %% Functions
 
@@ -35,27 +45,73 @@ timestamps = generate_timestamps(until="2023-03-10")
 
 g = rp.Graph()
 
+stats = Stats()
 start_time = time.time()
 count = 0
 for ts in timestamps:
     with open(f"{STREAM_DIR}/{ts}.jsonl", "r") as file:
-        for line in file:
+        for line in stats.iter("read", file):
             try:
-                record = json.loads(line.strip())
+                with stats.stage("json_decode"):
+                    record = json.loads(line.strip())
             except json.JSONDecodeError as e:
                 print(f"Error decoding JSON in file {STREAM_DIR}/{ts}: {e}")
                 continue
 
-            if record["$type"] == "app.bsky.actor.profile":
-                g.add_node(record["createdAt"], record["did"])
-            elif record["$type"] == "app.bsky.graph.follow":
-                g.add_edge(record["createdAt"], record["did"], record["subject"])
+            with stats.stage("add", record["$type"]):
+                if record["$type"] == "app.bsky.actor.profile":
+                    g.add_node(record["createdAt"], record["did"])
+                elif record["$type"] == "app.bsky.graph.follow":
+                    g.add_edge(record["createdAt"], record["did"], record["subject"])
             count += 1
 
 print(
     f"Processed {count} records in {time.time() - start_time:.2f} seconds ({count / (time.time() - start_time):.2f} recs/sec)"
 )
+print(stats.report())
 
+# %% Efficiency testing, bulk load from the Parquet event store
+
+index = DidIndex.load(DID_INDEX)
+
+start_time = time.time()
+follows = load_follows(EVENTS_DIR, end="2023-03-10", index=index)
+g = to_raphtory(
+    follows["src"].to_numpy(),
+    follows["dst"].to_numpy(),
+    follows["created_at"].dt.epoch("ms").to_numpy(),
+)
+print(f"Loaded {len(follows)} follows in {time.time() - start_time:.2f} seconds")
+
+
+# %% Backend benchmarks, from python -m social_dynamics.bench
+
+benchmarks = pl.read_ndjson("../data/benchmarks.jsonl")
+print(
+    benchmarks.filter(pl.col("seconds").is_not_null())
+    .pivot(on="backend", index=["dataset", "task"], values="seconds")
+    .sort("dataset", "task")
+)
+
+# %% Graph as of a point in time, without replaying the stream
+
+start_time = time.time()
+edges = TemporalEdges.from_store(EVENTS_DIR, index, end="2023-03-10")
+print(f"Indexed {len(edges)} follows in {time.time() - start_time:.2f} seconds")
+
+start_time = time.time()
+adj = edges.graph_at("2023-02-01")
+print(f"Snapshot with {adj.nnz} edges in {time.time() - start_time:.2f} seconds")
+
+# Daily degree, triangle, clustering and component time series
+start_time = time.time()
+tracker = MetricsTracker(len(index))
+for day, changes in edges.iter_days():
+    tracker.update(day, changes)
+print(f"Swept {len(edges.days)} days in {time.time() - start_time:.2f} seconds")
+
+daily_metrics = tracker.table()
+daily_metrics.write_csv("../data/daily-network-metrics.csv")
 
 # %% Components
 
@@ -74,7 +130,7 @@ else:
 
 sub_g = t.cast(rp.Graph, g.largest_connected_component())
 
-# TODO: Sample nodes for efficiency
+# See "Sampled metrics" below for estimates that scale past ~10^5 nodes
 
 # Average clustering coefficient
 start = time.time()
@@ -124,30 +180,10 @@ v1 = g.add_vertex()
 
 # %% Populate graph
 
-timestamps = generate_timestamps(until="2023-03-10")
-
-g = gt.Graph()
-did_ptrs = {}
-
 start_time = time.time()
-count = 0
-for ts in timestamps:
-    with open(f"{STREAM_DIR}/{ts}.jsonl", "r") as file:
-        records = [json.loads(line.strip()) for line in file]
-
-    records.sort(key=lambda x: x.get("createdAt", ""))
-
-    for record in records:
-        if record["$type"] == "app.bsky.actor.profile":
-            did_ptrs[record["did"]] = g.add_vertex()
-        elif record["$type"] == "app.bsky.graph.follow":
-            if record["did"] in did_ptrs and record["subject"] in did_ptrs:
-                g.add_edge(did_ptrs[record["did"]], did_ptrs[record["subject"]])
-        count += 1
-
-print(
-    f"Processed {count} records in {time.time() - start_time:.2f} seconds ({count / (time.time() - start_time):.2f} recs/sec)"
-)
+adj = load_follow_graph(EVENTS_DIR, index, end="2023-03-10")
+g = to_graph_tool(adj)
+print(f"Built graph with {adj.nnz} edges in {time.time() - start_time:.2f} seconds")
 
 # %%
 
@@ -189,3 +225,21 @@ else:
     max_edges = V * (V - 1) / 2
 
 density = E / max_edges
+
+# %% Sampled metrics
+
+lcc, lcc_nodes = metrics.largest_component(adj)
+budget = metrics.Budget(max_time=120, rel_error=0.005)
+
+path_length = metrics.average_path_length(lcc, budget, seed=0)
+print(
+    f"Avg path length: {path_length.value:.3f} ({path_length.low:.3f}, {path_length.high:.3f}), {path_length.n_samples} sources in {path_length.seconds:.2f}s"
+)
+
+avg_clustering = metrics.clustering(lcc, budget, seed=0)
+print(
+    f"Avg clustering coeff: {avg_clustering.value:.4f} ({avg_clustering.low:.4f}, {avg_clustering.high:.4f}), {avg_clustering.n_samples} wedges in {avg_clustering.seconds:.2f}s"
+)
+
+assortativity = metrics.degree_assortativity(metrics.to_undirected(lcc))
+density = metrics.density(lcc)
@@ -6,6 +6,8 @@ import h5py
 import numpy as np
 from scipy.sparse import csr_matrix
 
+from social_dynamics.csrgraph import CSRGraph, save_csr
+
 # %% Create toy bipartite graph
 
 # Create a small bipartite graph
@@ -46,6 +48,18 @@ with h5py.File(file, "r") as f:
 print("\nLoaded graph:")
 print(loaded_graph.toarray())
 
+# %% Save / load graph, memory-mapped
+
+# Same graph as raw .npy arrays, opened without reading them into RAM
+path = "../data/toy-bipartite"
+save_csr(graph, path)
+
+mmap_graph = CSRGraph(path)
+print("\nOut-degrees:", mmap_graph.out_degree())
+print("In-degrees:", mmap_graph.in_degree())
+print("Neighbors of A0:", mmap_graph.neighbors(0))
+print("Neighbors of B1:", mmap_graph.in_neighbors(1))
+
 # %% Analyze graph
 
 # Perform some operations on the graph
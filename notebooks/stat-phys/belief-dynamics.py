@@ -6,6 +6,9 @@ import random
 import numpy as np
 from pyvis.network import Network
 from raphtory import Graph
+from scipy.sparse import csr_matrix
+
+from social_dynamics.montecarlo import Ensemble, MonteCarlo, linear, scan
 
 # %% Generate graph structures
 
@@ -176,3 +179,44 @@ stochastic_block_vis: Network = stochastic_block_network.to_pyvis(
 stochastic_block_vis.set_options(json.dumps(pyvis_options))
 
 stochastic_block_vis.write_html("./graphs/stochastic-block.html")
+
+# %% Monte Carlo: Potts order parameter vs temperature
+
+# Random graph with mean degree ~10
+n_nodes = 100_000
+rng = np.random.default_rng(0)
+src, dst = rng.integers(n_nodes, size=(2, 5 * n_nodes))
+random_adj = csr_matrix((np.ones(len(src)), (src, dst)), shape=(n_nodes, n_nodes))
+
+# Phase diagram over the social weight and inverse temperature, with every
+# setting and replica advanced together as one ensemble
+phases = scan(
+    random_adj,
+    ws=[0.25, 0.5, 0.75, 1.0],
+    betas=np.linspace(0.5, 10, 12),
+    sweeps=100,
+    replicas=2,
+    n_beliefs=3,
+    sweep="coloring",
+    seed=0,
+)
+phases.pivot(on="w", index="beta", values="order")
+
+# %% Annealing from high to low temperature
+
+annealed = MonteCarlo(random_adj, n_beliefs=3, w=1.0, sweep="coloring", seed=0)
+annealed.run(linear(0.5, 10, 300), measure_every=10).drop_nulls()
+
+# %% Parallel tempering across the transition
+
+tempered = Ensemble(
+    random_adj,
+    ws=[1.0],
+    betas=np.linspace(2, 6, 16),
+    replicas=2,
+    n_beliefs=3,
+    tempering=True,
+    seed=0,
+)
+tempered_sweeps = tempered.run(200, measure_every=10)
+tempered.exchange_rates()
@@ -0,0 +1,143 @@
+"""
+Streaming CAR reader for repo downloads.
+
+`decode_car` needs the whole body in memory and builds a dict of every block.
+Here blocks are decoded one at a time as chunks arrive, and records are
+yielded as soon as both the record and the MST entry pointing at it are seen.
+Only unmatched entries and records are held, which for the usual getRepo
+block order (each MST node before its records) is a handful at a time.
+Identical records share a block, and an MST entry that arrives after its shared
+block was already matched is dropped. The commit and MST nodes, which are small
+next to the records, can be kept to walk the tree once the stream ends.
+"""
+
+import base64
+import typing as t
+
+from libipld import decode_dag_cbor  # type: ignore
+from social_dynamics.instrument import NO_STATS, Stats
+
+
+def read_varint(buf: bytes | bytearray, pos: int) -> tuple[int, int]:
+    """Value and position after an unsigned LEB128 varint, or (-1, pos) if cut off."""
+
+    value = shift = 0
+    while pos < len(buf):
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+        shift += 7
+
+    return -1, pos
+
+
+def cid_length(buf: bytes | bytearray, pos: int) -> int:
+    if buf[pos] == 0x12 and buf[pos + 1] == 0x20:  # CIDv0, bare sha2-256 multihash
+        return 34
+
+    end = pos
+    for _ in range(3):  # Version, codec, multihash code
+        _, end = read_varint(buf, end)
+    size, end = read_varint(buf, end)
+
+    return end + size - pos
+
+
+def cid_bytes(cid: t.Any) -> bytes:
+    """Binary CID, from either the bytes or the base32 string form of a link."""
+
+    if isinstance(cid, str):
+        data = cid[1:].upper()  # Drop the multibase prefix
+        return base64.b32decode(data + "=" * (-len(data) % 8))
+
+    return bytes(cid)
+
+
+def iter_blocks(
+    chunks: t.Iterable[bytes], stats: Stats = NO_STATS
+) -> t.Iterator[tuple[bytes, t.Any]]:
+    """(CID, decoded block) for each block of a CARv1 stream."""
+
+    buf = bytearray()
+    header = True
+
+    for chunk in chunks:
+        buf += chunk
+
+        while True:
+            size, start = read_varint(buf, 0)
+            if size < 0 or start + size > len(buf):
+                break  # Frame not fully received yet
+
+            frame = bytes(buf[start : start + size])
+            del buf[: start + size]
+
+            if header:
+                header = False
+                continue
+
+            with stats.stage("car_decode"):
+                split = cid_length(frame, 0)
+                block = decode_dag_cbor(frame[split:])
+
+            yield frame[:split], block
+
+    if buf:
+        raise ValueError(f"Truncated CAR stream ({len(buf)} trailing bytes)")
+
+
+def iter_records(
+    chunks: t.Iterable[bytes],
+    keep: t.Callable[[dict[str, t.Any]], bool] = lambda record: True,
+    stats: Stats = NO_STATS,
+    blocks: t.Optional[dict[bytes, t.Any]] = None,
+) -> t.Iterator[tuple[str, bytes, dict[str, t.Any]]]:
+    """
+    (rkey, record CID, record) for every record in a repo CAR stream that
+    `keep` accepts. Records that `keep` rejects are dropped before their MST
+    entry is found. Every other block (commits and MST nodes) is added to
+    `blocks`, if given.
+    """
+
+    wanted: dict[bytes, list[str]] = {}  # Record CID -> rkeys, record not seen yet
+    unclaimed: dict[bytes, dict[str, t.Any]] = {}  # Record CID -> record, no key yet
+
+    for cid, block in iter_blocks(chunks, stats):
+        if not isinstance(block, dict):
+            continue
+
+        if "e" in block and "l" in block:  # MST node
+            if blocks is not None:
+                blocks[cid] = block
+
+            matched = []
+            with stats.stage("mst_walk"):
+                prev_key = ""
+                for op in block["e"]:
+                    rkey = prev_key[: op["p"]] + op["k"].decode("utf-8")
+                    prev_key = rkey
+                    data_cid = cid_bytes(op["v"])
+
+                    if data_cid in unclaimed:
+                        matched.append((rkey, data_cid, unclaimed.pop(data_cid)))
+                    else:
+                        wanted.setdefault(data_cid, []).append(rkey)
+
+            yield from matched
+
+        elif "$type" in block:
+            with stats.stage("filter", block["$type"]):
+                kept = keep(block)
+
+            if not kept:
+                wanted.pop(cid, None)
+            elif cid in wanted:
+                for rkey in wanted.pop(cid):
+                    yield rkey, cid, block
+            else:
+                unclaimed[cid] = block
+
+        elif blocks is not None:
+            blocks[cid] = block
@@ -1,18 +1,62 @@
 """
 Crawl the repos of users from dids.csv and output the records to jsonl files.
+
+Repos are downloaded by a pool of worker threads, but records are written in
+the order the DIDs appear in dids.csv, so the per-day output is the same as a
+serial crawl.
+
+Progress is checkpointed to a journal. With --resume, DIDs already in the
+journal are skipped and the day files are rolled back to the last checkpoint,
+so repos that were only partly written are replayed without duplicates. A
+repo whose download (or sync) fails partway is retried from scratch, and if it
+still fails it is left out of the journal, so that --resume fetches it again.
+
+With --sync, each repo's rev and MST are kept in a state db, and later runs
+only fetch the commits since that rev. Created records and deletions (as
+com.atproto.repo.deleteRecord records) are appended to the existing day files.
+Full downloads are decoded as they stream in either way; only the small
+`since=` diffs are decoded in one piece.
+
+Time spent per stage (HTTP, CAR decode, MST walk, filter, spool, write) and
+record counts by $type are printed at the end. --stats also appends them to a
+jsonl file every --stats-interval seconds, and --profile writes a cProfile dump
+(.prof) or sampled stacks of every thread.
 """
 
+import argparse
 import csv
+import itertools
 import json
 import os
 import shutil
+import tempfile
+import threading
+import time
 import typing as t
+from collections import ChainMap, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 import requests
+from car import cid_bytes, iter_records
+from journal import Journal
 from libipld import decode_car  # type: ignore
+from ratelimit import RETRY_STATUSES, RateLimiter
+from requests.adapters import HTTPAdapter
+from sink import DaySink, day_file_sizes, is_day, truncate_day_files
+from social_dynamics.instrument import Stats, profiler
+from sync import RepoState, RepoStore
+from utils import diff_blocks, get_keys, parse_rev, tid_timestamp
 
 STREAM_DIR = "./stream"
 DID_PATH = "./dids.csv"
+JOURNAL_PATH = "./crawl-repos.journal"
+RELAY_URL = "https://bsky.network"
+
+CHUNK_SIZE = 1 << 16  # Bytes read from the response at a time
+SPOOL_MAX_MEMORY = 8 << 20  # Bytes of serialized records kept in memory per repo
+RELAY_RATE = 20.0  # getRepo requests per second, across all workers
+REPO_ATTEMPTS = 3  # Downloads of a repo before it's left for --resume
 
 START_DATE_CUTOFF = "2022-11-16"  # Start of bsky network
 END_DATE_CUTOFF = "2023-07-01"  # TODO: Extend
@@ -25,6 +69,8 @@ RECORD_TYPES = [
     "app.bsky.graph.block",
 ]
 
+DELETE_TYPE = "com.atproto.repo.deleteRecord"
+
 
 class BlockOp(t.TypedDict):
     p: int  # Starting index of the previous key
@@ -34,104 +80,491 @@ class BlockOp(t.TypedDict):
     l: str  # Pointer to the block containing pointer to the left # noqa: E741
 
 
-def download_repo(did: str, log: bool = True) -> None:
+class RepoError(Exception):
+    """A repo download that failed, and may succeed if retried."""
+
+
+_local = threading.local()
+limiter = RateLimiter(RELAY_RATE, burst=8)
+stats = Stats()
+
+
+def get_session(pool_size: int = 1) -> requests.Session:
+    """Per-thread session, so each worker keeps its connection to the relay alive."""
+
+    if not hasattr(_local, "session"):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+
+    return _local.session
+
+
+def fetch_repo(
+    did: str, relay: str = RELAY_URL, since: t.Optional[str] = None
+) -> t.Iterator[bytes]:
+    """
+    Body of a getRepo response, as it streams in. Raises `RepoError` if the
+    request or the stream fails in a way that may succeed if retried. Repos the
+    relay refuses (e.g. deleted ones) have an empty body.
+    """
+
+    params = {"did": did}
+    if since is not None:
+        params["since"] = since  # Only blocks created after this rev
+
     try:
-        res = requests.get(
-            f"https://bsky.network/xrpc/com.atproto.sync.getRepo?did={did}",
-        )
+        with stats.stage("http_wait"):
+            res = limiter.get(
+                get_session(),
+                f"{relay}/xrpc/com.atproto.sync.getRepo",
+                params=params,
+                stream=True,
+            )
+    except Exception as e:
+        raise RepoError(f"Error fetching repo for {did}: {e}") from e
+
+    with res:
+        if res.status_code in RETRY_STATUSES:
+            raise RepoError(f"Failed to fetch {did}: {res.status_code} {res.text}")
 
         if res.status_code != 200:
             print(f"Failed to fetch {did}: {res.status_code} {res.text}")
             return
 
-        repo = t.cast(
-            tuple[dict[str, t.Any], dict[str, dict[str, t.Any]]],
-            decode_car(res.content),
-        )
-        root, tree = repo
+        try:
+            for chunk in stats.iter("http_wait", res.iter_content(CHUNK_SIZE)):
+                stats.count("bytes_read", len(chunk))
+                yield chunk
+        except requests.RequestException as e:
+            raise RepoError(f"Error reading repo for {did}: {e}") from e
 
-    except Exception as e:
-        print(f"Error fetching repo for {did}: {e}")
-        return
 
-    uris = set()
-    total_records = 0
-    total_errors = 0
+def repo_record(did: str, rkey: str, record: dict[str, t.Any]) -> dict[str, t.Any]:
+    return {
+        "did": did,
+        "$type": record.get("$type", ""),
+        "createdAt": record.get("createdAt", ""),
+        "uri": f"at://{did}/{rkey}",
+        **record,
+    }
+
+
+def stream_records(
+    did: str,
+    relay: str = RELAY_URL,
+    blocks: t.Optional[dict[bytes, t.Any]] = None,
+) -> t.Iterator[tuple[str, bytes, dict[str, t.Any]]]:
+    """
+    (rkey, record CID, record) of a full repo, decoded as the response streams
+    in. Commits and MST nodes are added to `blocks`, if given. Raises
+    `RepoError` if the download fails, after some records may have been yielded.
+    """
 
     try:
-        for block in tree.values():
-            if "e" in block:
-                ops: list[BlockOp] = block["e"]
-                prev_key = ""
-
-                for op in ops:
-                    rkey = prev_key[: op["p"]] + op["k"].decode("utf-8")
-                    prev_key = rkey
-                    data_cid = op["v"]
-
-                    if rkey not in uris:
-                        uris.add(rkey)
-
-                        if data_cid in tree:  # Data exists @ pointer
-                            record = tree[data_cid]
-
-                            if record["$type"] in RECORD_TYPES:
-                                try:
-                                    save_record(
-                                        {
-                                            "did": did,
-                                            "$type": record.get("$type", ""),
-                                            "createdAt": record.get("createdAt", ""),
-                                            "uri": f"at://{did}/{rkey}",
-                                            **record,
-                                        }
-                                    )
-                                    total_records += 1
-                                except Exception as e:
-                                    print(f"Error saving record: {e}")
-                                    total_errors += 1
-        if log:
-            print(f"Added {total_records} records for {did} ({total_errors} errors)")
+        yield from iter_records(
+            fetch_repo(did, relay),
+            keep=lambda record: record["$type"] in RECORD_TYPES,
+            stats=stats,
+            blocks=blocks,
+        )
+    except RepoError:
+        raise
+    except Exception as e:
+        raise RepoError(f"Error processing repo for {did}: {e}") from e
 
+
+def download_repo(did: str, relay: str = RELAY_URL) -> t.Iterator[dict[str, t.Any]]:
+    """
+    Records of a repo, decoded as the response streams in. Raises `RepoError`
+    if the request or the stream fails, after some records may have been
+    yielded. Repos the relay refuses (e.g. deleted ones) have no records.
+    """
+
+    for rkey, _, record in stream_records(did, relay):
+        yield repo_record(did, rkey, record)
+
+
+def rev_to_iso(rev: str) -> str:
+    timestamp, _ = parse_rev(rev)
+    return datetime.fromtimestamp(timestamp / 1e6, tz=timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%fZ"
+    )
+
+
+def cutoff_extended(state: RepoState, keys: t.Iterable[str]) -> bool:
+    """Whether any record that existed at the last sync may be past its cutoff."""
+
+    if state.cutoff >= END_DATE_CUTOFF:
+        return False
+
+    cutoff = datetime.strptime(state.cutoff, "%Y-%m-%d") + timedelta(days=1)
+    cutoff_us = int(cutoff.replace(tzinfo=timezone.utc).timestamp() * 1e6)
+
+    for key in keys:
+        if key.split("/")[0] in RECORD_TYPES:
+            timestamp = tid_timestamp(key)
+            if timestamp is None or timestamp >= cutoff_us:
+                return True
+
+    return False
+
+
+def sync_repo(
+    did: str, created_at: str, store: RepoStore, relay: str = RELAY_URL
+) -> t.Generator[dict[str, t.Any], None, t.Optional[RepoState]]:
+    """
+    Yields the records created or deleted since the repo's last synced rev, and
+    returns its new state. Falls back to a full download for new repos, and for
+    repos with records that the previous END_DATE_CUTOFF left out. Full
+    downloads are decoded as they stream in, like `download_repo`, while the
+    small `since=` diffs are decoded in one piece. Raises `RepoError` if the
+    download fails or its blocks don't make up the repo's tree.
+    """
+
+    state = store.get(did)
+    last_keys = get_keys(state.nodes, state.root) if state is not None else {}
+    full = state is None or cutoff_extended(state, last_keys)
+
+    if state is None:
+        yield {"did": did, "$type": "app.bsky.actor.profile", "createdAt": created_at}
+
+    blocks: dict[bytes, t.Any] = {}
+    if full:
+        for rkey, cid, record in stream_records(did, relay, blocks):
+            if (
+                state is None
+                or last_keys.get(rkey) != cid
+                or record.get("createdAt", "")[:10] > state.cutoff
+            ):
+                yield repo_record(did, rkey, record)
+
+        if not blocks:
+            return None  # Refused by the relay
+
+        commits = [block for block in blocks.values() if "rev" in block]
+        if len(commits) != 1:
+            raise RepoError(f"Expected one commit for {did}, got {len(commits)}")
+
+        commit = commits[0]
+        tree: t.Mapping[bytes, t.Any] = blocks
+    else:
+        car = b"".join(fetch_repo(did, relay, since=state.rev))
+        if not car:
+            return None
+
+        try:
+            with stats.stage("car_decode"):
+                header, blocks = decode_car(car)
+        except Exception as e:
+            raise RepoError(f"Error decoding diff for {did}: {e}") from e
+
+        # Blocks are keyed by binary CIDs, links are strings
+        root = cid_bytes(header["roots"][0])
+        if root not in blocks:
+            return state  # No commits since the last sync
+
+        commit = blocks[root]
+
+        # Subtrees missing from a diff are unchanged since the last sync
+        tree = ChainMap(blocks, state.nodes)
+
+    nodes: dict[bytes, dict[str, t.Any]] = {}
+    try:
+        with stats.stage("mst_walk"):
+            curr_keys = get_keys(tree, commit["data"], nodes)
     except Exception as e:
-        print(f"Error processing repo for {did}: {e}")
+        raise RepoError(f"Error syncing repo for {did}: {e}") from e
+
+    created, deleted = diff_blocks(last_keys, curr_keys)
+
+    # Records of a full download were yielded as they arrived
+    if not full:
+        for rkey, data_cid in curr_keys.items():
+            record = blocks.get(data_cid)
+            if (
+                rkey in created
+                and record is not None
+                and record.get("$type") in RECORD_TYPES
+            ):
+                yield repo_record(did, rkey, record)
+
+    # Deletions are dated by the commit that first no longer has the record
+    for rkey in sorted(deleted):
+        if rkey.split("/")[0] in RECORD_TYPES:
+            yield {
+                "did": did,
+                "$type": DELETE_TYPE,
+                "createdAt": rev_to_iso(commit["rev"]),
+                "uri": f"at://{did}/{rkey}",
+                "collection": rkey.split("/")[0],
+            }
+
+    return RepoState(commit["rev"], cid_bytes(commit["data"]), END_DATE_CUTOFF, nodes)
 
 
-def save_record(record: dict[str, t.Any]):
+class Spool(t.NamedTuple):
+    file: t.IO[str]  # "YYYY-MM-DD <record json>" lines
+    total_records: int
+    total_errors: int
+
+
+def save_record(spool: t.IO[str], record: dict[str, t.Any]):
     file_idx = record["createdAt"][:10]  # YYYY-MM-DD
+    if not is_day(file_idx):
+        raise ValueError(f"Invalid createdAt {record['createdAt']!r}")
+
     if file_idx > END_DATE_CUTOFF:
         return
 
     if file_idx < START_DATE_CUTOFF:
         return
 
-    with open(f"{STREAM_DIR}/{file_idx}.jsonl", "a") as f:
-        json.dump(record, f)
-        f.write("\n")
+    with stats.stage("spool", record["$type"]):
+        spool.write(f"{file_idx} {json.dumps(record)}\n")
+    stats.count("records", kind=record["$type"])
 
 
-# TODO: Make this faster (more threads?)
-if __name__ == "__main__":
-    if os.path.exists(STREAM_DIR):
-        shutil.rmtree(STREAM_DIR)
-    os.makedirs(STREAM_DIR)
+def spool_records(records: t.Iterable[dict[str, t.Any]]) -> Spool:
+    """
+    Serialize a repo's records to a temp file that only spills to disk past
+    SPOOL_MAX_MEMORY, so a worker never holds a large repo in memory while it
+    waits for its turn to be written.
+    """
 
-    total_users = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY, mode="w+")
+    total_records = 0
+    total_errors = 0
+
+    try:
+        for record in records:
+            try:
+                save_record(spool, record)
+                total_records += 1
+            except Exception as e:
+                print(f"Error saving record: {e}")
+                stats.count("errors")
+                total_errors += 1
+    except BaseException:
+        spool.close()  # Records of a failed download are thrown away
+        raise
+
+    spool.seek(0)
+    return Spool(t.cast(t.IO[str], spool), total_records, total_errors)
+
+
+def crawl_repo(
+    did: str,
+    created_at: str,
+    relay: str = RELAY_URL,
+    store: t.Optional[RepoStore] = None,
+) -> tuple[t.Optional[Spool], t.Optional[RepoState]]:
+    """
+    The spooled records of a repo (and its new state, if synced), or no spool
+    if every download failed.
+    """
+
+    profile = {"did": did, "$type": "app.bsky.actor.profile", "createdAt": created_at}
+    for attempt in range(REPO_ATTEMPTS):
+        try:
+            if store is not None:
+                synced: list[t.Optional[RepoState]] = []
+
+                def sync() -> t.Iterator[dict[str, t.Any]]:
+                    synced.append((yield from sync_repo(did, created_at, store, relay)))
+
+                return spool_records(sync()), synced[0]
 
-    with open(DID_PATH, "r") as csvfile:
+            records = itertools.chain([profile], download_repo(did, relay))
+            return spool_records(records), None
+        except RepoError as e:
+            print(f"{e} (attempt {attempt + 1} of {REPO_ATTEMPTS})")
+            stats.count("repo_retries")
+            if attempt + 1 < REPO_ATTEMPTS:
+                time.sleep(limiter.delay(attempt))
+
+    return None, None
+
+
+def save_repo(sink: DaySink, did: str, spool: Spool, log: bool = True) -> None:
+    with spool.file as f:
+        for line in f:
+            day, record = line.split(" ", 1)
+            try:
+                sink.write_line(day, record)
+            except ValueError as e:
+                print(f"Error saving record: {e}")
+                stats.count("errors")
+
+    if log:
+        print(
+            f"Added {spool.total_records} records for {did} "
+            f"({spool.total_errors} errors)"
+        )
+
+
+def read_dids(path: str = DID_PATH) -> t.Iterator[tuple[str, str]]:
+    with open(path, "r") as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
-            did = row["did"]
-            created_at = row["created_at"]
-
-            if created_at[:10] > END_DATE_CUTOFF:
+            if row["created_at"][:10] > END_DATE_CUTOFF:
                 break
 
-            save_record(
-                {"did": did, "$type": "app.bsky.actor.profile", "createdAt": created_at}
-            )
-            download_repo(did)
+            yield row["did"], row["created_at"]
+
+
+def load_journal(journal: Journal) -> tuple[set[str], dict[str, int]]:
+    """Completed DIDs and the day file sizes at the last checkpoint."""
+
+    done: set[str] = set()
+    sizes: dict[str, int] = {}
+
+    for entry in journal.entries():
+        done.update(entry["dids"])
+        sizes = entry["sizes"]
+
+    return done, sizes
 
+
+def crawl(
+    dids: t.Iterable[tuple[str, str]],
+    journal: Journal,
+    workers: int = 8,
+    relay: str = RELAY_URL,
+    checkpoint_every: int = 1000,
+    store: t.Optional[RepoStore] = None,
+    log: bool = True,
+) -> int:
+    """
+    Download repos with `workers` threads. At most `2 * workers` repos are in
+    flight, and results are handed to the day-file sink in submission order.
+    Every `checkpoint_every` DIDs, the finished DIDs are journaled once their
+    records have been written. If `store` is given, repos are synced
+    incrementally and their new state is saved at the same checkpoint.
+    """
+
+    total_users = 0
+    window = 2 * workers
+    pending: deque[tuple[str, Future]] = deque()
+    batch: list[str] = []
+    states: list[tuple[str, RepoState]] = []
+
+    def checkpoint() -> None:
+        dids = batch.copy()
+        synced = states.copy()
+        batch.clear()
+        states.clear()
+
+        def commit(sizes: dict[str, int]) -> None:
+            if store is not None:
+                store.put_many(synced)
+            journal.append({"dids": dids, "sizes": sizes})
+
+        sink.checkpoint(commit)
+
+    def flush_one() -> None:
+        did, future = pending.popleft()
+        spool, state = future.result()
+
+        if spool is None:
+            # Not journaled, so --resume downloads it again
+            print(f"Giving up on {did} for this run")
+            stats.count("failed_repos")
+            return
+
+        save_repo(sink, did, spool, log=log)
+        if state is not None:
+            states.append((did, state))
+
+        stats.count("repos")
+        batch.append(did)
+        if len(batch) >= checkpoint_every:
+            checkpoint()
+
+    with (
+        DaySink(STREAM_DIR, stats=stats) as sink,
+        ThreadPoolExecutor(max_workers=workers) as pool,
+    ):
+        for did, created_at in dids:
+            pending.append(
+                (did, pool.submit(crawl_repo, did, created_at, relay, store))
+            )
             total_users += 1
 
+            if len(pending) >= window:
+                flush_one()
+
+        while pending:
+            flush_one()
+
+        if batch:
+            checkpoint()
+
+    return total_users
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--relay", default=RELAY_URL)
+    parser.add_argument("--rate", type=float, default=RELAY_RATE, help="Requests/sec")
+    parser.add_argument("--dids", default=DID_PATH)
+    parser.add_argument("--out", default=STREAM_DIR)
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--sync", metavar="STATE_DB", help="Sync incrementally")
+    parser.add_argument("--stats", help="Append periodic stats as jsonl to this file")
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="Seconds")
+    parser.add_argument(
+        "--profile", help="Write a cProfile dump (.prof) or sampled stacks here"
+    )
+    args = parser.parse_args()
+
+    STREAM_DIR = args.out
+    limiter = RateLimiter(args.rate, burst=args.workers)
+    journal = Journal(args.journal)
+    dids = read_dids(args.dids)
+    store = None
+
+    if args.resume and os.path.exists(STREAM_DIR):
+        done, sizes = load_journal(journal)
+        truncate_day_files(STREAM_DIR, sizes)
+        dids = ((did, created_at) for did, created_at in dids if did not in done)
+        print(f"Resuming crawl, skipping {len(done)} finished users")
+    elif args.sync and os.path.exists(args.sync):
+        os.makedirs(STREAM_DIR, exist_ok=True)
+        journal.reset()
+    else:
+        if os.path.exists(STREAM_DIR):
+            shutil.rmtree(STREAM_DIR)
+        os.makedirs(STREAM_DIR)
+        journal.reset()
+
+    if args.sync:
+        store = RepoStore(args.sync)
+
+    # Rollback point for --resume if nothing else gets checkpointed
+    if journal.last() is None:
+        journal.append({"dids": [], "sizes": day_file_sizes(STREAM_DIR)})
+
+    if args.stats:
+        stats.start_reporting(args.stats, args.stats_interval)
+
+    with profiler(args.profile):
+        total_users = crawl(
+            dids,
+            journal,
+            workers=args.workers,
+            relay=args.relay,
+            checkpoint_every=args.checkpoint_every,
+            store=store,
+        )
+
+    stats.close(args.stats)
+
     print(f"Finished crawl to {END_DATE_CUTOFF}. Total users: {total_users}")
+    print(f"Relay requests: {limiter.stats()}")
+    print(stats.report())
@@ -1,41 +1,101 @@
+"""
+Crawl every DID from the PLC directory export into dids.csv.
+
+DIDs are appended to dids.csv as they are first seen, deduped by a DidSet
+(Bloom filter plus sqlite index). The export cursor and the size of dids.csv
+are journaled at each checkpoint, so --resume can roll back to the last
+checkpoint and continue from its page.
+"""
+
+import argparse
 import csv
 import json
+import os
 
 import requests
+from didset import DidSet
+from journal import Journal
+from ratelimit import RateLimiter
+from social_dynamics.instrument import Stats, profiler
 
 write_threshold = 500_000
 total_records = 0
 after = ""
-dids = []
-seen_dids = set()
 unsaved_dids = False
 
 CSV_FILE = "dids.csv"
+INDEX_FILE = "dids.sqlite"
+JOURNAL_FILE = "crawl-users.journal"
 PLC_URL = "https://plc.directory"
 
-# TODO: RATE LIMIT = 500 req. per 5 min.
+# PLC allows 500 req. per 5 min., stay just under it (1.6 * 300 + 10 = 490)
+session = requests.Session()
+limiter = RateLimiter(1.6, burst=10)
+stats = Stats()
 
 
-def write_to_file(data):
+def write_to_file():
     global unsaved_dids
 
-    with open(CSV_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["did", "created_at"])  # Write header
-        for did_info in data:
-            writer.writerow([did_info["did"], did_info["created_at"]])
+    with stats.stage("write"):
+        csv_file.flush()
+        os.fsync(csv_file.fileno())
+        seen_dids.commit()
 
     unsaved_dids = False
-    print(f"Data written to {CSV_FILE}. Total DIDs: {len(dids)} After: {after}")
-
+    journal.append({"after": after, "total": total_records, "size": csv_file.tell()})
+    print(f"Data written to {CSV_FILE}. Total DIDs: {total_records} After: {after}")
+    print(f"PLC requests: {limiter.stats()} Index lookups: {seen_dids.lookups}")
+    if args.stats:
+        stats.write_snapshot(args.stats)
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--resume", action="store_true")
+parser.add_argument("--plc", default=PLC_URL, help="PLC directory to export from")
+parser.add_argument("--stats", help="Append stats as jsonl to this file at checkpoints")
+parser.add_argument("--profile", help="Write a cProfile dump (.prof) or sampled stacks")
+args = parser.parse_args()
+
+journal = Journal(JOURNAL_FILE)
+checkpoint = journal.last()
+
+if args.resume and checkpoint is not None and os.path.exists(CSV_FILE):
+    # Roll dids.csv and the index back to the checkpoint, then refetch from
+    # its cursor; DIDs from the page it was taken in are deduped
+    os.truncate(CSV_FILE, checkpoint["size"])
+    seen_dids = DidSet(INDEX_FILE)
+    seen_dids.truncate(checkpoint["total"])
+
+    after = checkpoint["after"]
+    total_records = checkpoint["total"]
+    csv_file = open(CSV_FILE, "a", newline="")
+    writer = csv.writer(csv_file)
+    print(f"Resuming from {after} with {total_records} DIDs")
+else:
+    journal.reset()
+    if os.path.exists(INDEX_FILE):
+        os.remove(INDEX_FILE)
+
+    seen_dids = DidSet(INDEX_FILE)
+    csv_file = open(CSV_FILE, "w", newline="")
+    writer = csv.writer(csv_file)
+    writer.writerow(["did", "created_at"])  # Write header
+
+profile = profiler(args.profile)
+profile.start()
 
 try:
     while True:
-        res = requests.get(
-            f"{PLC_URL}/export?limit=1000" + (f"&after={after}" if after else ""),
-        )
+        with stats.stage("http_wait"):
+            res = limiter.get(
+                session,
+                f"{args.plc}/export?limit=1000" + (f"&after={after}" if after else ""),
+            )
 
-        records = json.loads("[" + res.text.replace("\n", ",") + "]")
+        with stats.stage("json_decode"):
+            records = json.loads("[" + res.text.replace("\n", ",") + "]")
+        stats.count("records", len(records))
 
         if len(records) == 0:
             print("OUT OF RECORDS, ", res.text)
@@ -45,35 +105,39 @@ try:
             unsaved_dids = True
 
             try:
-                did = record["did"]
-                if did in seen_dids:
+                # Read both fields before adding, so every DID in the index has
+                # its row in dids.csv and index ids stay in step with total_records
+                did, created_at = record["did"], record["createdAt"]
+                with stats.stage("dedup"):
+                    new = seen_dids.add(did)
+                if not new:
                     continue
 
-                dids.append(
-                    {
-                        "did": did,
-                        "created_at": record["createdAt"],
-                    }
-                )
-
-                seen_dids.add(did)
+                with stats.stage("write"):
+                    writer.writerow([did, created_at])
                 total_records += 1
+                stats.count("new_dids")
 
             except Exception as e:
                 print(e, record)
 
             if total_records % write_threshold == 0:
-                write_to_file(dids)
+                write_to_file()
 
         after = records[-1]["createdAt"]
 
 except Exception as e:
     print(f"An error occurred: {e}")
     if unsaved_dids:
-        write_to_file(dids)
+        write_to_file()
 
 finally:
     if unsaved_dids:
-        write_to_file(dids)
+        write_to_file()
+
+    csv_file.close()
+    seen_dids.close()
+    profile.stop()
 
-print(f"Data collection complete. All DIDs ({len(dids)}) have been written to dids.csv")
+print(f"Data collection complete. All DIDs ({total_records}) written to {CSV_FILE}")
+print(stats.report())
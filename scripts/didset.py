@@ -0,0 +1,90 @@
+"""
+Dedup set for DIDs seen in the PLC export.
+
+A fixed-size Bloom filter answers "definitely new" for almost every new DID
+without touching disk. Only its "maybe seen" answers are checked against an
+exact sqlite index, which also keeps insertion order so the set can be rolled
+back to a checkpoint. Memory stays at the filter size however many DIDs there
+are; past `expected` DIDs the filter just sends more lookups to sqlite.
+"""
+
+import hashlib
+import math
+import sqlite3
+
+
+class BloomFilter:
+    def __init__(self, expected: int, fp_rate: float = 0.01):
+        self.size = max(8, int(-expected * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / expected * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, key: str) -> list[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for idx in self._indexes(key):
+            self.bits[idx >> 3] |= 1 << (idx & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[idx >> 3] & (1 << (idx & 7)) for idx in self._indexes(key))
+
+    def clear(self) -> None:
+        self.bits = bytearray(len(self.bits))
+
+
+class DidSet:
+    def __init__(self, path: str, expected: int = 50_000_000, fp_rate: float = 0.01):
+        self.bloom = BloomFilter(expected, fp_rate)
+        self.lookups = 0  # Bloom filter hits checked against sqlite
+
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dids (id INTEGER PRIMARY KEY, did TEXT UNIQUE)"
+        )
+        self._db.commit()
+        self._total = self._count()
+        self._load()
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM dids").fetchone()[0]
+
+    def _load(self) -> None:
+        self.bloom.clear()
+        for (did,) in self._db.execute("SELECT did FROM dids"):
+            self.bloom.add(did)
+
+    def add(self, did: str) -> bool:
+        """Add `did`, returning whether it was new."""
+
+        if did in self.bloom:
+            self.lookups += 1
+            if self._db.execute("SELECT 1 FROM dids WHERE did = ?", (did,)).fetchone():
+                return False
+
+        self._db.execute("INSERT INTO dids (did) VALUES (?)", (did,))
+        self.bloom.add(did)
+        self._total += 1
+
+        return True
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def truncate(self, total: int) -> None:
+        """Forget every DID added after the first `total`."""
+
+        self._db.execute("DELETE FROM dids WHERE id > ?", (total,))
+        self._db.commit()
+        self._total = self._count()
+        self._load()
+
+    def __len__(self) -> int:
+        return self._total
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,60 @@
+"""
+Append-only crawl journal, used to resume a crawl after a crash.
+
+Each line is a JSON object written once a unit of work is durable. A torn
+last line (crash mid-write) is cut off when the journal is opened.
+"""
+
+import json
+import os
+import typing as t
+
+
+class Journal:
+    def __init__(self, path: str):
+        self.path = path
+        self._repair()
+
+    def _repair(self) -> None:
+        if not os.path.exists(self.path):
+            return
+
+        # Walk back from the end to the last newline
+        with open(self.path, "rb+") as f:
+            end = pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                size = min(pos, 1 << 16)
+                pos -= size
+                f.seek(pos)
+                idx = f.read(size).rfind(b"\n")
+                if idx != -1:
+                    pos += idx + 1
+                    break
+
+            if pos != end:
+                f.truncate(pos)
+
+    def entries(self) -> t.Iterator[dict[str, t.Any]]:
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def last(self) -> t.Optional[dict[str, t.Any]]:
+        entry = None
+        for entry in self.entries():
+            pass
+
+        return entry
+
+    def append(self, entry: dict[str, t.Any]) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,152 @@
+"""
+Shared rate limiting and retries for the crawlers.
+
+`RateLimiter` is a thread-safe token bucket. Requests made through `get` are
+retried with exponential backoff and full jitter on 429s, 5xx and connection
+errors. A 429 halves the request rate and pauses every thread until the
+server's Retry-After (or ratelimit-reset) has passed; each success then adds
+the rate back a little at a time, up to the configured rate.
+"""
+
+import random
+import threading
+import time
+import typing as t
+from email.utils import parsedate_to_datetime
+
+import requests
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after(res: requests.Response) -> t.Optional[float]:
+    """Seconds the server asked us to wait, if it said."""
+
+    value = res.headers.get("Retry-After")
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    reset = res.headers.get("ratelimit-reset")  # Unix time, sent by bsky services
+    if reset is not None:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+
+    return None
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float,  # Requests per second
+        burst: int = 1,  # Bucket size
+        min_rate: float = 0.05,  # Floor for the rate after repeated 429s
+        max_retries: int = 5,
+        backoff: float = 1.0,  # Base delay (seconds) for the first retry
+        max_backoff: float = 120.0,
+        timeout: float = 60.0,  # Per-request timeout passed to requests
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.counters = {"requests": 0, "throttles": 0, "retries": 0, "failures": 0}
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+
+            time.sleep(wait)
+
+    def throttled(self, wait: t.Optional[float]) -> None:
+        with self._lock:
+            self.counters["throttles"] += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            if wait is not None:
+                self._paused_until = max(self._paused_until, time.monotonic() + wait)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def get(
+        self, session: requests.Session, url: str, **kwargs: t.Any
+    ) -> requests.Response:
+        """
+        GET `url` within the rate limit, retrying retryable failures. Returns
+        the last response (which may still be an error), or raises the last
+        connection error once retries run out.
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+
+        while True:
+            self.acquire()
+            self._count("requests")
+
+            try:
+                res = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+
+                wait = self.delay(attempt)
+            else:
+                if res.status_code not in RETRY_STATUSES:
+                    self.succeeded()
+                    return res
+
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    return res
+
+                wait = retry_after(res)
+                if res.status_code == 429:
+                    self.throttled(wait)
+                wait = self.delay(attempt) if wait is None else wait + random.random()
+                res.close()
+
+            self._count("retries")
+            attempt += 1
+            time.sleep(wait)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {**self.counters, "rate": self.rate}
@@ -0,0 +1,208 @@
+"""
+Buffered writer for the per-day jsonl stream files.
+
+Records are put on a queue by any number of threads and written by a single
+writer thread, which keeps a bounded LRU of open day files and buffers lines
+per day until a size or time threshold is hit.
+
+`checkpoint` queues a callback that runs on the writer thread once everything
+queued before it has been written out, with the size of every day file at that
+point. Truncating the day files back to those sizes undoes any later writes.
+
+Lines for a day that isn't a YYYY-MM-DD date are rejected when they are put,
+and a day file that can't be written only loses that day's buffered lines (see
+`write_errors`), as a failed record did before, rather than stopping the writer.
+"""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+
+from social_dynamics.instrument import NO_STATS, Stats
+
+Checkpoint = t.Callable[[dict[str, int]], None]
+
+DAY_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def is_day(name: str) -> bool:
+    return DAY_PATTERN.fullmatch(name) is not None
+
+
+def day_file_sizes(out_dir: str) -> dict[str, int]:
+    return {
+        name[: -len(".jsonl")]: os.path.getsize(os.path.join(out_dir, name))
+        for name in os.listdir(out_dir)
+        if name.endswith(".jsonl")
+    }
+
+
+def truncate_day_files(out_dir: str, sizes: dict[str, int]) -> None:
+    """Roll the day files in `out_dir` back to a checkpoint taken by `DaySink`."""
+
+    for day, size in day_file_sizes(out_dir).items():
+        path = os.path.join(out_dir, f"{day}.jsonl")
+        if day not in sizes:
+            os.remove(path)
+        elif size > sizes[day]:
+            os.truncate(path, sizes[day])
+
+
+class DaySink:
+    def __init__(
+        self,
+        out_dir: str,
+        max_open: int = 32,  # Open day files kept in the LRU
+        flush_bytes: int = 1 << 20,  # Flush a day once its buffer reaches this
+        max_buffered: int = 64 << 20,  # Flush everything past this total
+        flush_interval: float = 5.0,  # Seconds between time-based flushes
+        max_queue: int = 100_000,  # Put blocks once this many lines are queued
+        stats: Stats = NO_STATS,
+    ):
+        self.out_dir = out_dir
+        self.stats = stats
+        self.max_open = max_open
+        self.flush_bytes = flush_bytes
+        self.max_buffered = max_buffered
+        self.flush_interval = flush_interval
+
+        self.queue: queue.Queue[t.Optional[tuple[str, str] | Checkpoint]] = queue.Queue(
+            max_queue
+        )
+        self.error: t.Optional[BaseException] = None
+        self.write_errors = 0  # Lines dropped because their day file failed
+
+        self._handles: OrderedDict[str, t.TextIO] = OrderedDict()
+        self._buffers: dict[str, list[str]] = {}
+        self._sizes: dict[str, int] = {}
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, day: str, record: dict[str, t.Any]) -> None:
+        self.write_line(day, json.dumps(record) + "\n")
+
+    def write_line(self, day: str, line: str) -> None:
+        if self.error is not None:
+            raise RuntimeError("Sink writer failed") from self.error
+        if not is_day(day):
+            raise ValueError(f"Invalid day {day!r}, expected YYYY-MM-DD")
+
+        with self.stats.stage("sink_wait"):
+            self.queue.put((day, line))
+
+    def checkpoint(self, callback: Checkpoint) -> None:
+        if self.error is not None:
+            raise RuntimeError("Sink writer failed") from self.error
+
+        self.queue.put(callback)
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self._thread.join()
+
+        if self.error is not None:
+            raise RuntimeError("Sink writer failed") from self.error
+
+    def __enter__(self) -> "DaySink":
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = ()
+
+                if item is None:
+                    break
+
+                if callable(item):
+                    self._flush_all()
+                    item(day_file_sizes(self.out_dir))
+
+                elif item:
+                    day, line = item
+                    self._buffers.setdefault(day, []).append(line)
+                    self._sizes[day] = self._sizes.get(day, 0) + len(line)
+                    self._buffered += len(line)
+
+                    if self._sizes[day] >= self.flush_bytes:
+                        self._flush(day)
+
+                if (
+                    self._buffered >= self.max_buffered
+                    or time.monotonic() - self._last_flush >= self.flush_interval
+                ):
+                    self._flush_all()
+
+        except BaseException as e:
+            self.error = e
+
+            # Keep draining so producers blocked on a full queue can finish
+            while self.queue.get() is not None:
+                pass
+
+        finally:
+            try:
+                self._flush_all()
+            except BaseException as e:
+                self.error = self.error or e
+
+            for f in self._handles.values():
+                f.close()
+            self._handles.clear()
+
+    def _open(self, day: str) -> t.TextIO:
+        if day in self._handles:
+            self._handles.move_to_end(day)
+            return self._handles[day]
+
+        if len(self._handles) >= self.max_open:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+
+        f = open(os.path.join(self.out_dir, f"{day}.jsonl"), "a")
+        self._handles[day] = f
+        return f
+
+    def _flush(self, day: str) -> None:
+        lines = self._buffers.pop(day, None)
+        if not lines:
+            return
+
+        size = self._sizes.pop(day)
+        self._buffered -= size
+
+        try:
+            with self.stats.stage("write"):
+                f = self._open(day)
+                f.write("".join(lines))
+                f.flush()
+        except OSError as e:
+            print(f"Error writing {len(lines)} lines to {day}: {e}")
+            self.write_errors += len(lines)
+            self.stats.count("write_errors", len(lines))
+            handle = self._handles.pop(day, None)
+            if handle is not None:
+                handle.close()
+            return
+
+        self.stats.count("bytes_written", size)
+
+    def _flush_all(self) -> None:
+        for day in list(self._buffers):
+            self._flush(day)
+
+        self._last_flush = time.monotonic()
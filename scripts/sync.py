@@ -0,0 +1,73 @@
+"""
+Per-repo sync state for incremental crawls.
+
+For every DID we keep the rev of the last synced commit, the root of its MST,
+the END_DATE_CUTOFF it was synced up to, and the MST nodes themselves (without
+record data), keyed by binary CID. A `getRepo?since=<rev>` diff only carries
+the nodes that changed, so the rest of the tree is resolved from the stored
+nodes.
+"""
+
+import sqlite3
+import threading
+import typing as t
+
+from car import cid_bytes
+from libipld import decode_dag_cbor, encode_dag_cbor  # type: ignore
+
+
+class RepoState(t.NamedTuple):
+    rev: str
+    root: bytes  # CID of the MST root
+    cutoff: str  # END_DATE_CUTOFF the repo was synced up to
+    nodes: dict[bytes, dict[str, t.Any]]  # MST nodes, by CID
+
+
+class RepoStore:
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS repos "
+            "(did TEXT PRIMARY KEY, rev TEXT, cutoff TEXT, tree BLOB)"
+        )
+        self._db.commit()
+
+    def get(self, did: str) -> t.Optional[RepoState]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT rev, cutoff, tree FROM repos WHERE did = ?", (did,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        rev, cutoff, tree = row
+        root, nodes = decode_dag_cbor(tree)
+
+        # States written before CIDs were normalized may use the string form
+        return RepoState(
+            rev,
+            cid_bytes(root),
+            cutoff,
+            {cid_bytes(cid): node for cid, node in nodes},
+        )
+
+    def put_many(self, states: t.Iterable[tuple[str, RepoState]]) -> None:
+        rows = [
+            (
+                did,
+                state.rev,
+                state.cutoff,
+                encode_dag_cbor([state.root, [[c, n] for c, n in state.nodes.items()]]),
+            )
+            for did, state in states
+        ]
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?)", rows
+            )
+
+    def close(self) -> None:
+        self._db.close()
@@ -1,4 +1,6 @@
-from typing import Optional
+from typing import Any, Mapping, Optional
+
+from car import cid_bytes
 
 
 class s32:
@@ -143,43 +145,58 @@ def parse_profile(d: dict):
     }
 
 
-def get_keys(cid: str) -> list[str]:
-    keys = []
-    blocks = {}  # Placeholder
-    records = {}  # Placeholder
+def tid_timestamp(rkey: str) -> Optional[int]:
+    """Creation time (unix, microseconds) encoded in a TID record key, if any."""
+
+    tid = rkey.split("/")[-1]
+    if len(tid) != 13 or any(c not in s32.S32_CHAR for c in tid):
+        return None
+
+    return parse_rev(tid)[0]
+
+
+def get_keys(
+    blocks: Mapping[Any, dict],
+    cid: Any,
+    nodes: Optional[dict[Any, dict]] = None,
+) -> dict[str, Any]:
+    """
+    Walk the MST rooted at `cid` in key order, returning {rkey: record cid}.
+    Every visited node is added to `nodes`, if given. `blocks` is keyed by
+    binary CIDs (as from `decode_car`), and links are followed and returned as
+    binary CIDs whichever form they're in. Raises KeyError if a node is missing
+    from `blocks`.
+    """
 
+    keys = {}
+    cid = cid_bytes(cid)
     data = blocks[cid]
     prev_key = ""
 
+    if nodes is not None:
+        nodes[cid] = data
+
     if data["l"] is not None:
-        keys.extend(get_keys(data["l"]))
+        keys.update(get_keys(blocks, data["l"], nodes))
 
     for record in data["e"]:
         key = prev_key[: record["p"]] + record["k"].decode("utf-8")
         prev_key = key
 
-        if key not in records:
-            records[key] = blocks[record["v"]]
-
-        keys.append(key)
+        keys[key] = cid_bytes(record["v"])
 
         if record["t"] is not None:
-            more_keys = get_keys(record["t"])
-            keys.extend(more_keys)
+            keys.update(get_keys(blocks, record["t"], nodes))
 
     return keys
 
 
 def diff_blocks(
-    last_keys: list[str], curr_keys: list[str]
-) -> Optional[tuple[bool, str]]:
-    last = set(last_keys)
-    curr = set(curr_keys)
-
-    create = curr - last
-    if create:
-        return True, create.pop()
-
-    delete = last - curr
-    if delete:
-        return False, delete.pop()
+    last_keys: Mapping[str, Any], curr_keys: Mapping[str, Any]
+) -> tuple[set[str], set[str]]:
+    """Keys created (or pointed at a new record) and deleted between two MSTs."""
+
+    created = {key for key, cid in curr_keys.items() if last_keys.get(key) != cid}
+    deleted = last_keys.keys() - curr_keys.keys()
+
+    return created, deleted
@@ -0,0 +1 @@
+"""Storage, graph and simulation helpers shared by the scripts and notebooks."""
@@ -0,0 +1,253 @@
+"""
+Who was active on each day, by record type and role.
+
+For every day of the event store and every record type, an activity index
+holds the sorted, unique IDs (see `DidIndex`) of the accounts in each role:
+
+- `actor`: the account that created the record.
+- `target`: the account it was aimed at. That is the author of the liked,
+  reposted or replied-to post, or the followed or blocked account.
+
+It also holds the roles of the empirical belief model (see `empirical`):
+`consumer`, for accounts that posted, liked or reposted, and `producer`, for
+accounts that posted or reposted.
+
+Each series is stored like a CSR matrix with one row per day: an `ids` array
+of concatenated days and an `offsets` array with a day's start and end. Both
+are `.npy` files, memory-mapped on load, so a day's IDs are a slice of a file
+that can be intersected with adjacency rows right away. The store is read once,
+a day at a time, and IDs are appended to disk as they are found.
+
+    python -m social_dynamics.activity ../data/events ../data/activity
+
+    activity = ActivityIndex("../data/activity")
+    likers = activity.ids("like", "actor", "2023-03-01")
+    model.update(day, changes, activity.activity(day))
+"""
+
+import argparse
+import json
+import os
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+
+from social_dynamics.dids import DidIndex
+from social_dynamics.events import list_days, scan_events
+
+EVENTS_DIR = "../data/events"
+DID_INDEX = "../data/dids.parquet"
+
+CHUNK_IDS = 1 << 24  # IDs copied at once when finishing the index
+
+
+def uri_author(column: str) -> pl.Expr:
+    """DID of the repo of an at://did/collection/rkey URI."""
+
+    return pl.col(column).str.split("/").list.get(2, null_on_oob=True)
+
+
+# Record type -> DID of each role
+ROLES: dict[str, dict[str, pl.Expr]] = {
+    "profile": {"actor": pl.col("did")},
+    "post": {"actor": pl.col("did"), "target": uri_author("parent_uri")},
+    "like": {"actor": pl.col("did"), "target": uri_author("subject_uri")},
+    "repost": {"actor": pl.col("did"), "target": uri_author("subject_uri")},
+    "follow": {"actor": pl.col("did"), "target": pl.col("subject")},
+    "block": {"actor": pl.col("did"), "target": pl.col("subject")},
+}
+
+# Model role -> actors of these record types
+MODEL_ROLES = {
+    "consumer": ["post", "like", "repost"],
+    "producer": ["post", "repost"],
+}
+
+
+class Activity(t.NamedTuple):
+    consumers: npt.NDArray[np.int32]  # Sorted unique node IDs
+    producers: npt.NDArray[np.int32]
+    profiles: npt.NDArray[np.int32]  # Profiles created that day
+
+
+def active_ids(
+    store_dir: str, index: DidIndex, kinds: list[str], day: str
+) -> npt.NDArray[np.int32]:
+    """Sorted IDs of the DIDs with a `kinds` event on `day`, from the store."""
+
+    events = pl.concat(
+        [scan_events(store_dir, kind, day, day).select("did") for kind in kinds]
+    )
+    frame = (
+        index.encode_columns(events, {"did": "id"})
+        .select("id")
+        .drop_nulls()
+        .unique()
+        .collect()
+    )
+    return np.sort(frame["id"].to_numpy()).astype(np.int32)
+
+
+def day_activity(store_dir: str, index: DidIndex, day: str) -> Activity:
+    """A day's `Activity`, scanned from the store (see `ActivityIndex` instead)."""
+
+    return Activity(
+        consumers=active_ids(store_dir, index, MODEL_ROLES["consumer"], day),
+        producers=active_ids(store_dir, index, MODEL_ROLES["producer"], day),
+        profiles=active_ids(store_dir, index, ["profile"], day),
+    )
+
+
+def series_names() -> list[str]:
+    return [
+        *(f"{kind}.{role}" for kind, roles in ROLES.items() for role in roles),
+        *MODEL_ROLES,
+    ]
+
+
+def build(
+    store_dir: str,
+    index: DidIndex,
+    out_dir: str,
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+) -> None:
+    """Index the days from `start` to `end` of the event store into `out_dir`."""
+
+    os.makedirs(out_dir, exist_ok=True)
+    days = sorted(
+        {
+            day
+            for kind in ROLES
+            for day in list_days(os.path.join(store_dir, kind), ".parquet")
+            if (start is None or day >= start) and (end is None or day <= end)
+        }
+    )
+
+    names = series_names()
+    files = {
+        name: open(os.path.join(out_dir, f"{name}.ids.tmp"), "wb") for name in names
+    }
+    offsets = {name: [0] for name in names}
+
+    try:
+        for day in days:
+            found: dict[str, npt.NDArray[np.int32]] = {}
+            for kind, roles in ROLES.items():
+                frame = index.encode_columns(
+                    scan_events(store_dir, kind, day, day).select(
+                        role.alias(name) for name, role in roles.items()
+                    ),
+                    {name: name for name in roles},
+                ).collect()
+
+                for role in roles:
+                    ids = frame[role].drop_nulls().unique().to_numpy()
+                    found[f"{kind}.{role}"] = np.sort(ids).astype(np.int32)
+
+            for role, kinds in MODEL_ROLES.items():
+                found[role] = np.unique(
+                    np.concatenate([found[f"{kind}.actor"] for kind in kinds])
+                ).astype(np.int32)
+
+            for name in names:
+                files[name].write(found[name].tobytes())
+                offsets[name].append(offsets[name][-1] + len(found[name]))
+
+            print(f"Indexed {day}: {len(found['consumer'])} consumers")
+    finally:
+        for f in files.values():
+            f.close()
+
+    for name in names:
+        _finish(out_dir, name, np.array(offsets[name], dtype=np.int64))
+
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"days": days, "n_nodes": len(index), "series": names}, f)
+
+
+def _finish(out_dir: str, name: str, offsets: npt.NDArray[np.int64]) -> None:
+    """Turn the raw IDs of a series into `.npy` files, a chunk at a time."""
+
+    tmp = os.path.join(out_dir, f"{name}.ids.tmp")
+    ids = np.lib.format.open_memmap(
+        os.path.join(out_dir, f"{name}.ids.npy"),
+        mode="w+",
+        dtype=np.int32,
+        shape=(int(offsets[-1]),),
+    )
+    if len(ids):
+        raw = np.memmap(tmp, dtype=np.int32, mode="r")
+        for lo in range(0, len(ids), CHUNK_IDS):
+            ids[lo : lo + CHUNK_IDS] = raw[lo : lo + CHUNK_IDS]
+        del raw
+
+    ids.flush()
+    del ids
+    os.remove(tmp)
+    np.save(os.path.join(out_dir, f"{name}.offsets.npy"), offsets)
+
+
+class ActivityIndex:
+    """Read-only view of an index written by `build`."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        self.days: list[str] = meta["days"]
+        self.n_nodes: int = meta["n_nodes"]
+        self._day_pos = {day: i for i, day in enumerate(self.days)}
+        self._ids: dict[str, npt.NDArray[np.int32]] = {}
+        self._offsets: dict[str, npt.NDArray[np.int64]] = {}
+        for name in meta["series"]:
+            self._ids[name] = np.load(
+                os.path.join(path, f"{name}.ids.npy"), mmap_mode="r"
+            )
+            self._offsets[name] = np.load(os.path.join(path, f"{name}.offsets.npy"))
+
+    def series(self, name: str, day: str) -> npt.NDArray[np.int32]:
+        """Sorted IDs of series `name` (e.g. "like.actor", "consumer") on `day`."""
+
+        pos = self._day_pos.get(day)
+        if pos is None:
+            return np.empty(0, dtype=np.int32)
+
+        offsets = self._offsets[name]
+        return self._ids[name][offsets[pos] : offsets[pos + 1]]
+
+    def ids(self, kind: str, role: str, day: str) -> npt.NDArray[np.int32]:
+        return self.series(f"{kind}.{role}", day)
+
+    def mask(self, name: str, day: str) -> npt.NDArray[np.bool_]:
+        """Whether each node is in series `name` on `day`."""
+
+        mask = np.zeros(self.n_nodes, dtype=bool)
+        mask[self.series(name, day)] = True
+        return mask
+
+    def counts(self, name: str) -> pl.DataFrame:
+        """Number of active accounts of series `name` per day."""
+
+        return pl.DataFrame({"day": self.days, name: np.diff(self._offsets[name])})
+
+    def activity(self, day: str) -> Activity:
+        return Activity(
+            consumers=np.asarray(self.series("consumer", day)),
+            producers=np.asarray(self.series("producer", day)),
+            profiles=np.asarray(self.series("profile.actor", day)),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the daily activity index")
+    parser.add_argument("store_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--start", help="First day to index (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day to index (YYYY-MM-DD)")
+    parser.add_argument("--dids", default=DID_INDEX)
+    args = parser.parse_args()
+
+    build(args.store_dir, DidIndex.load(args.dids), args.out_dir, args.start, args.end)
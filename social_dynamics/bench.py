@@ -0,0 +1,453 @@
+"""
+Benchmarks of the graph backends used in network-structure.py.
+
+Each backend runs the same tasks on the same datasets: ingest (build a directed
+graph from edge arrays), lcc (largest weakly connected component), clustering
+(mean local clustering of sampled nodes), path_length (mean BFS distance from
+sampled sources) and assortativity (degree assortativity of the LCC). All
+backends get the same node sample, so their results can be compared too. Tasks
+a backend lists in `unsupported` are reported as such instead of run.
+
+Datasets are slices of the Parquet event store (`stream:START:END`) or
+synthetic graphs with a skewed in-degree (`synthetic:N_NODES`). Every (dataset,
+backend) pair runs in a fresh process, so peak RSS is that of the case alone.
+A row per task with its wall time and edge throughput, and a row per case with
+its peak RSS (no task), are appended to a jsonl file.
+
+    python -m social_dynamics.bench --datasets synthetic:10000 synthetic:100000 \\
+        stream:2023-01-01:2023-02-01 --out ../data/benchmarks.jsonl
+"""
+
+import abc
+import argparse
+import importlib.util
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import time
+import typing as t
+from datetime import datetime, timezone
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse.csgraph import shortest_path
+
+from social_dynamics import metrics
+from social_dynamics.dids import DidIndex
+from social_dynamics.events import load_follows
+from social_dynamics.graph import dedup_edges, to_csr, to_raphtory
+
+TASKS = ["ingest", "lcc", "clustering", "path_length", "assortativity"]
+SYNTHETIC_DEGREE = 10  # Mean out-degree of synthetic graphs
+
+EVENTS_DIR = "../data/events"
+DID_INDEX = "../data/dids.parquet"
+
+Edges: t.TypeAlias = tuple[npt.NDArray[np.int32], npt.NDArray[np.int32], int]
+
+
+class Backend(abc.ABC):
+    name: str
+    module: t.Optional[str] = None  # Must be importable to run
+    max_nodes: int = 1 << 40  # Larger datasets are skipped
+    unsupported: frozenset[str] = frozenset()  # Analysis tasks it can't run
+
+    def available(self) -> bool:
+        return self.module is None or importlib.util.find_spec(self.module) is not None
+
+    @abc.abstractmethod
+    def ingest(self, src: npt.NDArray, dst: npt.NDArray, n_nodes: int) -> t.Any: ...
+
+    @abc.abstractmethod
+    def lcc(self, graph: t.Any) -> tuple[t.Any, npt.NDArray[np.int64]]:
+        """Undirected LCC, and its sorted node IDs."""
+
+    @abc.abstractmethod
+    def clustering(self, graph: t.Any, nodes: npt.NDArray[np.int64]) -> float: ...
+
+    @abc.abstractmethod
+    def path_length(self, graph: t.Any, nodes: npt.NDArray[np.int64]) -> float: ...
+
+    @abc.abstractmethod
+    def assortativity(self, graph: t.Any) -> float: ...
+
+
+class Scipy(Backend):
+    name = "scipy"
+
+    def ingest(self, src, dst, n_nodes):
+        return to_csr(*dedup_edges(src, dst, n_nodes), n_nodes)
+
+    def lcc(self, graph):
+        adj, nodes = metrics.largest_component(graph)
+        return (metrics.to_undirected(adj), nodes), nodes
+
+    def clustering(self, graph, nodes):
+        adj, ids = graph
+        adj = adj.astype(np.int64)
+        rows = adj[np.searchsorted(ids, nodes)]
+        degree = np.diff(rows.indptr)
+
+        # Closed wedges of each node: edges among its neighbors
+        triangles = np.asarray((rows @ adj).multiply(rows).sum(axis=1)).ravel() / 2
+        wedges = degree * (degree - 1) / 2
+        local = np.divide(
+            triangles, wedges, out=np.zeros(len(rows.indptr) - 1), where=wedges > 0
+        )
+        return float(local.mean())
+
+    def path_length(self, graph, nodes):
+        adj, ids = graph
+        dist = shortest_path(
+            adj, directed=False, unweighted=True, indices=np.searchsorted(ids, nodes)
+        )
+        return float(dist.sum() / (len(nodes) * (len(ids) - 1)))
+
+    def assortativity(self, graph):
+        return metrics.degree_assortativity(graph[0])
+
+
+class NetworkX(Backend):
+    name = "networkx"
+    module = "networkx"
+    max_nodes = 200_000
+
+    def ingest(self, src, dst, n_nodes):
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(n_nodes))
+        graph.add_edges_from(zip(src.tolist(), dst.tolist()))
+        return graph
+
+    def lcc(self, graph):
+        import networkx as nx
+
+        nodes = max(nx.weakly_connected_components(graph), key=len)
+        return nx.Graph(graph.subgraph(nodes)), np.sort(np.fromiter(nodes, np.int64))
+
+    def clustering(self, graph, nodes):
+        import networkx as nx
+
+        local = nx.clustering(graph, nodes.tolist())
+        return float(np.mean([local[node] for node in nodes.tolist()]))
+
+    def path_length(self, graph, nodes):
+        import networkx as nx
+
+        total = sum(
+            sum(nx.single_source_shortest_path_length(graph, node).values())
+            for node in nodes.tolist()
+        )
+        return total / (len(nodes) * (graph.number_of_nodes() - 1))
+
+    def assortativity(self, graph):
+        import networkx as nx
+
+        return float(nx.degree_assortativity_coefficient(graph))
+
+
+class GraphTool(Backend):
+    name = "graph-tool"
+    module = "graph_tool"
+
+    def ingest(self, src, dst, n_nodes):
+        import graph_tool.all as gt
+
+        graph = gt.Graph(directed=True)
+        graph.add_vertex(n_nodes)
+        graph.add_edge_list(np.column_stack((src, dst)))
+        gt.remove_parallel_edges(graph)
+        gt.remove_self_loops(graph)
+        return graph
+
+    def lcc(self, graph):
+        import graph_tool.all as gt
+
+        graph = gt.Graph(graph, directed=False)
+        gt.remove_parallel_edges(graph)
+        view = gt.extract_largest_component(graph, directed=False)
+        return view, np.flatnonzero(view.get_vertex_filter()[0].a).astype(np.int64)
+
+    def clustering(self, graph, nodes):
+        import graph_tool.all as gt
+
+        return float(gt.local_clustering(graph).a[nodes].mean())
+
+    def path_length(self, graph, nodes):
+        import graph_tool.all as gt
+
+        total = 0
+        for node in nodes.tolist():
+            dist = gt.shortest_distance(graph, source=graph.vertex(node)).a
+            total += dist[graph.get_vertex_filter()[0].a.astype(bool)].sum()
+        return float(total / (len(nodes) * (graph.num_vertices() - 1)))
+
+    def assortativity(self, graph):
+        import graph_tool.all as gt
+
+        return float(gt.scalar_assortativity(graph, "total")[0])
+
+
+class Raphtory(Backend):
+    name = "raphtory"
+    module = "raphtory"
+    unsupported = frozenset({"assortativity"})  # No algorithm for it
+
+    def ingest(self, src, dst, n_nodes):
+        return to_raphtory(src, dst, np.arange(len(src)))
+
+    def lcc(self, graph):
+        view = graph.largest_connected_component()
+        return view, np.sort(np.fromiter((node.id for node in view.nodes), np.int64))
+
+    def clustering(self, graph, nodes):
+        import raphtory.algorithms as alg
+
+        return float(
+            np.mean(
+                [
+                    alg.local_clustering_coefficient(graph, node)
+                    for node in nodes.tolist()
+                ]
+            )
+        )
+
+    def path_length(self, graph, nodes):
+        import raphtory.algorithms as alg
+
+        total = 0
+        for node in nodes.tolist():
+            paths = alg.single_source_shortest_path(graph, node)
+            total += sum(len(path) - 1 for path in paths.get_all_values())
+        return total / (len(nodes) * (graph.count_nodes() - 1))
+
+    def assortativity(self, graph):
+        return float("nan")  # Never run, it's unsupported
+
+
+BACKENDS: dict[str, Backend] = {
+    backend.name: backend for backend in [Scipy(), NetworkX(), GraphTool(), Raphtory()]
+}
+
+
+def synthetic_edges(n_nodes: int, seed: int = 0) -> Edges:
+    """Uniform followers and a heavy-tailed choice of who gets followed."""
+
+    rng = np.random.default_rng(seed)
+    n_edges = n_nodes * SYNTHETIC_DEGREE
+    src = rng.integers(0, n_nodes, n_edges)
+    dst = np.floor(n_nodes * rng.random(n_edges) ** 3).astype(np.int64)
+
+    src, dst = dedup_edges(src, dst, n_nodes)
+    return src, dst, n_nodes
+
+
+def stream_edges(start: str, end: str, events_dir: str, did_index: str) -> Edges:
+    index = DidIndex.load(did_index)
+    follows = load_follows(events_dir, start, end, index=index)
+    src, dst = dedup_edges(
+        follows["src"].to_numpy(), follows["dst"].to_numpy(), len(index)
+    )
+
+    # Only keep nodes with an edge, so empty DIDs don't dominate the timings
+    nodes, inverse = np.unique(np.concatenate([src, dst]), return_inverse=True)
+    inverse = inverse.astype(np.int32)
+    return inverse[: len(src)], inverse[len(src) :], len(nodes)
+
+
+def load_dataset(spec: str, events_dir: str, did_index: str, seed: int) -> Edges:
+    kind, *args = spec.split(":")
+    if kind == "synthetic":
+        return synthetic_edges(int(args[0]), seed)
+    if kind == "stream":
+        return stream_edges(args[0], args[1], events_dir, did_index)
+
+    raise ValueError(f"Unknown dataset: {spec}")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+def run_case(
+    backend_name: str,
+    spec: str,
+    tasks: list[str],
+    n_samples: int,
+    seed: int,
+    events_dir: str,
+    did_index: str,
+) -> list[dict[str, t.Any]]:
+    """
+    Run `tasks` in order on one dataset, one row per task, then a row for the
+    case with its peak RSS.
+    """
+
+    backend = BACKENDS[backend_name]
+    src, dst, n_nodes = load_dataset(spec, events_dir, did_index, seed)
+    base = {
+        "dataset": spec,
+        "backend": backend_name,
+        "n_nodes": n_nodes,
+        "n_edges": len(src),
+    }
+
+    if n_nodes > backend.max_nodes:
+        return [{**base, "error": f"skipped, over {backend.max_nodes} nodes"}]
+
+    rows = []
+    graph, lcc, nodes = None, None, np.empty(0, dtype=np.int64)
+    for task in TASKS:
+        if task not in tasks and task not in ("ingest", "lcc"):
+            continue
+
+        if task in backend.unsupported:
+            rows.append({**base, "task": task, "error": "unsupported"})
+            continue
+
+        start_time = time.perf_counter()
+        value: t.Any = None
+        match task:
+            case "ingest":
+                graph = backend.ingest(src, dst, n_nodes)
+            case "lcc":
+                lcc, lcc_nodes = backend.lcc(graph)
+                value = len(lcc_nodes)
+                rng = np.random.default_rng(seed)
+                nodes = np.sort(
+                    rng.choice(lcc_nodes, min(n_samples, len(lcc_nodes)), replace=False)
+                )
+            case "clustering":
+                value = backend.clustering(lcc, nodes)
+            case "path_length":
+                value = backend.path_length(lcc, nodes)
+            case "assortativity":
+                value = backend.assortativity(lcc)
+
+        seconds = time.perf_counter() - start_time
+        if task in tasks:
+            rows.append(
+                {
+                    **base,
+                    "task": task,
+                    "seconds": seconds,
+                    "edges_per_sec": len(src) / seconds if seconds else None,
+                    "value": value,
+                }
+            )
+
+    # ru_maxrss only grows, so it's the peak of the whole case, not of a task
+    rows.append({**base, "peak_rss_mb": peak_rss_mb()})
+    return rows
+
+
+def git_commit() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    datasets: list[str],
+    backends: list[str],
+    out_path: str,
+    tasks: list[str] = TASKS,
+    n_samples: int = 100,
+    seed: int = 0,
+    timeout: float = 3600,
+    events_dir: str = EVENTS_DIR,
+    did_index: str = DID_INDEX,
+) -> pl.DataFrame:
+    """Run every backend on every dataset, appending rows to `out_path`."""
+
+    run_info = {
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "n_samples": n_samples,
+        "seed": seed,
+    }
+    ctx = mp.get_context("spawn")
+
+    results = []
+    for spec in datasets:
+        for name in backends:
+            backend = BACKENDS[name]
+            case = {"dataset": spec, "backend": name}
+            if not backend.available():
+                print(f"Skipping {name}: {backend.module} is not installed")
+                continue
+
+            print(f"Running {name} on {spec}")
+            with ctx.Pool(1) as pool:
+                job = pool.apply_async(
+                    run_case,
+                    (name, spec, tasks, n_samples, seed, events_dir, did_index),
+                )
+                try:
+                    rows = job.get(timeout)
+                except mp.TimeoutError:
+                    rows = [{**case, "error": f"timed out after {timeout}s"}]
+
+            rows = [{**run_info, **row} for row in rows]
+            with open(out_path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+
+            results.extend(rows)
+
+    return pl.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark graph backends")
+    parser.add_argument("--datasets", nargs="+", default=["synthetic:10000"])
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    parser.add_argument("--tasks", nargs="+", choices=TASKS, default=TASKS)
+    parser.add_argument("--samples", type=int, default=100, help="Nodes sampled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=3600, help="Per case, in s")
+    parser.add_argument("--events", default=EVENTS_DIR)
+    parser.add_argument("--dids", default=DID_INDEX)
+    parser.add_argument("--out", default="../data/benchmarks.jsonl")
+    args = parser.parse_args()
+
+    results = run(
+        args.datasets,
+        args.backends,
+        args.out,
+        tasks=args.tasks,
+        n_samples=args.samples,
+        seed=args.seed,
+        timeout=args.timeout,
+        events_dir=args.events,
+        did_index=args.dids,
+    )
+
+    if "seconds" in results.columns:
+        print(
+            results.filter(pl.col("seconds").is_not_null())
+            .pivot(on="backend", index=["dataset", "task"], values="seconds")
+            .sort("dataset", "task")
+        )
+    if "peak_rss_mb" in results.columns:
+        print(
+            results.filter(pl.col("peak_rss_mb").is_not_null())
+            .pivot(on="backend", index="dataset", values="peak_rss_mb")
+            .sort("dataset")
+        )
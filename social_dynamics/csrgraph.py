@@ -0,0 +1,149 @@
+"""
+On-disk CSR graphs that are memory-mapped instead of loaded.
+
+A graph is a directory of `.npy` files (whose headers keep the data aligned)
+plus a small `meta.json`:
+
+    indptr.npy      int64, n_rows + 1    out-edge offsets
+    indices.npy     int32, n_edges       out-neighbors, sorted per node
+    in_indptr.npy   int64, n_cols + 1    in-edge offsets (optional)
+    in_indices.npy  int32, n_edges       in-neighbors (optional)
+
+`CSRGraph` opens them with `np.load(mmap_mode="r")`, so startup is instant and
+queries only page in the parts of the arrays they touch.
+"""
+
+import json
+import os
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from scipy.sparse import csr_matrix
+
+CHUNK_EDGES = 1 << 24  # Edges per chunk for whole-graph passes
+
+
+def save_csr(adj: csr_matrix, path: str, in_edges: bool = True) -> None:
+    """Write `adj` to `path`, and its transpose too if `in_edges`."""
+
+    os.makedirs(path, exist_ok=True)
+
+    adj = adj.tocsr()
+    adj.sort_indices()
+    np.save(os.path.join(path, "indptr.npy"), adj.indptr.astype(np.int64))
+    np.save(os.path.join(path, "indices.npy"), adj.indices.astype(np.int32))
+
+    if in_edges:
+        adj_t = adj.T.tocsr()
+        adj_t.sort_indices()
+        np.save(os.path.join(path, "in_indptr.npy"), adj_t.indptr.astype(np.int64))
+        np.save(os.path.join(path, "in_indices.npy"), adj_t.indices.astype(np.int32))
+
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"shape": list(adj.shape), "n_edges": int(adj.nnz)}, f)
+
+
+class CSRGraph:
+    """Read-only view of a graph saved with `save_csr`."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        self.shape: tuple[int, int] = tuple(meta["shape"])
+        self.n_nodes = self.shape[0]
+        self.n_edges: int = meta["n_edges"]
+
+        self.indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        self.indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="r")
+
+        self.in_indptr: t.Optional[np.ndarray] = None
+        self.in_indices: t.Optional[np.ndarray] = None
+        if os.path.exists(os.path.join(path, "in_indptr.npy")):
+            self.in_indptr = np.load(os.path.join(path, "in_indptr.npy"), mmap_mode="r")
+            self.in_indices = np.load(
+                os.path.join(path, "in_indices.npy"), mmap_mode="r"
+            )
+
+    def out_degree(self, nodes: t.Optional[npt.ArrayLike] = None) -> np.ndarray:
+        if nodes is None:
+            return np.diff(self.indptr)
+
+        nodes = np.asarray(nodes)
+        return self.indptr[nodes + 1] - self.indptr[nodes]
+
+    def in_degree(self, nodes: t.Optional[npt.ArrayLike] = None) -> np.ndarray:
+        if self.in_indptr is not None:
+            if nodes is None:
+                return np.diff(self.in_indptr)
+
+            nodes = np.asarray(nodes)
+            return self.in_indptr[nodes + 1] - self.in_indptr[nodes]
+
+        # No transpose on disk, count in chunks
+        degree = np.zeros(self.shape[1], dtype=np.int64)
+        for start in range(0, self.n_edges, CHUNK_EDGES):
+            chunk = self.indices[start : start + CHUNK_EDGES]
+            degree += np.bincount(chunk, minlength=self.shape[1])
+
+        return degree if nodes is None else degree[np.asarray(nodes)]
+
+    def __len__(self) -> int:
+        return self.n_nodes
+
+    def to_csr(self) -> csr_matrix:
+        """The whole adjacency as a scipy matrix, with indices still on disk."""
+
+        return csr_matrix(
+            (np.ones(self.n_edges, dtype=np.int8), self.indices, self.indptr),
+            shape=self.shape,
+            copy=False,
+        )
+
+    def neighbors(self, node: int) -> np.ndarray:
+        return self.indices[self.indptr[node] : self.indptr[node + 1]]
+
+    def in_neighbors(self, node: int) -> np.ndarray:
+        if self.in_indptr is None or self.in_indices is None:
+            raise ValueError("Graph was saved without in-edges")
+
+        return self.in_indices[self.in_indptr[node] : self.in_indptr[node + 1]]
+
+    def has_edge(self, src: int, dst: int) -> bool:
+        row = self.neighbors(src)
+        idx = np.searchsorted(row, dst)
+        return bool(idx < len(row) and row[idx] == dst)
+
+    def rows(self, start: int, stop: int) -> csr_matrix:
+        """Out-edges of nodes `start` to `stop`, as an in-memory CSR matrix."""
+
+        lo, hi = self.indptr[start], self.indptr[stop]
+        indices = np.array(self.indices[lo:hi])
+        indptr = np.array(self.indptr[start : stop + 1]) - lo
+
+        return csr_matrix(
+            (np.ones(len(indices), dtype=np.int8), indices, indptr),
+            shape=(stop - start, self.shape[1]),
+        )
+
+    def subgraph(self, nodes: npt.ArrayLike) -> csr_matrix:
+        """Induced subgraph on `nodes`, relabelled 0..len(nodes) - 1 in that order."""
+
+        if self.shape[0] != self.shape[1]:
+            raise ValueError("Induced subgraphs need a square adjacency")
+
+        nodes = np.asarray(nodes, dtype=np.int64)
+        relabel = np.full(self.n_nodes, -1, dtype=np.int64)
+        relabel[nodes] = np.arange(len(nodes))
+
+        starts, stops = self.indptr[nodes], self.indptr[nodes + 1]
+        rows = [self.indices[lo:hi] for lo, hi in zip(starts, stops)]
+        src = np.repeat(np.arange(len(nodes)), stops - starts)
+        dst = relabel[np.concatenate(rows)] if rows else np.empty(0, dtype=np.int64)
+
+        keep = dst >= 0
+        return csr_matrix(
+            (np.ones(keep.sum(), dtype=np.int8), (src[keep], dst[keep])),
+            shape=(len(nodes), len(nodes)),
+        )
@@ -0,0 +1,83 @@
+"""
+Dense integer IDs for DIDs.
+
+A DID's ID is its row in dids.csv, so IDs follow account creation order and
+can be used directly as array indices. The table is stored as a single-column
+Parquet file, and whole columns of DIDs are encoded at once with a polars hash
+lookup. DIDs that are not in the table (e.g. follow subjects created after the
+crawl cutoff) map to null, or -1 in numpy arrays.
+
+    python -m social_dynamics.dids ../data/dids.csv ../data/dids.parquet
+"""
+
+import argparse
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+
+ID_DTYPE = pl.Int32
+
+
+class DidIndex:
+    def __init__(self, dids: pl.Series):
+        self.dids = dids.rename("did")
+        self.ids = pl.int_range(len(self.dids), dtype=ID_DTYPE, eager=True)
+        self._lookup: t.Optional[dict[str, int]] = None
+
+    @classmethod
+    def from_csv(cls, path: str) -> "DidIndex":
+        dids = pl.read_csv(path, columns=["did"])["did"]
+        if dids.n_unique() != len(dids):
+            raise ValueError(f"Duplicate DIDs in {path}")
+
+        return cls(dids)
+
+    @classmethod
+    def load(cls, path: str) -> "DidIndex":
+        return cls(pl.read_parquet(path)["did"])
+
+    def save(self, path: str) -> None:
+        self.dids.to_frame().write_parquet(path)
+
+    def __len__(self) -> int:
+        return len(self.dids)
+
+    def __getitem__(self, did: str) -> int:
+        if self._lookup is None:
+            self._lookup = dict(zip(self.dids.to_list(), range(len(self.dids))))
+
+        return self._lookup[did]
+
+    def encode_columns(
+        self, frame: pl.DataFrame | pl.LazyFrame, columns: dict[str, str]
+    ) -> t.Any:
+        """Add an ID column for each `{did_column: id_column}` to `frame`."""
+
+        return frame.with_columns(
+            pl.col(did_column)
+            .replace_strict(self.dids, self.ids, default=None, return_dtype=ID_DTYPE)
+            .alias(id_column)
+            for did_column, id_column in columns.items()
+        )
+
+    def encode(self, dids: t.Iterable[str]) -> npt.NDArray[np.int32]:
+        frame = pl.DataFrame({"did": pl.Series(list(dids), dtype=pl.String)})
+        ids = self.encode_columns(frame, {"did": "id"})["id"]
+
+        return ids.fill_null(-1).to_numpy().astype(np.int32)
+
+    def decode(self, ids: npt.ArrayLike) -> pl.Series:
+        return self.dids.gather(np.asarray(ids, dtype=np.int64))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the DID -> ID table")
+    parser.add_argument("csv_path")
+    parser.add_argument("out_path")
+    args = parser.parse_args()
+
+    index = DidIndex.from_csv(args.csv_path)
+    index.save(args.out_path)
+    print(f"Saved {len(index)} DIDs to {args.out_path}")
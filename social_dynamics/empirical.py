@@ -0,0 +1,230 @@
+"""
+Belief dynamics driven by the Bluesky stream, one day at a time.
+
+Beliefs live in an int8 array indexed by node ID (see `DidIndex`), -1 until the
+node joins. A node joins when it first creates a profile, follows, is followed
+or is active, and gets a random belief, which is also its internal field. Each
+day, `BeliefModel.update`:
+
+1. applies the day's net follow changes (`TemporalEdges.iter_days`) to the
+   follow adjacency,
+2. updates the consumer-active nodes (those that posted, liked or reposted)
+   that follow at least one producer-active node (one that posted or
+   reposted), from an `ActivityIndex` or `day_activity`. Their social field
+   comes from the beliefs of the producers they follow only, and new beliefs
+   are sampled in one batch with the Galesic-Stein kernel (see `beliefs`). With
+   two beliefs this is an Ising model, with more it is a Potts model.
+
+Then it appends a row of aggregates for the day. To start part way through the
+stream, `start_from` takes the follow graph as of the first day.
+
+    model = BeliefModel(len(index), n_beliefs=2, w=0.3, beta=1.0, seed=0)
+    activity = ActivityIndex("../data/activity")
+    for day, changes in edges.iter_days():
+        model.update(day, changes, activity.activity(day))
+    model.table()
+
+    python -m social_dynamics.empirical --start 2023-01-01 --end 2023-03-01 \\
+        --out ../data/empirical-beliefs.csv
+"""
+
+import argparse
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse import csr_matrix
+
+from social_dynamics.activity import Activity, ActivityIndex, day_activity
+from social_dynamics.beliefs import boltzmann, one_hot, sample, social_field
+from social_dynamics.dids import DidIndex
+from social_dynamics.graph import dedup_edges, to_csr
+from social_dynamics.results import ResultsWriter
+from social_dynamics.temporal import EdgeChanges, TemporalEdges, to_us
+
+EVENTS_DIR = "../data/events"
+DID_INDEX = "../data/dids.parquet"
+
+
+class BeliefModel:
+    def __init__(
+        self,
+        n_nodes: int,
+        n_beliefs: int = 2,
+        w: float = 0.3,
+        beta: float = 1.0,
+        xsocag: int = 0,
+        seed: t.Optional[int] = None,
+        out: t.Optional[ResultsWriter] = None,
+    ):
+        self.n_nodes = n_nodes
+        self.n_beliefs = n_beliefs
+        self.w = w
+        self.beta = beta
+        self.xsocag = xsocag
+        self.rng = np.random.default_rng(seed)
+        self.out = out
+
+        self.beliefs = np.full(n_nodes, -1, dtype=np.int8)
+        self.h_ind = np.zeros((n_nodes, n_beliefs), dtype=np.float32)
+        self.adj = csr_matrix((n_nodes, n_nodes), dtype=np.int8)  # Follows
+        self.rows: list[dict[str, t.Any]] = []
+
+    @property
+    def joined(self) -> npt.NDArray[np.bool_]:
+        return self.beliefs >= 0
+
+    def join(self, nodes: npt.NDArray[np.integer]) -> npt.NDArray[np.int64]:
+        """Give a random belief to the `nodes` that have none, returning them."""
+
+        nodes = np.unique(nodes)
+        new = nodes[self.beliefs[nodes] < 0]
+        self.beliefs[new] = self.rng.integers(self.n_beliefs, size=len(new))
+        self.h_ind[new] = one_hot(self.beliefs[new], self.n_beliefs)
+        return new
+
+    def start_from(self, adj: csr_matrix) -> npt.NDArray[np.int64]:
+        """Start from the follow graph `adj`, joining every node with a follow."""
+
+        self.adj = csr_matrix(adj, dtype=np.int8)
+        follows = np.diff(self.adj.indptr) > 0
+        follows[self.adj.indices] = True
+        return self.join(np.flatnonzero(follows))
+
+    def update(
+        self, day: str, changes: EdgeChanges, activity: Activity
+    ) -> dict[str, t.Any]:
+        """Apply a day's follow changes, then update that day's active nodes."""
+
+        n = self.n_nodes
+        self.adj = (
+            self.adj
+            - to_csr(*dedup_edges(changes.removed_src, changes.removed_dst, n), n)
+            + to_csr(*dedup_edges(changes.added_src, changes.added_dst, n), n)
+        )
+        self.adj.eliminate_zeros()
+
+        new = self.join(
+            np.concatenate(
+                [
+                    changes.added_src,
+                    changes.added_dst,
+                    activity.consumers,
+                    activity.producers,
+                    activity.profiles,
+                ]
+            )
+        )
+
+        # Follows of consumers, restricted to producers
+        producing = np.zeros(n, dtype=bool)
+        producing[activity.producers] = True
+        seen = self.adj[activity.consumers]
+        seen.data = seen.data * producing[seen.indices]
+        seen.eliminate_zeros()
+
+        listening = np.diff(seen.indptr) > 0
+        consumers = activity.consumers[listening]
+        seen = seen[listening]
+
+        h_soc = social_field(seen, self.beliefs, self.n_beliefs, self.xsocag, self.rng)
+        probs = boltzmann(self.h_ind[consumers], h_soc, self.w, self.beta)
+        previous = self.beliefs[consumers].copy()
+        self.beliefs[consumers] = sample(probs, self.rng)
+
+        row = self.summary(day, activity, len(new), consumers, previous)
+        self.rows.append(row)
+        if self.out is not None:
+            aggregates = {k: v for k, v in row.items() if k != "day"}
+            self.out.append(self.beliefs, **aggregates)
+
+        return row
+
+    def summary(
+        self,
+        day: str,
+        activity: Activity,
+        n_new: int,
+        updated: npt.NDArray[np.integer],
+        previous: npt.NDArray[np.int8],
+    ) -> dict[str, t.Any]:
+        joined = self.beliefs[self.joined]
+        counts = np.bincount(joined, minlength=self.n_beliefs)
+
+        row: dict[str, t.Any] = {
+            "day": day,
+            "nodes": len(joined),
+            "new_nodes": n_new,
+            "edges": self.adj.nnz,
+            "consumers": len(activity.consumers),
+            "producers": len(activity.producers),
+            "updated": len(updated),
+            "flipped": int((self.beliefs[updated] != previous).sum()),
+        }
+        for belief, count in enumerate(counts):
+            row[f"share_{belief}"] = float(count / max(len(joined), 1))
+
+        if self.n_beliefs == 2:
+            row["magnetization"] = float((counts[1] - counts[0]) / max(len(joined), 1))
+
+        return row
+
+    def table(self) -> pl.DataFrame:
+        return pl.DataFrame(self.rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate beliefs over the stream")
+    parser.add_argument("--start", help="First day (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD)")
+    parser.add_argument("--beliefs", type=int, default=2, help="Number of beliefs")
+    parser.add_argument("--w", type=float, default=0.3)
+    parser.add_argument("--beta", type=float, default=1.0)
+    parser.add_argument("--xsocag", type=int, default=0, choices=[0, 1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--events", default=EVENTS_DIR)
+    parser.add_argument("--dids", default=DID_INDEX)
+    parser.add_argument("--edges", help="Saved TemporalEdges, instead of the store")
+    parser.add_argument("--activity", help="Activity index, instead of the store")
+    parser.add_argument("--states", help="HDF5 file for each day's beliefs")
+    parser.add_argument("--out", default="../data/empirical-beliefs.csv")
+    args = parser.parse_args()
+
+    index = DidIndex.load(args.dids)
+    if args.edges is not None:
+        edges = TemporalEdges.load(args.edges)
+    else:
+        # From the first follow, so the graph as of --start is complete
+        edges = TemporalEdges.from_store(args.events, index, end=args.end)
+
+    params = {"w": args.w, "beta": args.beta, "xsocag": args.xsocag, "seed": args.seed}
+    out = None
+    if args.states is not None:
+        out = ResultsWriter(args.states, len(index), args.beliefs, attrs=params)
+
+    activity = None
+    if args.activity is not None:
+        activity = ActivityIndex(args.activity)
+
+    model = BeliefModel(len(index), args.beliefs, out=out, **params)
+    if args.start:
+        # Follows from before the first day, whose changes are skipped below
+        model.start_from(edges.graph_at(to_us(args.start) - 1))
+
+    for day, changes in edges.iter_days():
+        if (args.start and day < args.start) or (args.end and day > args.end):
+            continue
+
+        if activity is not None:
+            day_active = activity.activity(day)
+        else:
+            day_active = day_activity(args.events, index, day)
+
+        row = model.update(day, changes, day_active)
+        print(row)
+
+    if out is not None:
+        out.close()
+
+    model.table().write_csv(args.out)
@@ -0,0 +1,278 @@
+"""
+Columnar event store built from the per-day jsonl stream.
+
+`convert_stream` splits every `{STREAM_DIR}/{YYYY-MM-DD}.jsonl` file by record
+type into `{out_dir}/{kind}/{YYYY-MM-DD}.parquet`, with typed columns and
+`created_at` as a UTC timestamp. Parquet dictionary-encodes the DID columns.
+`scan_events` only opens the files for the requested days, and polars pushes
+column selection and row filters down into the Parquet reader.
+
+    python -m social_dynamics.events ../data/stream ../data/events
+"""
+
+import argparse
+import json
+import os
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import polars as pl
+
+from social_dynamics.dids import DidIndex
+from social_dynamics.instrument import NO_STATS, Stats, profiler
+
+DELETE_TYPE = "com.atproto.repo.deleteRecord"
+
+# Record $type -> partition name
+KINDS = {
+    "app.bsky.actor.profile": "profile",
+    "app.bsky.feed.like": "like",
+    "app.bsky.feed.post": "post",
+    "app.bsky.feed.repost": "repost",
+    "app.bsky.graph.follow": "follow",
+    "app.bsky.graph.block": "block",
+    DELETE_TYPE: "delete",
+}
+
+SCHEMAS: dict[str, dict[str, t.Any]] = {
+    "profile": {"did": pl.String, "created_at": pl.String},
+    "like": {
+        "did": pl.String,
+        "rkey": pl.String,
+        "subject_uri": pl.String,
+        "created_at": pl.String,
+    },
+    "post": {
+        "did": pl.String,
+        "rkey": pl.String,
+        "text": pl.String,
+        "root_uri": pl.String,
+        "parent_uri": pl.String,
+        "created_at": pl.String,
+    },
+    "repost": {
+        "did": pl.String,
+        "rkey": pl.String,
+        "subject_uri": pl.String,
+        "created_at": pl.String,
+    },
+    "follow": {
+        "did": pl.String,
+        "rkey": pl.String,
+        "subject": pl.String,
+        "created_at": pl.String,
+    },
+    "block": {
+        "did": pl.String,
+        "rkey": pl.String,
+        "subject": pl.String,
+        "created_at": pl.String,
+    },
+    "delete": {
+        "did": pl.String,
+        "collection": pl.String,
+        "rkey": pl.String,
+        "created_at": pl.String,
+    },
+}
+
+
+def parse_event(kind: str, record: dict[str, t.Any]) -> tuple:
+    """Row for `record`, in the column order of SCHEMAS[kind]."""
+
+    did = record["did"]
+    created_at = record.get("createdAt")
+    rkey = record.get("uri", "").rsplit("/", 1)[-1] or None
+
+    match kind:
+        case "profile":
+            return did, created_at
+        case "like" | "repost":
+            return did, rkey, record["subject"]["uri"], created_at
+        case "post":
+            reply = record.get("reply") or {}
+            return (
+                did,
+                rkey,
+                record.get("text"),
+                reply.get("root", {}).get("uri"),
+                reply.get("parent", {}).get("uri"),
+                created_at,
+            )
+        case "follow" | "block":
+            return did, rkey, record["subject"], created_at
+        case "delete":
+            return did, record["collection"], rkey, created_at
+
+    raise ValueError(f"Unknown event kind: {kind}")
+
+
+def convert_day(
+    stream_dir: str, out_dir: str, day: str, stats: Stats = NO_STATS
+) -> dict[str, int]:
+    """Convert one day file, returning the number of rows written per kind."""
+
+    rows: dict[str, list[tuple]] = {kind: [] for kind in SCHEMAS}
+    errors = 0
+
+    with open(os.path.join(stream_dir, f"{day}.jsonl"), "r") as f:
+        for line in f:
+            try:
+                with stats.stage("json_decode") as timer:
+                    record = json.loads(line)
+                    timer.kind = record["$type"]
+
+                with stats.stage("filter", record["$type"]):
+                    kind = KINDS.get(record["$type"])
+                    if kind is not None:
+                        rows[kind].append(parse_event(kind, record))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                errors += 1
+
+    if errors:
+        print(f"Skipped {errors} malformed records in {day}")
+        stats.count("errors", errors)
+
+    for kind, kind_rows in rows.items():
+        if not kind_rows:
+            continue
+
+        stats.count("records", len(kind_rows), kind)
+        with stats.stage("write", kind):
+            os.makedirs(os.path.join(out_dir, kind), exist_ok=True)
+            (
+                pl.DataFrame(kind_rows, schema=SCHEMAS[kind], orient="row")
+                .with_columns(
+                    pl.col("created_at").str.to_datetime(
+                        time_unit="us", time_zone="UTC", strict=False
+                    )
+                )
+                .sort("created_at")
+                .write_parquet(os.path.join(out_dir, kind, f"{day}.parquet"))
+            )
+
+    return {kind: len(kind_rows) for kind, kind_rows in rows.items()}
+
+
+def convert_day_stats(
+    stream_dir: str, out_dir: str, day: str
+) -> tuple[dict[str, int], dict[str, t.Any]]:
+    """`convert_day` in a worker process, with a snapshot of its stats."""
+
+    stats = Stats()
+    counts = convert_day(stream_dir, out_dir, day, stats)
+    return counts, stats.snapshot()
+
+
+def list_days(path: str, suffix: str) -> list[str]:
+    """Sorted YYYY-MM-DD names of the `suffix` files in `path`."""
+
+    if not os.path.isdir(path):
+        return []
+
+    return sorted(
+        name[: -len(suffix)] for name in os.listdir(path) if name.endswith(suffix)
+    )
+
+
+def convert_stream(
+    stream_dir: str,
+    out_dir: str,
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+    workers: int = 1,
+    stats: Stats = NO_STATS,
+) -> None:
+    days = [
+        day
+        for day in list_days(stream_dir, ".jsonl")
+        if (start is None or day >= start) and (end is None or day <= end)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            convert_day_stats, [stream_dir] * len(days), [out_dir] * len(days), days
+        )
+        for day, (day_counts, day_stats) in zip(days, results):
+            stats.merge(day_stats)
+            print(f"Converted {day}: {sum(day_counts.values())} events")
+
+
+def scan_events(
+    store_dir: str,
+    kind: str,
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+) -> pl.LazyFrame:
+    """Lazy frame over the `kind` events from day `start` to `end`, inclusive."""
+
+    kind_dir = os.path.join(store_dir, kind)
+    files = [
+        os.path.join(kind_dir, f"{day}.parquet")
+        for day in list_days(kind_dir, ".parquet")
+        if (start is None or day >= start) and (end is None or day <= end)
+    ]
+
+    if not files:
+        return pl.LazyFrame(
+            schema={**SCHEMAS[kind], "created_at": pl.Datetime("us", "UTC")}
+        )
+
+    return pl.scan_parquet(files)
+
+
+def load_follows(
+    store_dir: str,
+    start: t.Optional[str] = None,
+    end: t.Optional[str] = None,
+    index: t.Optional[DidIndex] = None,
+) -> pl.DataFrame:
+    """
+    (did, subject, created_at) for every follow created between two days. With
+    an `index`, the DIDs are replaced by int32 (src, dst) IDs instead, and
+    follows of DIDs missing from the index are dropped.
+    """
+
+    follows = scan_events(store_dir, "follow", start, end).select(
+        "did", "subject", "created_at"
+    )
+
+    if index is not None:
+        follows = (
+            index.encode_columns(follows, {"did": "src", "subject": "dst"})
+            .select("src", "dst", "created_at")
+            .drop_nulls()
+        )
+
+    return follows.collect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a jsonl stream to Parquet")
+    parser.add_argument("stream_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--start", help="First day to convert (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Last day to convert (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--stats", help="Append the final stats as jsonl to this file")
+    parser.add_argument(
+        "--profile", help="Write a cProfile dump (.prof) or sampled stacks here"
+    )
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+    stats = Stats()
+    with profiler(args.profile):
+        convert_stream(
+            args.stream_dir,
+            args.out_dir,
+            args.start,
+            args.end,
+            workers=args.workers,
+            stats=stats,
+        )
+
+    stats.close(args.stats)
+    print(f"Finished in {datetime.now() - start_time}")
+    print(stats.report())
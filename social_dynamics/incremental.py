@@ -0,0 +1,243 @@
+"""
+Network metrics updated one day of follows at a time.
+
+`MetricsTracker.update` takes the net edge changes of a day (see
+`TemporalEdges.iter_days`) and updates degrees, per-node triangle counts and
+connected components from the changed edges only, then appends a row of
+summary metrics for the day. Triangles and clustering are those of the
+undirected graph, where u and v are adjacent if either follows the other.
+
+Triangle updates are exact. For each changed edge (u, v), the triangles it
+closes are the common neighbors of u and v, found as sparse row products. A
+triangle closed by several edges of the same batch is weighted so that it is
+counted once: counts are kept in units of 1/6.
+
+Components use a vectorized union-find, which only merges. With
+`exact_components`, they are recomputed whenever an undirected edge is removed;
+otherwise removals are ignored, and components are those of every edge seen so
+far.
+
+    tracker = MetricsTracker(len(index))
+    for day, changes in edges.iter_days():
+        tracker.update(day, changes)
+    tracker.table()
+"""
+
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from social_dynamics.graph import symmetric
+from social_dynamics.temporal import EdgeChanges
+
+CHUNK_NNZ = 1 << 24  # Max neighbor entries gathered at once for triangle updates
+
+
+def binary(adj: csr_matrix) -> csr_matrix:
+    return csr_matrix(
+        (np.ones(adj.nnz, dtype=np.int32), adj.indices, adj.indptr), shape=adj.shape
+    )
+
+
+class UnionFind:
+    def __init__(self, n_nodes: int):
+        self.parent = np.arange(n_nodes, dtype=np.int64)
+        self.size = np.ones(n_nodes, dtype=np.int64)
+
+    def find(self, nodes: npt.NDArray[np.integer]) -> npt.NDArray[np.int64]:
+        roots = self.parent[nodes]
+        while True:
+            parents = self.parent[roots]
+            if np.array_equal(parents, roots):
+                break
+            roots = parents
+
+        self.parent[nodes] = roots  # Path compression
+        return roots
+
+    def union(self, src: npt.NDArray[np.integer], dst: npt.NDArray[np.integer]) -> None:
+        src_roots, dst_roots = self.find(src), self.find(dst)
+        merge = src_roots != dst_roots
+        if not merge.any():
+            return
+
+        # Components of the graph of merged roots
+        roots, inverse = np.unique(
+            np.concatenate([src_roots[merge], dst_roots[merge]]), return_inverse=True
+        )
+        n_merged = merge.sum()
+        _, labels = connected_components(
+            csr_matrix(
+                (np.ones(n_merged), (inverse[:n_merged], inverse[n_merged:])),
+                shape=(len(roots), len(roots)),
+            ),
+            directed=False,
+        )
+
+        # Each group of roots is merged into its largest root
+        order = np.lexsort((-self.size[roots], labels))
+        first = order[np.r_[True, labels[order][1:] != labels[order][:-1]]]
+        group_root = np.empty(len(first), dtype=np.int64)
+        group_root[labels[first]] = roots[first]
+
+        sizes = np.bincount(labels, weights=self.size[roots]).astype(np.int64)
+        self.parent[roots] = group_root[labels]
+        self.size[group_root] = sizes
+
+    def reset(self, labels: npt.NDArray[np.integer]) -> None:
+        """Replace the components with the given component labels."""
+
+        _, first, counts = np.unique(labels, return_index=True, return_counts=True)
+        self.parent = first[labels].astype(np.int64)
+        self.size = np.ones(len(labels), dtype=np.int64)
+        self.size[first] = counts
+
+    def roots(self) -> npt.NDArray[np.int64]:
+        return np.flatnonzero(self.parent == np.arange(len(self.parent)))
+
+
+class MetricsTracker:
+    def __init__(self, n_nodes: int, exact_components: bool = False):
+        self.n_nodes = n_nodes
+        self.exact_components = exact_components
+
+        self.out_degree = np.zeros(n_nodes, dtype=np.int64)
+        self.in_degree = np.zeros(n_nodes, dtype=np.int64)
+        self.triangles6 = np.zeros(n_nodes, dtype=np.int64)  # 6 x triangles per node
+        self.components = UnionFind(n_nodes)
+
+        # Undirected adjacency, counting 1 or 2 directed edges per pair
+        self.adj = csr_matrix((n_nodes, n_nodes), dtype=np.int8)
+        self.rows: list[dict[str, t.Any]] = []
+
+    @property
+    def degree(self) -> npt.NDArray[np.int64]:
+        """Undirected degree."""
+
+        return np.diff(self.adj.indptr)
+
+    def update(self, day: str, changes: EdgeChanges) -> dict[str, t.Any]:
+        """Apply a day's edge changes and record that day's metrics."""
+
+        n = self.n_nodes
+
+        # Removals first, since `changes` only holds net changes
+        np.subtract.at(self.out_degree, changes.removed_src, 1)
+        np.subtract.at(self.in_degree, changes.removed_dst, 1)
+        self.adj = self.adj - symmetric(changes.removed_src, changes.removed_dst, n)
+        self.adj.eliminate_zeros()
+
+        removed = self._pairs(changes.removed_src, changes.removed_dst)
+        if len(removed[0]):
+            self._update_triangles(*removed, sign=-1)
+
+        np.add.at(self.out_degree, changes.added_src, 1)
+        np.add.at(self.in_degree, changes.added_dst, 1)
+        added = self._pairs(changes.added_src, changes.added_dst)
+        if len(added[0]):
+            self._update_triangles(*added, sign=1)
+
+        self.adj = self.adj + symmetric(changes.added_src, changes.added_dst, n)
+
+        if self.exact_components and len(removed[0]):
+            _, labels = connected_components(self.adj, directed=False)
+            self.components.reset(labels)
+        else:
+            self.components.union(*added)
+
+        row = self.summary(day)
+        self.rows.append(row)
+        return row
+
+    def _pairs(
+        self, src: npt.NDArray[np.integer], dst: npt.NDArray[np.integer]
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """Unique undirected pairs among (src, dst) that are absent from `adj`."""
+
+        n = self.n_nodes
+        lo = np.minimum(src, dst).astype(np.int64)
+        hi = np.maximum(src, dst).astype(np.int64)
+        keys = np.unique(lo * n + hi)
+        lo, hi = keys // n, keys % n
+
+        if len(keys):
+            absent = np.asarray(self.adj[lo, hi]).ravel() == 0
+            lo, hi = lo[absent], hi[absent]
+
+        return lo, hi
+
+    def _update_triangles(
+        self, u: npt.NDArray[np.int64], v: npt.NDArray[np.int64], sign: int
+    ) -> None:
+        """Add (or remove) the triangles of `adj` + edges (u, v) that use (u, v)."""
+
+        adj = binary(self.adj)
+        new = binary(symmetric(u, v, self.n_nodes))
+
+        degree = np.diff(adj.indptr) + np.diff(new.indptr)
+        cost = np.cumsum(degree[u] + degree[v])
+        bounds = np.unique(
+            np.r_[
+                0,
+                np.searchsorted(cost, np.arange(CHUNK_NNZ, cost[-1], CHUNK_NNZ)),
+                len(u),
+            ]
+        )
+
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            cu, cv = u[lo:hi], v[lo:hi]
+            adj_u, adj_v, new_u, new_v = adj[cu], adj[cv], new[cu], new[cv]
+
+            # Third vertices, weighted by 6 / the number of batch edges in the triangle
+            closing = (
+                6 * adj_u.multiply(adj_v)
+                + 3 * (adj_u.multiply(new_v) + new_u.multiply(adj_v))
+                + 2 * new_u.multiply(new_v)
+            ).tocsr()
+
+            per_edge = np.asarray(closing.sum(axis=1)).ravel().astype(np.int64)
+            np.add.at(self.triangles6, cu, sign * per_edge)
+            np.add.at(self.triangles6, cv, sign * per_edge)
+            np.add.at(self.triangles6, closing.indices, sign * closing.data)
+
+    def summary(self, day: str) -> dict[str, t.Any]:
+        degree = self.degree
+        active = degree > 0
+        wedges = degree * (degree - 1) / 2
+        triangles = self.triangles6 // 6
+
+        local = np.divide(
+            triangles, wedges, out=np.zeros(self.n_nodes), where=wedges > 0
+        )
+        roots = self.components.roots()
+        sizes = self.components.size[roots]
+
+        return {
+            "day": day,
+            "nodes": int(active.sum()),
+            "edges": int(self.out_degree.sum()),
+            "undirected_edges": int(degree.sum() // 2),
+            "mean_degree": float(degree[active].mean()) if active.any() else 0.0,
+            "max_in_degree": int(self.in_degree.max()),
+            "max_out_degree": int(self.out_degree.max()),
+            "triangles": int(triangles.sum() // 3),
+            "avg_clustering": float(local[active].mean()) if active.any() else 0.0,
+            "transitivity": float(triangles.sum() / wedges.sum())
+            if wedges.any()
+            else 0.0,
+            "components": int((sizes > 1).sum()),
+            "largest_component": int(sizes.max()),
+        }
+
+    def degree_histogram(self, kind: str = "in") -> npt.NDArray[np.int64]:
+        """Number of nodes with each `kind` ("in", "out", "undirected") degree."""
+
+        degree = {"in": self.in_degree, "out": self.out_degree}.get(kind)
+        return np.bincount(self.degree if degree is None else degree)
+
+    def table(self) -> pl.DataFrame:
+        return pl.DataFrame(self.rows)
@@ -0,0 +1,330 @@
+"""
+Per-stage timings and counters for the crawlers and stream loaders.
+
+A `Stats` collects, for each pipeline stage (http_wait, car_decode, mst_walk,
+filter, json_decode, write, ...), the number of calls and the time spent,
+optionally broken down by record `$type`. It is thread-safe, can append a JSON
+snapshot to a file every few seconds while a crawl runs, and can merge the
+snapshots of worker processes. Stage times are summed over threads, so with N
+workers they can add up to N times the wall time. `NO_STATS` is a disabled
+instance that costs almost nothing, for code paths that are not being measured.
+
+    stats = Stats()
+    with stats.stage("json_decode") as timer:
+        record = json.loads(line)
+        timer.kind = record["$type"]
+    stats.count("records", kind=record["$type"])
+    print(stats.report())
+
+`profiler(path)` wraps a block in either cProfile (`.prof` paths, calling
+thread only) or a wall-clock stack sampler over every thread, which writes
+collapsed stacks that flamegraph.pl or speedscope can read.
+"""
+
+import abc
+import cProfile
+import json
+import sys
+import threading
+import time
+import typing as t
+from collections import Counter
+from datetime import datetime, timezone
+
+T = t.TypeVar("T")
+
+Key: t.TypeAlias = tuple[str, t.Optional[str]]  # (stage or counter, $type)
+
+
+class Timer:
+    __slots__ = ("stats", "name", "kind", "start")
+
+    def __init__(self, stats: "Stats", name: str, kind: t.Optional[str]):
+        self.stats = stats
+        self.name = name
+        self.kind = kind  # Can be set inside the block, once the type is known
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        self.stats.add(self.name, time.perf_counter() - self.start, self.kind)
+
+
+class NullTimer:
+    __slots__ = ("kind",)
+
+    def __enter__(self) -> "NullTimer":
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Stats:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started = time.time()
+
+        self._lock = threading.Lock()
+        self._stages: dict[Key, list[float]] = {}  # -> [calls, seconds]
+        self._counters: Counter[Key] = Counter()
+
+        self._reporter: t.Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def stage(self, name: str, kind: t.Optional[str] = None) -> Timer | NullTimer:
+        """Context manager that adds the time spent in its block to `name`."""
+
+        if not self.enabled:
+            return NULL_TIMER
+
+        return Timer(self, name, kind)
+
+    def add(
+        self, name: str, seconds: float, kind: t.Optional[str] = None, calls: int = 1
+    ) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            entry = self._stages.setdefault((name, kind), [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+
+    def count(self, name: str, n: int = 1, kind: t.Optional[str] = None) -> None:
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counters[(name, kind)] += n
+
+    def iter(self, name: str, items: t.Iterable[T]) -> t.Iterator[T]:
+        """`items`, adding the time spent waiting for each one to `name`."""
+
+        if not self.enabled:
+            yield from items
+            return
+
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start)
+
+            yield item
+
+    def snapshot(self) -> dict[str, t.Any]:
+        """Totals so far, with a per-$type breakdown of each stage and counter."""
+
+        with self._lock:
+            stage_items = [(key, list(value)) for key, value in self._stages.items()]
+            counter_items = list(self._counters.items())
+
+        stages: dict[str, dict[str, t.Any]] = {}
+        for (name, kind), (calls, seconds) in sorted(stage_items, key=_sort_key):
+            stage = stages.setdefault(name, {"calls": 0, "seconds": 0.0, "types": {}})
+            stage["calls"] += calls
+            stage["seconds"] += seconds
+            if kind is not None:
+                stage["types"][kind] = {"calls": calls, "seconds": seconds}
+
+        counters: dict[str, dict[str, t.Any]] = {}
+        for (name, kind), n in sorted(counter_items, key=_sort_key):
+            counter = counters.setdefault(name, {"count": 0, "types": {}})
+            counter["count"] += n
+            if kind is not None:
+                counter["types"][kind] = n
+
+        return {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "elapsed": time.time() - self.started,
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def merge(self, snapshot: dict[str, t.Any]) -> None:
+        """Add the totals of another `Stats` snapshot, e.g. from a worker process."""
+
+        for name, stage in snapshot["stages"].items():
+            typed_calls = typed_seconds = 0.0
+            for kind, entry in stage["types"].items():
+                self.add(name, entry["seconds"], kind, entry["calls"])
+                typed_calls += entry["calls"]
+                typed_seconds += entry["seconds"]
+
+            if stage["calls"] > typed_calls:
+                self.add(
+                    name,
+                    stage["seconds"] - typed_seconds,
+                    calls=int(stage["calls"] - typed_calls),
+                )
+
+        for name, counter in snapshot["counters"].items():
+            for kind, n in counter["types"].items():
+                self.count(name, n, kind)
+
+            untyped = counter["count"] - sum(counter["types"].values())
+            if untyped:
+                self.count(name, untyped)
+
+    def report(self) -> str:
+        """Human-readable table of the snapshot."""
+
+        snapshot = self.snapshot()
+        elapsed = snapshot["elapsed"]
+        lines = [f"Elapsed: {elapsed:.1f}s"]
+
+        stages = sorted(snapshot["stages"].items(), key=lambda s: -s[1]["seconds"])
+        for name, stage in stages:
+            lines.append(
+                f"  {name:<16} {stage['seconds']:>10.2f}s {stage['calls']:>12} calls"
+                f" {1e6 * stage['seconds'] / max(stage['calls'], 1):>10.1f}us/call"
+            )
+            types = sorted(stage["types"].items(), key=lambda s: -s[1]["seconds"])
+            for kind, entry in types:
+                lines.append(
+                    f"    {kind:<30} {entry['seconds']:>10.2f}s {entry['calls']:>12}"
+                )
+
+        for name, counter in snapshot["counters"].items():
+            rate = counter["count"] / elapsed if elapsed else 0.0
+            lines.append(f"  {name:<16} {counter['count']:>12} ({rate:.1f}/s)")
+            for kind, n in sorted(counter["types"].items(), key=lambda c: -c[1]):
+                lines.append(f"    {kind:<30} {n:>12}")
+
+        return "\n".join(lines)
+
+    def start_reporting(self, path: str, interval: float = 60.0) -> None:
+        """Append a snapshot as a JSON line to `path` every `interval` seconds."""
+
+        def report() -> None:
+            while not self._stop.wait(interval):
+                self.write_snapshot(path)
+
+        self._reporter = threading.Thread(target=report, daemon=True)
+        self._reporter.start()
+
+    def write_snapshot(self, path: str) -> None:
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def close(self, path: t.Optional[str] = None) -> None:
+        """Stop periodic reporting, writing a last snapshot to `path`."""
+
+        if self._reporter is not None:
+            self._stop.set()
+            self._reporter.join()
+            self._reporter = None
+
+        if path is not None:
+            self.write_snapshot(path)
+
+
+NO_STATS = Stats(enabled=False)
+
+
+def _sort_key(item: tuple[Key, t.Any]) -> tuple[str, str]:
+    (name, kind), _ = item
+    return name, kind or ""
+
+
+class Profiler(abc.ABC):
+    """Base for profilers that can be used as context managers."""
+
+    @abc.abstractmethod
+    def start(self) -> None: ...
+
+    @abc.abstractmethod
+    def stop(self) -> None: ...
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        self.stop()
+
+
+class Sampler(Profiler):
+    """
+    Samples the stack of every thread every `interval` seconds, and writes the
+    counts as collapsed stacks ("thread;module:function;... count") on stop.
+    """
+
+    def __init__(self, path: str, interval: float = 0.005):
+        self.path = path
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__')}:{code.co_name}")
+                    frame = frame.f_back
+
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+        with open(self.path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class CProfiler(Profiler):
+    def __init__(self, path: str):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+
+
+class NullProfiler(Profiler):
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+def profiler(path: t.Optional[str]) -> Profiler:
+    """cProfile dump for `.prof` paths, sampled stacks otherwise, or nothing."""
+
+    if path is None:
+        return NullProfiler()
+    if path.endswith(".prof"):
+        return CProfiler(path)
+
+    return Sampler(path)
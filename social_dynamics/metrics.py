@@ -0,0 +1,203 @@
+"""
+Network metrics that scale to the full follow graph.
+
+Average path length and clustering are estimated from samples (BFS from random
+sources, and random wedges), drawn in batches until a `Budget` runs out: a
+number of samples, a wall-clock limit, or a target relative error. Each
+estimate comes with a normal-approximation confidence interval. Degree
+assortativity and density are exact, and are a single vectorized pass over the
+edges.
+
+All functions take a scipy CSR adjacency (row = follower) like the ones built
+by `social_dynamics.graph`. Path length and clustering are computed on the
+undirected graph, as in network-structure.py.
+"""
+
+import time
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, shortest_path
+from scipy.stats import norm
+
+BFS_BATCH_CELLS = 1 << 25  # Max sources * nodes in one batch of BFS distances
+WEDGE_BATCH = 1 << 16
+
+
+class Budget(t.NamedTuple):
+    max_samples: int = 10_000
+    max_time: float = 60.0  # Seconds
+    # Stop once the CI half-width is this fraction of the estimate
+    rel_error: float = 0.01
+    confidence: float = 0.95
+    min_samples: int = 30
+
+
+class Estimate(t.NamedTuple):
+    value: float
+    stderr: float
+    low: float
+    high: float
+    n_samples: int
+    seconds: float
+
+
+def to_undirected(adj: csr_matrix) -> csr_matrix:
+    """Binary symmetric adjacency without self-loops, with sorted indices."""
+
+    sym = (adj + adj.T).tocsr()
+    sym.setdiag(0)
+    sym.eliminate_zeros()
+    sym.data = np.ones_like(sym.data, dtype=np.int8)
+    sym.sort_indices()
+
+    return sym
+
+
+def largest_component(adj: csr_matrix) -> tuple[csr_matrix, npt.NDArray[np.int64]]:
+    """Subgraph of the largest weakly connected component, and its node IDs."""
+
+    _, labels = connected_components(adj, directed=True, connection="weak")
+    nodes = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+
+    return adj[nodes][:, nodes].tocsr(), nodes
+
+
+def density(adj: csr_matrix) -> float:
+    """Fraction of possible directed edges (or of both directions, if symmetric)."""
+
+    n = adj.shape[0]
+    n_edges = adj.nnz - np.count_nonzero(adj.diagonal())
+
+    return n_edges / (n * (n - 1)) if n > 1 else 0.0
+
+
+def degrees(adj: csr_matrix, kind: str) -> npt.NDArray[np.int64]:
+    out_degree = np.diff(adj.indptr)
+    if kind == "out":
+        return out_degree
+
+    in_degree = np.bincount(adj.indices, minlength=adj.shape[1])
+    if kind == "in":
+        return in_degree
+    if kind == "total":
+        return out_degree + in_degree
+
+    raise ValueError(f"Unknown degree kind: {kind}")
+
+
+def degree_assortativity(adj: csr_matrix, x: str = "out", y: str = "in") -> float:
+    """
+    Pearson correlation of the `x` degree of the source and the `y` degree of
+    the target, over every edge. On a symmetric adjacency this is Newman's
+    assortativity coefficient.
+    """
+
+    src = np.repeat(np.arange(adj.shape[0]), np.diff(adj.indptr))
+    src_degree = degrees(adj, x)[src].astype(np.float64)
+    dst_degree = degrees(adj, y)[adj.indices].astype(np.float64)
+
+    return float(np.corrcoef(src_degree, dst_degree)[0, 1])
+
+
+def sample(
+    draw: t.Callable[[int], npt.NDArray[np.float64]], budget: Budget, batch: int
+) -> Estimate:
+    """Mean of `draw(k)` observations, drawn `batch` at a time within `budget`."""
+
+    z = norm.ppf(0.5 + budget.confidence / 2)
+    total, total_sq, n = 0.0, 0.0, 0
+    start_time = time.time()
+
+    while n < budget.max_samples:
+        values = draw(min(batch, budget.max_samples - n))
+        total += values.sum()
+        total_sq += np.square(values).sum()
+        n += len(values)
+
+        mean = total / n
+        stderr = np.sqrt(max(total_sq / n - mean**2, 0.0) / max(n - 1, 1))
+        if n >= budget.min_samples and z * stderr <= budget.rel_error * abs(mean):
+            break
+        if time.time() - start_time > budget.max_time:
+            break
+
+    return Estimate(
+        mean, stderr, mean - z * stderr, mean + z * stderr, n, time.time() - start_time
+    )
+
+
+def average_path_length(
+    adj: csr_matrix,
+    budget: Budget = Budget(),
+    seed: t.Optional[int] = None,
+    directed: bool = False,
+) -> Estimate:
+    """
+    Mean shortest-path length over reachable pairs, from the mean distance of
+    random BFS sources. Exact in expectation on a connected graph (use
+    `largest_component` first); unreachable targets are skipped.
+    """
+
+    graph = adj if directed else to_undirected(adj)
+    n = graph.shape[0]
+    rng = np.random.default_rng(seed)
+
+    def draw(k: int) -> npt.NDArray[np.float64]:
+        sources = rng.integers(0, n, k)
+        dist = shortest_path(graph, directed=directed, unweighted=True, indices=sources)
+        dist[~np.isfinite(dist)] = 0
+
+        reached = np.count_nonzero(dist, axis=1)
+        return dist.sum(axis=1)[reached > 0] / reached[reached > 0]
+
+    return sample(draw, budget, batch=max(1, BFS_BATCH_CELLS // n))
+
+
+def clustering(
+    adj: csr_matrix,
+    budget: Budget = Budget(),
+    seed: t.Optional[int] = None,
+    local: bool = True,
+) -> Estimate:
+    """
+    Wedge-sampling estimate of the average local clustering coefficient (nodes
+    with degree < 2 count as 0, like networkx), or with `local=False` the
+    global clustering coefficient (transitivity).
+    """
+
+    graph = to_undirected(adj)
+    n = graph.shape[0]
+    degree = np.diff(graph.indptr)
+    rng = np.random.default_rng(seed)
+
+    # Wedge centers: uniform over nodes for the local average, and weighted by
+    # number of wedges for the global coefficient
+    centers = np.flatnonzero(degree >= 2)
+    weights = degree[centers] * (degree[centers] - 1.0)
+    weights = None if local else weights / weights.sum()
+    scale = len(centers) / n if local else 1.0
+
+    edge_keys = np.repeat(np.arange(n, dtype=np.int64), degree) * n + graph.indices
+
+    def draw(k: int) -> npt.NDArray[np.float64]:
+        center = rng.choice(centers, size=k, p=weights)
+        d = degree[center]
+
+        # Two distinct neighbors of each center
+        i = rng.integers(0, d)
+        j = rng.integers(0, d - 1)
+        j += j >= i
+        u = graph.indices[graph.indptr[center] + i].astype(np.int64)
+        v = graph.indices[graph.indptr[center] + j]
+
+        keys = u * n + v
+        pos = np.minimum(np.searchsorted(edge_keys, keys), len(edge_keys) - 1)
+        return (edge_keys[pos] == keys) * scale
+
+    if not len(centers):
+        return Estimate(0.0, 0.0, 0.0, 0.0, 0, 0.0)
+
+    return sample(draw, budget, batch=WEDGE_BATCH)
@@ -0,0 +1,629 @@
+"""
+Monte Carlo sampling of q-state Potts beliefs on arbitrary networks.
+
+The energy of node i holding belief o is -field_i(o), with the local field of
+the Galesic-Stein model (see `beliefs`):
+
+    field_i(o) = 2 * ((1 - w) * h_ind[i, o] + w * h_soc[i, o])
+
+where h_soc is the average (or majority) belief of i's neighbors. With
+`h_ind = 0` this is the ferromagnetic Potts model, and with q = 2 the Ising
+model. Two single-node updates are available:
+
+- `heat_bath`: draw the new belief from softmax(beta * field_i).
+- `glauber`: propose one of the other q - 1 beliefs at random, and accept it
+  with probability 1 / (1 + exp(beta * dE)).
+
+A sweep updates every node once, in one of three orders:
+
+- `synchronous`: all nodes at once, from the previous sweep's beliefs, as in
+  `beliefs.update`. This is the fastest, but does not sample the equilibrium
+  distribution (at low temperature, it can oscillate between two states).
+- `sequential`: one node at a time, in a new random order each sweep. This
+  loop is compiled with Numba if it is installed (or `jit=True`), and is slow
+  pure Python otherwise.
+- `coloring`: one color class at a time, where no two neighbors share a color.
+  Each class is updated at once, with vectorized kernels. Nodes in a class
+  don't affect one another, so this samples the same distribution as a
+  sequential sweep, like a checkerboard update on a lattice.
+
+Random numbers come from a seeded numpy Generator on every path, so the
+compiled and pure-Python sequential sweeps give identical results. `beta` can
+change from sweep to sweep, to anneal (see `linear` and `geometric`).
+
+An `Ensemble` runs R replicas of every (w, beta) setting together, as one
+(members, n) belief array. Each block update is then a single sparse product
+over the shared adjacency for all members (see `beliefs`), instead of one per
+run. With `tempering=True`, neighboring temperatures of the same w and replica
+also swap configurations after each sweep (parallel tempering), with the
+Metropolis probability min(1, exp((beta_a - beta_b) * (H_a - H_b))). H is the
+energy of `energy`, which is the Hamiltonian of the dynamics when all nodes
+have the same degree. Otherwise, the exchanges are an approximation.
+
+    mc = MonteCarlo(adj, n_beliefs=3, w=1.0, sweep="coloring", seed=0)
+    table = mc.run(linear(0.1, 3.0, 200))
+
+    ensemble = Ensemble(adj, ws=[0.5, 1.0], betas=betas, replicas=4, tempering=True)
+    table = ensemble.run(200)
+    scan(adj, ws=[0.5, 1.0], betas=np.linspace(0.5, 4, 8), sweeps=100, replicas=4)
+"""
+
+import importlib.util
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse import csr_matrix
+from scipy.special import expit
+
+from social_dynamics.beliefs import (
+    boltzmann,
+    local_field,
+    per_member,
+    sample,
+    social_field,
+)
+from social_dynamics.metrics import to_undirected
+
+UPDATES = ["heat_bath", "glauber"]
+SWEEPS = ["synchronous", "sequential", "coloring"]
+ENSEMBLE_SWEEPS = ["synchronous", "coloring"]
+
+
+def constant(beta: float, n_sweeps: int) -> npt.NDArray[np.float64]:
+    return np.full(n_sweeps, beta, dtype=np.float64)
+
+
+def linear(beta_0: float, beta_1: float, n_sweeps: int) -> npt.NDArray[np.float64]:
+    return np.linspace(beta_0, beta_1, n_sweeps)
+
+
+def geometric(beta_0: float, beta_1: float, n_sweeps: int) -> npt.NDArray[np.float64]:
+    return np.geomspace(beta_0, beta_1, n_sweeps)
+
+
+def color_classes(
+    adj: csr_matrix, seed: t.Optional[int] = None
+) -> list[npt.NDArray[np.int64]]:
+    """
+    Nodes split into classes without edges inside a class (Jones-Plassmann
+    rounds). In each round, the uncolored nodes with a higher random priority
+    than all their uncolored neighbors form the next class.
+    """
+
+    rng = np.random.default_rng(seed)
+    adj = to_undirected(adj)
+    priority = rng.permutation(adj.shape[0]).astype(np.int64)
+
+    classes = []
+    remaining = np.arange(adj.shape[0])
+    sub = adj
+    while len(remaining):
+        # Highest priority among each node's remaining neighbors (-1 if none)
+        neighbor_priority = priority[remaining][sub.indices]
+        degree = np.diff(sub.indptr)
+        best = np.full(len(remaining), -1, dtype=np.int64)
+        has = degree > 0
+        best[has] = np.maximum.reduceat(neighbor_priority, sub.indptr[:-1][has])
+
+        chosen = priority[remaining] > best
+        classes.append(remaining[chosen])
+
+        keep = ~chosen
+        remaining = remaining[keep]
+        sub = sub[keep][:, keep]
+
+    return classes
+
+
+class Block(t.NamedTuple):
+    nodes: t.Optional[npt.NDArray[np.int64]]  # Updated together (None: all)
+    columns: t.Optional[npt.NDArray[np.int64]]  # Their neighbors (None: all)
+    adj: csr_matrix  # (nodes, columns) adjacency
+
+
+def colored_blocks(adj: csr_matrix, seed: t.Optional[int] = None) -> list[Block]:
+    """
+    A block per color class, restricted to the class's neighbors. Then the
+    social field of a class only encodes the beliefs it reads, not all n.
+    """
+
+    blocks = []
+    for nodes in color_classes(adj, seed):
+        rows = adj[nodes]
+        columns = np.unique(rows.indices)
+        blocks.append(Block(nodes, columns, rows[:, columns]))
+
+    return blocks
+
+
+def _pick(values: npt.NDArray, beliefs: npt.NDArray[np.integer]) -> npt.NDArray:
+    """values[..., i, beliefs[..., i]]"""
+
+    picked = np.take_along_axis(values, beliefs[..., np.newaxis].astype(np.intp), -1)
+    return picked[..., 0]
+
+
+def update_block(
+    block: Block,
+    beliefs: npt.NDArray[np.int8],
+    h_ind: npt.NDArray,
+    w: npt.ArrayLike,
+    beta: npt.ArrayLike,
+    update: str = "heat_bath",
+    xsocag: int = 0,
+    rng: t.Optional[np.random.Generator] = None,
+) -> npt.NDArray[np.int64]:
+    """
+    Update the nodes of `block` at once and in place, for beliefs of shape
+    (..., n). Returns # changed beliefs per member.
+    """
+
+    rng = rng or np.random.default_rng()
+    n_beliefs = h_ind.shape[-1]
+    nodes, columns = block.nodes, block.columns
+    if nodes is not None:
+        h_ind = h_ind[..., nodes, :]
+    current = beliefs[..., nodes] if nodes is not None else beliefs.copy()
+    seen = beliefs[..., columns] if columns is not None else beliefs
+    h_soc = social_field(block.adj, seen, n_beliefs, xsocag, rng)
+
+    if update == "heat_bath":
+        new = sample(boltzmann(h_ind, h_soc, w, beta), rng)
+    else:
+        scaled = per_member(beta) * local_field(h_ind, h_soc, w)
+        shift = 1 + rng.integers(n_beliefs - 1, size=current.shape)
+        proposal = (current + shift) % n_beliefs
+        delta = _pick(scaled, current) - _pick(scaled, proposal)
+        new = np.where(rng.random(current.shape) < expit(-delta), proposal, current)
+
+    if nodes is None:
+        beliefs[...] = new
+    else:
+        beliefs[..., nodes] = new
+
+    return (new != current).sum(axis=-1)
+
+
+def energy(
+    adj: csr_matrix,
+    beliefs: npt.NDArray[np.integer],
+    h_ind: npt.NDArray,
+    w: npt.ArrayLike,
+    xsocag: int = 0,
+    rng: t.Optional[np.random.Generator] = None,
+) -> npt.NDArray[np.float64]:
+    """
+    Energy per node of each member, H / n with
+    H = -sum_i [2 * (1 - w) * h_ind_i(s_i) + w * h_soc_i(s_i)]. The social term
+    is half the local field, since each edge is counted from both ends.
+    """
+
+    h_soc = social_field(adj, beliefs, h_ind.shape[-1], xsocag, rng)
+    w = per_member(w)
+    terms = 2 * (1 - w) * h_ind + w * h_soc
+    return -_pick(terms, beliefs).mean(axis=-1, dtype=np.float64)
+
+
+def shares(beliefs: npt.NDArray[np.integer], n_beliefs: int) -> npt.NDArray[np.float64]:
+    """(..., q) share of each belief, per member."""
+
+    n = beliefs.shape[-1]
+    counts = [np.bincount(row, minlength=n_beliefs) for row in beliefs.reshape(-1, n)]
+    return (np.stack(counts) / n).reshape(*beliefs.shape[:-1], n_beliefs)
+
+
+def observables(
+    adj: csr_matrix,
+    beliefs: npt.NDArray[np.integer],
+    h_ind: npt.NDArray,
+    w: npt.ArrayLike,
+    xsocag: int = 0,
+    rng: t.Optional[np.random.Generator] = None,
+) -> dict[str, npt.NDArray]:
+    """Energy per node, belief shares and Potts order parameter, per member."""
+
+    q = h_ind.shape[-1]
+    share = shares(beliefs, q)
+    out = {
+        "energy": energy(adj, beliefs, h_ind, w, xsocag, rng),
+        "order": (q * share.max(axis=-1) - 1) / (q - 1),
+    }
+    for belief in range(q):
+        out[f"share_{belief}"] = share[..., belief]
+
+    return out
+
+
+def _sequential_sweep(
+    indptr: npt.NDArray,
+    indices: npt.NDArray,
+    beliefs: npt.NDArray,
+    h_ind: npt.NDArray,
+    order: npt.NDArray,
+    uniforms: npt.NDArray,
+    w: float,
+    beta: float,
+    glauber: bool,
+    majority: bool,
+) -> int:
+    """Update `order` one node at a time, in place. Returns # changed beliefs."""
+
+    n_beliefs = h_ind.shape[1]
+    counts = np.zeros(n_beliefs)
+    field = np.zeros(n_beliefs)
+    changed = 0
+
+    for k in range(len(order)):
+        i = order[k]
+        counts[:] = 0.0
+        for p in range(indptr[i], indptr[i + 1]):
+            counts[beliefs[indices[p]]] += 1.0
+        degree = indptr[i + 1] - indptr[i]
+
+        # Majority belief, ties broken by the third uniform
+        top = -1
+        if majority and degree > 0:
+            best = counts.max()
+            n_tied = 0
+            for o in range(n_beliefs):
+                if counts[o] == best:
+                    n_tied += 1
+            pick = int(uniforms[k, 2] * n_tied)
+            for o in range(n_beliefs):
+                if counts[o] == best:
+                    if pick == 0:
+                        top = o
+                        break
+                    pick -= 1
+
+        for o in range(n_beliefs):
+            soc = 0.0
+            if degree > 0:
+                soc = (1.0 if o == top else 0.0) if majority else counts[o] / degree
+            field[o] = 2.0 * ((1.0 - w) * h_ind[i, o] + w * soc)
+
+        current = beliefs[i]
+        if glauber:
+            shift = 1 + int(uniforms[k, 0] * (n_beliefs - 1))
+            proposal = (current + shift) % n_beliefs
+            delta = field[current] - field[proposal]
+            if uniforms[k, 1] * (1.0 + np.exp(beta * delta)) < 1.0:
+                beliefs[i] = proposal
+                changed += 1
+        else:
+            weights = np.exp(beta * (field - field.max()))
+            threshold = uniforms[k, 1] * weights.sum()
+            new = n_beliefs - 1
+            total = 0.0
+            for o in range(n_beliefs):
+                total += weights[o]
+                if threshold < total:
+                    new = o
+                    break
+            if new != current:
+                beliefs[i] = new
+                changed += 1
+
+    return changed
+
+
+def _compiled_sweep(jit: t.Optional[bool]) -> t.Callable[..., int]:
+    """The sequential sweep, compiled with Numba if wanted (None: if installed)."""
+
+    if jit is False or (jit is None and importlib.util.find_spec("numba") is None):
+        return _sequential_sweep
+
+    import numba
+
+    return numba.njit(cache=True)(_sequential_sweep)
+
+
+class MonteCarlo:
+    def __init__(
+        self,
+        adj: csr_matrix,
+        n_beliefs: int = 2,
+        h_ind: t.Optional[npt.NDArray] = None,
+        w: float = 1.0,
+        xsocag: int = 0,
+        update: str = "heat_bath",
+        sweep: str = "coloring",
+        beliefs: t.Optional[npt.NDArray[np.integer]] = None,
+        seed: t.Optional[int] = None,
+        jit: t.Optional[bool] = None,
+    ):
+        if update not in UPDATES:
+            raise ValueError(f"Unknown update {update}, expected one of {UPDATES}")
+        if sweep not in SWEEPS:
+            raise ValueError(f"Unknown sweep {sweep}, expected one of {SWEEPS}")
+
+        self.adj = to_undirected(adj)
+        self.n_nodes = self.adj.shape[0]
+        self.n_beliefs = n_beliefs
+        self.w = w
+        self.xsocag = xsocag
+        self.update = update
+        self.sweep_order = sweep
+        self.rng = np.random.default_rng(seed)
+
+        if h_ind is None:
+            h_ind = np.zeros((self.n_nodes, n_beliefs), dtype=np.float32)
+        self.h_ind = np.asarray(h_ind, dtype=np.float32)
+
+        if beliefs is None:
+            beliefs = self.rng.integers(n_beliefs, size=self.n_nodes)
+        self.beliefs = np.asarray(beliefs, dtype=np.int8).copy()
+
+        self.blocks = [Block(None, None, self.adj)]
+        if sweep == "coloring":
+            self.blocks = colored_blocks(self.adj, self.rng.integers(1 << 63))
+        elif sweep == "sequential":
+            self._sequential = _compiled_sweep(jit)
+
+        self.rows: list[dict[str, t.Any]] = []
+
+    def field(self, nodes: t.Optional[npt.NDArray[np.int64]] = None) -> npt.NDArray:
+        """(len(nodes), q) local field of `nodes` (default: all)."""
+
+        adj = self.adj if nodes is None else self.adj[nodes]
+        h_ind = self.h_ind if nodes is None else self.h_ind[nodes]
+        h_soc = social_field(adj, self.beliefs, self.n_beliefs, self.xsocag, self.rng)
+        return local_field(h_ind, h_soc, self.w)
+
+    def _update_block(self, block: Block, beta: float) -> int:
+        changed = update_block(
+            block,
+            self.beliefs,
+            self.h_ind,
+            self.w,
+            beta,
+            self.update,
+            self.xsocag,
+            self.rng,
+        )
+        return int(changed)
+
+    def sweep(self, beta: float, measure: bool = True) -> dict[str, t.Any]:
+        """Update every node once, and record the observables after the sweep."""
+
+        match self.sweep_order:
+            case "synchronous" | "coloring":
+                changed = sum(self._update_block(block, beta) for block in self.blocks)
+            case _:
+                order = self.rng.permutation(self.n_nodes)
+                uniforms = self.rng.random((self.n_nodes, 3))
+                changed = self._sequential(
+                    self.adj.indptr,
+                    self.adj.indices,
+                    self.beliefs,
+                    self.h_ind,
+                    order,
+                    uniforms,
+                    float(self.w),
+                    float(beta),
+                    self.update == "glauber",
+                    self.xsocag == 1,
+                )
+
+        row: dict[str, t.Any] = {"sweep": len(self.rows), "beta": float(beta)}
+        row["changed"] = changed / self.n_nodes
+        if measure:
+            row.update(self.observables())
+
+        self.rows.append(row)
+        return row
+
+    def observables(self) -> dict[str, float]:
+        values = observables(
+            self.adj, self.beliefs, self.h_ind, self.w, self.xsocag, self.rng
+        )
+        return {name: float(value) for name, value in values.items()}
+
+    def run(self, betas: npt.ArrayLike, measure_every: int = 1) -> pl.DataFrame:
+        """One sweep per beta of the schedule, measured every `measure_every`."""
+
+        betas = np.asarray(betas, dtype=np.float64)
+        for i, beta in enumerate(betas):
+            last = i == len(betas) - 1
+            self.sweep(beta, measure=last or i % measure_every == 0)
+
+        return self.table()
+
+    def table(self) -> pl.DataFrame:
+        return pl.DataFrame(self.rows)
+
+
+class Ensemble:
+    """
+    R replicas of every (w, beta) setting, advanced together. Members are
+    ordered by w, then replica, then beta, with `w`, `beta` and `replica`
+    arrays giving the setting of each.
+    """
+
+    def __init__(
+        self,
+        adj: csr_matrix,
+        ws: t.Iterable[float],
+        betas: t.Iterable[float],
+        replicas: int = 1,
+        n_beliefs: int = 2,
+        h_ind: t.Optional[npt.NDArray] = None,
+        xsocag: int = 0,
+        update: str = "heat_bath",
+        sweep: str = "coloring",
+        tempering: bool = False,
+        seed: t.Optional[int] = None,
+    ):
+        if update not in UPDATES:
+            raise ValueError(f"Unknown update {update}, expected one of {UPDATES}")
+        if sweep not in ENSEMBLE_SWEEPS:
+            raise ValueError(
+                f"Unknown sweep {sweep}, expected one of {ENSEMBLE_SWEEPS}"
+            )
+
+        self.adj = to_undirected(adj)
+        self.n_nodes = self.adj.shape[0]
+        self.n_beliefs = n_beliefs
+        self.xsocag = xsocag
+        self.update = update
+        self.sweep_order = sweep
+        self.tempering = tempering
+        self.rng = np.random.default_rng(seed)
+
+        ws = np.asarray(list(ws), dtype=np.float64)
+        betas = np.asarray(list(betas), dtype=np.float64)
+        if tempering and np.any(np.diff(betas) <= 0):
+            raise ValueError("Parallel tempering needs increasing betas")
+
+        self.shape = (len(ws), replicas, len(betas))
+        self.w = np.broadcast_to(ws[:, None, None], self.shape).ravel()
+        self.beta = np.broadcast_to(betas[None, None, :], self.shape).ravel()
+        self.replica = np.broadcast_to(np.arange(replicas)[None, :, None], self.shape)
+        self.replica = self.replica.ravel()
+        self.n_members = len(self.w)
+
+        if h_ind is None:
+            h_ind = np.zeros((self.n_nodes, n_beliefs), dtype=np.float32)
+        self.h_ind = np.asarray(h_ind, dtype=np.float32)
+
+        self.beliefs = self.rng.integers(
+            n_beliefs, size=(self.n_members, self.n_nodes)
+        ).astype(np.int8)
+
+        self.blocks = [Block(None, None, self.adj)]
+        if sweep == "coloring":
+            self.blocks = colored_blocks(self.adj, self.rng.integers(1 << 63))
+
+        # Exchanges tried and accepted between betas b and b + 1
+        self.tried = np.zeros((*self.shape[:2], max(len(betas) - 1, 0)), dtype=int)
+        self.accepted = np.zeros_like(self.tried)
+        self.n_sweeps = 0
+        self.frames: list[pl.DataFrame] = []
+
+    def sweep(self, measure: bool = True) -> pl.DataFrame:
+        """
+        Update every node of every member once, then measure and, with
+        tempering, exchange. Returns the rows of the sweep, one per member.
+        """
+
+        changed = sum(
+            update_block(
+                block,
+                self.beliefs,
+                self.h_ind,
+                self.w,
+                self.beta,
+                self.update,
+                self.xsocag,
+                self.rng,
+            )
+            for block in self.blocks
+        )
+
+        columns: dict[str, t.Any] = {
+            "sweep": np.full(self.n_members, self.n_sweeps),
+            "member": np.arange(self.n_members),
+            "w": self.w,
+            "replica": self.replica,
+            "beta": self.beta,
+            "changed": changed / self.n_nodes,
+        }
+        values: t.Optional[dict[str, npt.NDArray]] = None
+        if measure or self.tempering:
+            values = observables(
+                self.adj, self.beliefs, self.h_ind, self.w, self.xsocag, self.rng
+            )
+        if measure and values is not None:
+            columns.update(values)
+        if self.tempering and values is not None:
+            self.exchange(values["energy"] * self.n_nodes)
+
+        frame = pl.DataFrame(columns)
+        self.frames.append(frame)
+        self.n_sweeps += 1
+        return frame
+
+    def exchange(self, energies: npt.NDArray[np.float64]) -> None:
+        """
+        Swap the configurations of neighboring betas, given the total energy of
+        each member. Even and odd pairs alternate from one sweep to the next.
+        """
+
+        n_betas = self.shape[2]
+        lo = np.arange(self.n_sweeps % 2, n_betas - 1, 2)
+        if not len(lo):
+            return
+
+        h = energies.reshape(self.shape)
+        betas = self.beta.reshape(self.shape)
+        d_beta = betas[..., lo] - betas[..., lo + 1]
+        log_ratio = d_beta * (h[..., lo] - h[..., lo + 1])
+        swap = np.log(self.rng.random(log_ratio.shape)) < log_ratio
+
+        self.tried[..., lo] += 1
+        self.accepted[..., lo] += swap
+
+        members = np.arange(self.n_members).reshape(self.shape)
+        order = members.copy()
+        w_at, r_at, b_at = np.nonzero(swap)
+        order[w_at, r_at, lo[b_at]] = members[w_at, r_at, lo[b_at] + 1]
+        order[w_at, r_at, lo[b_at] + 1] = members[w_at, r_at, lo[b_at]]
+        self.beliefs = self.beliefs[order.ravel()]
+
+    def exchange_rates(self) -> pl.DataFrame:
+        """Share of accepted exchanges between each beta and the next."""
+
+        ws = self.w.reshape(self.shape)[:, 0, 0]
+        betas = self.beta.reshape(self.shape)[0, 0]
+        rates = self.accepted.sum(axis=1) / np.maximum(self.tried.sum(axis=1), 1)
+        return pl.DataFrame(
+            [
+                {"w": w, "beta": betas[b], "beta_next": betas[b + 1], "rate": rate}
+                for w, row in zip(ws, rates)
+                for b, rate in enumerate(row)
+            ]
+        )
+
+    def run(self, n_sweeps: int, measure_every: int = 1) -> pl.DataFrame:
+        for i in range(n_sweeps):
+            last = i == n_sweeps - 1
+            self.sweep(measure=last or i % measure_every == 0)
+
+        return self.table()
+
+    def table(self) -> pl.DataFrame:
+        return pl.concat(self.frames, how="diagonal")
+
+
+def scan(
+    adj: csr_matrix,
+    ws: t.Iterable[float],
+    betas: t.Iterable[float],
+    sweeps: int = 100,
+    burn_in: t.Optional[int] = None,
+    replicas: int = 1,
+    seed: t.Optional[int] = None,
+    **kwargs: t.Any,
+) -> pl.DataFrame:
+    """
+    Mean and std of the observables over the last `sweeps - burn_in` sweeps
+    (default: the second half) and the replicas, for each (w, beta), from a
+    random start. All settings run as one `Ensemble`, to which `kwargs` are
+    passed.
+    """
+
+    burn_in = sweeps // 2 if burn_in is None else burn_in
+    ensemble = Ensemble(adj, ws, betas, replicas, seed=seed, **kwargs)
+    table = ensemble.run(sweeps).filter(pl.col("sweep") >= burn_in)
+
+    names = ["energy", "order", "changed"]
+    return (
+        table.group_by("w", "beta", maintain_order=True)
+        .agg(
+            *(pl.col(name).mean() for name in names),
+            *(pl.col(name).std().alias(f"{name}_std") for name in names),
+        )
+        .sort("w", "beta")
+    )
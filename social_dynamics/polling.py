@@ -0,0 +1,143 @@
+"""
+The synthetic polling model of notebooks/data-gen/polling.py, as functions.
+
+An `Electorate` holds the simulated voters loaded from the MATLAB exports:
+their z-scored characteristics, initial focal belief probabilities, reported
+social circle beliefs and internal (cognitive) field. `simulate` wires a
+homophilous network (see `wiring.wire`) and runs `tmax` days of Galesic-Stein
+dynamics (see `beliefs.update`), yielding a row of aggregates for each day.
+
+Current events (`xevents`) are not modeled yet, since there is no event data,
+so `simulate` ignores that parameter (see `UNMODELED`).
+
+    electorate = load_electorate("../data/matlab")
+    rows = list(simulate(electorate, Params(w=0.5), seed=0))
+"""
+
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from scipy.io import loadmat
+
+from social_dynamics.beliefs import sample, update
+from social_dynamics.results import ResultsWriter
+from social_dynamics.wiring import capacities, wire
+
+MAT_DIR = "../data/matlab"
+BELIEFS = ["R", "D", "O", "non_voting"]
+UNMODELED = ("xevents",)  # Params that `simulate` doesn't use yet
+
+
+class Electorate(t.NamedTuple):
+    values: npt.NDArray[np.float64]  # (n, characteristics), z-scored
+    own: npt.NDArray[np.float64]  # (n, beliefs) initial focal probabilities
+    soc_p: npt.NDArray[np.float64]  # (n, beliefs) % of social circle per belief
+    cog: npt.NDArray[np.float64]  # (n, beliefs) internal field
+
+    @property
+    def n(self) -> int:
+        return len(self.values)
+
+
+class Params(t.NamedTuple):
+    xhom: int = 0  # 0 Low homophily, 1 more pronounced homophily
+    xsocag: int = 0  # Belief integration rule (0=average, 1=majority)
+    xevents: int = 1  # Take into account current events
+    w: float = 0.3  # Importance of social dissonance
+    beta: float = 1.0  # Attentiveness to belief updating
+    k: int = 10  # Size of voters' social circles
+    tmax: int = 77  # Number of timesteps; days until the election
+    n_candidates: int = 50  # Most similar voters considered as contacts
+
+
+def load_mat(path: str, var: str) -> npt.NDArray:
+    return t.cast(np.ndarray, loadmat(path).get(var))
+
+
+def load_nested_mat(path: str, var: str) -> npt.NDArray:
+    mat = load_mat(path, var)[0]
+    return np.array([row.flatten() for row in mat]).T
+
+
+def load_electorate(mat_dir: str = MAT_DIR) -> Electorate:
+    vote_2016_p = load_nested_mat(f"{mat_dir}/s_vote2016_p.mat", "s_vote2016_p")
+    own_p = load_nested_mat(f"{mat_dir}/s_own_p.mat", "s_own_p")
+    soc_p = load_nested_mat(f"{mat_dir}/s_soc_p.mat", "s_soc_p")
+
+    values = np.column_stack(
+        (
+            vote_2016_p[:, 0],
+            vote_2016_p[:, 3],
+            *(
+                load_mat(f"{mat_dir}/s_{name}.mat", f"s_{name}")
+                for name in ("age", "race", "hhincome", "education")
+            ),
+        )
+    )
+    values = (values - np.nanmean(values, axis=0)) / np.sqrt(np.nanvar(values, axis=0))
+
+    # Make the internal field a bit less extreme, and replace zeros with 0.1
+    cog = vote_2016_p[:, :4] / 100 * 0.7
+    cog[cog == 0] = 0.1
+
+    return Electorate(
+        values=np.nan_to_num(values),  # Missing characteristics at the mean
+        own=own_p[:, :4] / 100,
+        soc_p=soc_p[:, :4],
+        cog=cog,
+    )
+
+
+def aggregates(day: int, probs: npt.NDArray, beliefs: npt.NDArray) -> dict[str, t.Any]:
+    """Mean and std of each belief's probability, and share of voters holding it."""
+
+    row: dict[str, t.Any] = {"day": day}
+    shares = np.bincount(beliefs, minlength=probs.shape[1]) / len(beliefs)
+    for i, name in enumerate(BELIEFS[: probs.shape[1]]):
+        row[f"percs_mean_{name}"] = float(probs[:, i].mean())
+        row[f"percs_std_{name}"] = float(probs[:, i].std())
+        row[f"share_{name}"] = float(shares[i])
+
+    return row
+
+
+def simulate(
+    electorate: Electorate,
+    params: Params,
+    seed: t.Optional[int] = None,
+    out: t.Optional[ResultsWriter] = None,
+) -> t.Iterator[dict[str, t.Any]]:
+    """
+    Wire a network, then yield the aggregates of day 0 to `tmax - 1`. With
+    `out`, the network and each day's beliefs and probabilities are written too.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    conn = wire(
+        electorate.values,
+        electorate.own > 0,
+        capacities(electorate.soc_p, params.k),
+        power=2 if params.xhom == 1 else 1,
+        n_candidates=params.n_candidates,
+        seed=rng.integers(1 << 63),
+    )
+
+    if out is not None:
+        out.write_network(conn)
+
+    probs = electorate.own
+    beliefs = sample(probs, rng)
+
+    for day in range(params.tmax):
+        if day > 0:
+            probs, beliefs = update(
+                conn, beliefs, electorate.cog, params.w, params.beta, params.xsocag, rng
+            )
+
+        row = aggregates(day, probs, beliefs)
+        if out is not None:
+            out.append(beliefs, probs, **{k: v for k, v in row.items() if k != "day"})
+
+        yield row
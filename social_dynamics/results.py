@@ -0,0 +1,166 @@
+"""
+Simulation output streamed to an HDF5 file, one timestep at a time.
+
+A `ResultsWriter` appends each timestep's beliefs (int8, one per node), and
+optionally their probabilities, to chunked, compressed datasets of shape
+(timesteps, nodes[, beliefs]). Scalar aggregates go to one dataset per name
+under `aggregates/`. Timesteps are buffered until a chunk is full, so that
+compressed chunks are written once, and memory use is that of one chunk of
+timesteps. Chunks hold a block of nodes over a block of timesteps, so reading
+the trajectory of a few nodes or the state at one timestep only decompresses the
+chunks involved.
+
+The network is stored as a CSR group with data, indices, indptr and shape, as
+in notebooks/random/explore.py (`write_csr` / `read_csr`), and run parameters
+as attributes of the file.
+
+    with ResultsWriter("run.h5", n_nodes, n_beliefs, attrs=params._asdict()) as out:
+        out.write_network(conn)
+        for day in range(tmax):
+            probs, beliefs = update(...)
+            out.append(beliefs, probs, share_R=...)
+
+    with h5py.File("run.h5") as f:
+        trajectory = f["beliefs"][:, node]
+        conn = read_csr(f["network"])
+"""
+
+import typing as t
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+from scipy.sparse import csr_matrix
+
+CHUNK_STEPS = 16  # Timesteps per chunk, and per write
+CHUNK_NODES = 1 << 16  # Nodes per chunk
+
+
+def write_csr(parent: h5py.Group, name: str, adj: csr_matrix, **kwargs: t.Any) -> None:
+    """CSR group `name` in `parent`, with dataset options (e.g. compression)."""
+
+    g = parent.create_group(name)
+    g.create_dataset("data", data=adj.data, **kwargs)
+    g.create_dataset("indices", data=adj.indices, **kwargs)
+    g.create_dataset("indptr", data=adj.indptr, **kwargs)
+    g.create_dataset("shape", data=adj.shape)
+
+
+def read_csr(g: h5py.Group) -> csr_matrix:
+    return csr_matrix(
+        (g["data"][:], g["indices"][:], g["indptr"][:]), shape=tuple(g["shape"][:])
+    )
+
+
+class ResultsWriter:
+    def __init__(
+        self,
+        path: str,
+        n_nodes: int,
+        n_beliefs: int,
+        attrs: t.Optional[dict[str, t.Any]] = None,
+        probs: bool = False,
+        compression: str = "gzip",
+        chunk_steps: int = CHUNK_STEPS,
+    ):
+        self.file = h5py.File(path, "w")
+        self.n_nodes = n_nodes
+        self.n_beliefs = n_beliefs
+        self.chunk_steps = chunk_steps
+        self.compression = compression
+        self.steps = 0  # Timesteps written, buffered ones included
+
+        for key, value in (attrs or {}).items():
+            self.file.attrs[key] = value
+
+        chunk_nodes = max(1, min(n_nodes, CHUNK_NODES))
+        self.beliefs = self.file.create_dataset(
+            "beliefs",
+            shape=(0, n_nodes),
+            maxshape=(None, n_nodes),
+            dtype=np.int8,
+            chunks=(chunk_steps, chunk_nodes),
+            compression=compression,
+        )
+        self.probs = None
+        if probs:
+            self.probs = self.file.create_dataset(
+                "probs",
+                shape=(0, n_nodes, n_beliefs),
+                maxshape=(None, n_nodes, n_beliefs),
+                dtype=np.float32,
+                chunks=(chunk_steps, chunk_nodes, n_beliefs),
+                compression=compression,
+                shuffle=True,
+            )
+
+        self.aggregates = self.file.create_group("aggregates")
+        self._beliefs: list[npt.NDArray] = []
+        self._probs: list[npt.NDArray] = []
+        self._aggregates: list[dict[str, float]] = []
+
+    def write_network(self, adj: csr_matrix, name: str = "network") -> None:
+        write_csr(self.file, name, adj, compression=self.compression)
+
+    def append(
+        self,
+        beliefs: npt.NDArray[np.integer],
+        probs: t.Optional[npt.NDArray] = None,
+        **aggregates: float,
+    ) -> None:
+        """Add a timestep: the belief of each node, and optionally aggregates."""
+
+        self._beliefs.append(np.asarray(beliefs, dtype=np.int8))
+        if self.probs is not None:
+            if probs is None:
+                raise ValueError("This file stores probabilities, but none were given")
+            self._probs.append(np.asarray(probs, dtype=np.float32))
+
+        self._aggregates.append(aggregates)
+        self.steps += 1
+
+        if len(self._beliefs) == self.chunk_steps:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered timesteps."""
+
+        if not self._beliefs:
+            return
+
+        start = self.beliefs.shape[0]
+        stop = start + len(self._beliefs)
+
+        self.beliefs.resize(stop, axis=0)
+        self.beliefs[start:stop] = np.stack(self._beliefs)
+        if self.probs is not None:
+            self.probs.resize(stop, axis=0)
+            self.probs[start:stop] = np.stack(self._probs)
+
+        names = {name for row in self._aggregates for name in row}
+        for name in sorted(names):
+            if name not in self.aggregates:
+                self.aggregates.create_dataset(
+                    name,
+                    shape=(start,),
+                    maxshape=(None,),
+                    dtype=np.float64,
+                    fillvalue=np.nan,
+                )
+
+        for name, dataset in self.aggregates.items():
+            dataset.resize(stop, axis=0)
+            dataset[start:stop] = [row.get(name, np.nan) for row in self._aggregates]
+
+        self._beliefs, self._probs, self._aggregates = [], [], []
+        self.file.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+    def __enter__(self) -> "ResultsWriter":
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        self.close()
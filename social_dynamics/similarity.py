@@ -0,0 +1,162 @@
+"""
+Voter similarity for the synthetic polling networks, without an n x n matrix.
+
+Two voters' distance is the mean absolute difference of their (z-scored)
+characteristics, and their similarity is `1 / distance ** power`, as in
+notebooks/data-gen/polling.py (`power=2` for pronounced homophily). Identical
+voters, including each voter and itself, get similarity 0 so they are never
+chosen as contacts.
+
+`similarity_blocks` yields the full similarity matrix a block of rows at a
+time, with a bounded block size. `top_k_similar` only returns each voter's k
+most similar candidates. Since similarity falls as the L1 distance grows, those
+are the k nearest neighbors in a KD-tree with p=1 (`SimilarityIndex`, which can
+also be queried for a block of voters at a time), and memory is O(n * k). The
+index can also skip identical voters, which would otherwise fill the k places
+of a voter with many duplicates.
+"""
+
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from scipy.spatial import cKDTree
+
+BLOCK_CELLS = 1 << 24  # Max similarities computed at once
+
+
+def mean_abs_diff(a: npt.NDArray, b: npt.NDArray) -> npt.NDArray[np.float64]:
+    """(len(a), len(b)) distances, accumulated one feature at a time."""
+
+    dist = np.zeros((len(a), len(b)))
+    for f in range(a.shape[1]):
+        dist += np.abs(a[:, f, np.newaxis] - b[np.newaxis, :, f])
+
+    return dist / a.shape[1]
+
+
+def to_similarity(dist: npt.NDArray, power: float = 1.0) -> npt.NDArray[np.float64]:
+    with np.errstate(divide="ignore"):
+        sims = 1 / dist**power
+
+    sims[np.isinf(sims)] = 0
+    return sims
+
+
+def similarity(
+    a: npt.NDArray, b: npt.NDArray, power: float = 1.0
+) -> npt.NDArray[np.float64]:
+    return to_similarity(mean_abs_diff(a, b), power)
+
+
+def similarity_blocks(
+    values: npt.NDArray, power: float = 1.0, block_rows: t.Optional[int] = None
+) -> t.Iterator[tuple[slice, npt.NDArray[np.float64]]]:
+    """(rows, similarities of those rows to every voter), in blocks of rows."""
+
+    n = len(values)
+    if block_rows is None:
+        block_rows = max(1, BLOCK_CELLS // max(n, 1))
+
+    for start in range(0, n, block_rows):
+        rows = slice(start, min(start + block_rows, n))
+        yield rows, similarity(values[rows], values, power)
+
+
+class SimilarityIndex:
+    """KD-tree over a population of candidate voters (default: every voter)."""
+
+    def __init__(
+        self,
+        values: npt.NDArray,
+        candidates: t.Optional[npt.NDArray[np.integer]] = None,
+        power: float = 1.0,
+    ):
+        self.values = values
+        self.candidates = np.arange(len(values)) if candidates is None else candidates
+        self.power = power
+        self.tree = cKDTree(values[self.candidates]) if len(self.candidates) else None
+
+    def query(
+        self,
+        k: int,
+        rows: t.Optional[npt.NDArray[np.integer]] = None,
+        distinct: bool = False,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        """
+        (len(rows), k) indices of each voter's most similar candidates, other
+        than itself, most similar first, and their similarities. Rows are padded
+        with index -1 and similarity 0 if there are fewer than k candidates.
+        With `distinct`, candidates identical to the voter (similarity 0) are
+        skipped as well, so that they don't take up any of the k places.
+        """
+
+        rows = np.arange(len(self.values)) if rows is None else np.asarray(rows)
+        n = len(rows)
+
+        out_idx = np.full((n, k), -1, dtype=np.int64)
+        out_sims = np.zeros((n, k))
+        if self.tree is None or n == 0:
+            return out_idx, out_sims
+
+        if distinct:
+            # Query past every candidate at distance 0, the voter included
+            skip = np.asarray(
+                self.tree.query_ball_point(
+                    self.values[rows], r=0, p=1, return_length=True
+                ),
+                dtype=np.int64,
+            )
+        else:
+            # One extra neighbor, in case the voter is among its own candidates
+            skip = np.ones(n, dtype=np.int64)
+
+        # Rows with about as many to skip are queried together, so that a few
+        # voters with many duplicates don't widen the query of every row
+        groups = np.ceil(np.log2(skip + 1)).astype(np.int64)
+        for group in np.unique(groups):
+            at = np.flatnonzero(groups == group)
+            n_query = min(k + int(skip[at].max()), len(self.candidates))
+            idx, sims = self._query(rows[at], k, n_query, distinct)
+            out_idx[at], out_sims[at] = idx, sims
+
+        return out_idx, out_sims
+
+    def _query(
+        self, rows: npt.NDArray[np.integer], k: int, n_query: int, distinct: bool
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        assert self.tree is not None
+
+        n, d = len(rows), self.values.shape[1]
+        dist, pos = self.tree.query(self.values[rows], k=n_query, p=1, workers=-1)
+        dist, pos = dist.reshape(n, n_query), pos.reshape(n, n_query)
+
+        idx = self.candidates[pos].astype(np.int64)
+        sims = to_similarity(dist / d, self.power)
+
+        # Move dropped candidates to the end, keeping the order of the others
+        drop = dist == 0 if distinct else idx == rows[:, np.newaxis]
+        order = np.argsort(drop, axis=1, kind="stable")
+        at = np.arange(n)[:, np.newaxis]
+        idx, sims = idx[at, order], sims[at, order]
+        n_kept = n_query - drop.sum(axis=1)
+
+        width = min(k, n_query)
+        valid = np.arange(width)[np.newaxis, :] < n_kept[:, np.newaxis]
+
+        out_idx = np.full((n, k), -1, dtype=np.int64)
+        out_sims = np.zeros((n, k))
+        out_idx[:, :width] = np.where(valid, idx[:, :width], -1)
+        out_sims[:, :width] = np.where(valid, sims[:, :width], 0)
+        return out_idx, out_sims
+
+
+def top_k_similar(
+    values: npt.NDArray,
+    k: int,
+    power: float = 1.0,
+    candidates: t.Optional[npt.NDArray[np.integer]] = None,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """(n, k) most similar candidates of every voter; see `SimilarityIndex.query`."""
+
+    return SimilarityIndex(values, candidates, power).query(k)
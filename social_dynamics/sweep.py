@@ -0,0 +1,180 @@
+"""
+Replicated runs of the polling model over a grid of parameters.
+
+Each job is one combination of parameter values and one replication, with a
+different network. Jobs run in a process pool. Each job's seed is derived from
+the sweep seed, its parameters and its replication number, so a job gives the
+same results whatever the grid, its order or the number of workers. Rows of
+daily aggregates (see `polling.simulate`) are appended to a jsonl file as each
+job finishes. Jobs already in the file are skipped, so an interrupted sweep can
+be restarted with the same command. With --states, each job's network and
+daily beliefs also go to an HDF5 file named after its seed (see `results`).
+
+    python -m social_dynamics.sweep --grid w=0.1,0.3,0.5 beta=0.5,1,2 \\
+        --reps 10 --out ../data/polling-sweep.jsonl
+
+    runs = pl.read_ndjson("../data/polling-sweep.jsonl")
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import typing as t
+import zlib
+
+import numpy as np
+
+from social_dynamics.polling import (
+    MAT_DIR,
+    UNMODELED,
+    Electorate,
+    Params,
+    load_electorate,
+    simulate,
+)
+from social_dynamics.results import ResultsWriter
+
+_electorate: t.Optional[Electorate] = None  # Loaded once per worker
+_states_dir: t.Optional[str] = None
+
+
+def parse_grid(specs: list[str]) -> dict[str, list[t.Any]]:
+    """
+    {"w": [0.1, 0.3]} from ["w=0.1,0.3"], typed as the `Params` defaults.
+    Parameters the model doesn't use yet can only take their default, since
+    other values would run the same simulations under different labels.
+    """
+
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in Params._fields:
+            raise ValueError(f"Unknown parameter {name}, expected {Params._fields}")
+
+        default = Params._field_defaults[name]
+        grid[name] = [type(default)(value) for value in values.split(",")]
+
+        if name in UNMODELED and grid[name] != [default]:
+            raise ValueError(f"{name} is not modeled yet, so it can only be {default}")
+
+    return grid
+
+
+def jobs(grid: dict[str, list[t.Any]], reps: int, seed: int) -> list[dict[str, t.Any]]:
+    """One job per combination of grid values and replication."""
+
+    names = list(grid)
+    out = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = Params(**dict(zip(names, values)))
+        key = json.dumps(params._asdict(), sort_keys=True)
+        for rep in range(reps):
+            sequence = np.random.SeedSequence([seed, zlib.crc32(key.encode()), rep])
+            out.append(
+                {
+                    **params._asdict(),
+                    "rep": rep,
+                    "seed": int(sequence.generate_state(1, np.uint64)[0]) >> 1,
+                }
+            )
+
+    return out
+
+
+def job_key(job: dict[str, t.Any]) -> str:
+    return json.dumps(
+        {name: job[name] for name in (*Params._fields, "rep", "seed")}, sort_keys=True
+    )
+
+
+def _init(mat_dir: str, states_dir: t.Optional[str]) -> None:
+    global _electorate, _states_dir
+    _electorate = load_electorate(mat_dir)
+    _states_dir = states_dir
+
+
+def states_path(states_dir: str, job: dict[str, t.Any]) -> str:
+    return os.path.join(states_dir, f"{job['seed']:016x}.h5")
+
+
+def run_job(job: dict[str, t.Any]) -> list[dict[str, t.Any]]:
+    assert _electorate is not None
+
+    params = Params(**{name: job[name] for name in Params._fields})
+    if _states_dir is None:
+        return [{**job, **row} for row in simulate(_electorate, params, job["seed"])]
+
+    n_beliefs = _electorate.own.shape[1]
+    path = states_path(_states_dir, job)
+    with ResultsWriter(path, _electorate.n, n_beliefs, attrs=job, probs=True) as out:
+        rows = simulate(_electorate, params, job["seed"], out)
+        return [{**job, **row} for row in rows]
+
+
+def done_jobs(path: str) -> set[str]:
+    """Keys of the jobs that have rows in `path`."""
+
+    if not os.path.exists(path):
+        return set()
+
+    with open(path) as f:
+        return {job_key(json.loads(line)) for line in f if line.strip()}
+
+
+def run(
+    grid: dict[str, list[t.Any]],
+    out_path: str,
+    reps: int = 10,
+    seed: int = 0,
+    workers: t.Optional[int] = None,
+    mat_dir: str = MAT_DIR,
+    states_dir: t.Optional[str] = None,
+) -> int:
+    """
+    Run the jobs not yet in `out_path`, appending their rows, and writing each
+    job's network and daily states to `states_dir` if given. Returns # jobs.
+    """
+
+    done = done_jobs(out_path)
+    todo = [job for job in jobs(grid, reps, seed) if job_key(job) not in done]
+    print(f"Running {len(todo)} jobs ({len(done)} already done)")
+    if states_dir is not None:
+        os.makedirs(states_dir, exist_ok=True)
+
+    with (
+        mp.get_context("spawn").Pool(workers, _init, (mat_dir, states_dir)) as pool,
+        open(out_path, "a") as f,
+    ):
+        for i, rows in enumerate(pool.imap_unordered(run_job, todo), 1):
+            f.write("".join(json.dumps(row) + "\n" for row in rows))
+            f.flush()
+            print(f"{i}/{len(todo)} jobs done", end="\r")
+
+    print()
+    return len(todo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep the polling model")
+    parser.add_argument(
+        "--grid", nargs="*", default=[], help="Values of each parameter, as w=0.1,0.3"
+    )
+    parser.add_argument("--reps", type=int, default=10, help="Networks per setting")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="Default: one per core")
+    parser.add_argument("--mat-dir", default=MAT_DIR)
+    parser.add_argument("--out", default="../data/polling-sweep.jsonl")
+    parser.add_argument("--states", help="Directory for per-job HDF5 states")
+    args = parser.parse_args()
+
+    run(
+        parse_grid(args.grid),
+        args.out,
+        reps=args.reps,
+        seed=args.seed,
+        workers=args.workers,
+        mat_dir=args.mat_dir,
+        states_dir=args.states,
+    )
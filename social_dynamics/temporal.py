@@ -0,0 +1,305 @@
+"""
+Time-indexed follow edges, for the graph as of any point in time.
+
+Follow, unfollow (a deleted follow record) and block events are collapsed into
+one interval per follow: `[start, end)` in UTC microseconds, with `end = OPEN`
+while the follow still stands. Repeat follows of an already-followed account
+extend the current interval instead of starting a new one, so the intervals of
+one (src, dst) pair never overlap.
+
+Intervals are kept sorted by start, with a second ordering by end, so both the
+edges created and the edges removed in any time window are found with a binary
+search. A snapshot is a prefix scan, and a day-by-day sweep only touches each
+edge twice in total.
+
+    edges = TemporalEdges.from_store(EVENTS_DIR, index)
+    adj = edges.graph_at("2023-03-10")
+    for day, changes in edges.iter_days():
+        ...
+"""
+
+import json
+import os
+import typing as t
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import numpy.typing as npt
+import polars as pl
+from scipy.sparse import csr_matrix
+
+from social_dynamics.dids import DidIndex
+from social_dynamics.events import scan_events
+from social_dynamics.graph import dedup_edges, to_csr
+
+OPEN = np.iinfo(np.int64).max  # End of an interval that has not ended
+DAY_US = 86_400_000_000
+
+Time: t.TypeAlias = int | str | date | datetime
+
+
+class EdgeChanges(t.NamedTuple):
+    added_src: npt.NDArray[np.int32]
+    added_dst: npt.NDArray[np.int32]
+    removed_src: npt.NDArray[np.int32]
+    removed_dst: npt.NDArray[np.int32]
+
+
+def to_us(time: Time) -> int:
+    """UTC microseconds for a timestamp, datetime, or ISO date(time) string."""
+
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    if isinstance(time, str):
+        time = datetime.fromisoformat(time)
+    if not isinstance(time, datetime):
+        time = datetime(time.year, time.month, time.day)
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+
+    return (time - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(
+        microseconds=1
+    )
+
+
+def to_intervals(
+    keys: npt.NDArray[np.int64],
+    times: npt.NDArray[np.int64],
+    is_follow: npt.NDArray[np.bool_],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """(key, start, end) of each follow interval, from follow and removal events."""
+
+    # Group by key, in time order, with removals after follows at the same time
+    order = np.lexsort((~is_follow, times, keys))
+    keys, times, is_follow = keys[order], times[order], is_follow[order]
+
+    # Only keep events that change the state of their key
+    same_key = np.zeros(len(keys), dtype=bool)
+    same_key[1:] = keys[1:] == keys[:-1]
+    was_following = np.zeros(len(keys), dtype=bool)
+    was_following[1:] = is_follow[:-1]
+    was_following &= same_key
+
+    keep = is_follow != was_following
+    keys, times, is_follow = keys[keep], times[keep], is_follow[keep]
+
+    # Kept events alternate follow, removal, follow... within each key
+    starts = np.flatnonzero(is_follow)
+    ends = np.full(len(starts), OPEN, dtype=np.int64)
+    removed = starts + 1 < len(keys)
+    removed[removed] = keys[starts[removed] + 1] == keys[starts[removed]]
+    ends[removed] = times[starts[removed] + 1]
+
+    return keys[starts], times[starts], ends
+
+
+class TemporalEdges:
+    def __init__(
+        self,
+        src: npt.ArrayLike,
+        dst: npt.ArrayLike,
+        start: npt.ArrayLike,
+        end: npt.ArrayLike,
+        n_nodes: int,
+        end_order: t.Optional[npt.NDArray[np.int64]] = None,
+    ):
+        """Intervals must be sorted by `start` (see `from_events`)."""
+
+        self.src = np.asarray(src)
+        self.dst = np.asarray(dst)
+        self.start = np.asarray(start)
+        self.end = np.asarray(end)
+        self.n_nodes = n_nodes
+
+        if end_order is None:
+            end_order = np.argsort(self.end, kind="stable")
+        self.end_order = end_order
+        self.sorted_end = self.end[self.end_order]
+
+        # Interval offsets of each UTC day from the first follow to the last event
+        if len(self.start):
+            last = self.start[-1]
+            n_ended = np.searchsorted(self.sorted_end, OPEN)
+            if n_ended:
+                last = max(last, self.sorted_end[n_ended - 1])
+
+            day_starts = np.arange(self.start[0] // DAY_US, last // DAY_US + 2) * DAY_US
+        else:
+            day_starts = np.empty(0, dtype=np.int64)
+
+        self.day_starts = day_starts
+        self.day_offsets = np.searchsorted(self.start, day_starts)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    @property
+    def days(self) -> list[str]:
+        return [
+            str(np.datetime64(int(day), "us").astype("datetime64[D]"))
+            for day in self.day_starts[:-1]
+        ]
+
+    @classmethod
+    def from_events(
+        cls,
+        src: npt.ArrayLike,
+        dst: npt.ArrayLike,
+        times: npt.ArrayLike,
+        is_follow: npt.ArrayLike,
+        n_nodes: int,
+    ) -> "TemporalEdges":
+        """Index from unordered follow (`is_follow`) and removal events."""
+
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        keep = src != dst
+
+        keys, start, end = to_intervals(
+            (src * n_nodes + dst)[keep],
+            np.asarray(times, dtype=np.int64)[keep],
+            np.asarray(is_follow, dtype=bool)[keep],
+        )
+
+        order = np.argsort(start, kind="stable")
+        keys, start, end = keys[order], start[order], end[order]
+
+        return cls(
+            (keys // n_nodes).astype(np.int32),
+            (keys % n_nodes).astype(np.int32),
+            start,
+            end,
+            n_nodes,
+        )
+
+    @classmethod
+    def from_store(
+        cls,
+        store_dir: str,
+        index: DidIndex,
+        start: t.Optional[str] = None,
+        end: t.Optional[str] = None,
+        blocks: bool = True,
+    ) -> "TemporalEdges":
+        """
+        Index of the follows between two days, ended by deleted follow records
+        and, with `blocks`, by the follower blocking the followed account.
+        """
+
+        follows = scan_events(store_dir, "follow", start, end).select(
+            "did", "rkey", "subject", "created_at"
+        )
+        unfollows = (
+            scan_events(store_dir, "delete", start, end)
+            .filter(pl.col("collection") == "app.bsky.graph.follow")
+            .select("did", "rkey", "created_at")
+            .join(follows.select("did", "rkey", "subject"), on=["did", "rkey"])
+        )
+        events = [
+            follows.select("did", "subject", "created_at", is_follow=pl.lit(True)),
+            unfollows.select("did", "subject", "created_at", is_follow=pl.lit(False)),
+        ]
+        if blocks:
+            events.append(
+                scan_events(store_dir, "block", start, end).select(
+                    "did", "subject", "created_at", is_follow=pl.lit(False)
+                )
+            )
+
+        frame = (
+            index.encode_columns(pl.concat(events), {"did": "src", "subject": "dst"})
+            .select("src", "dst", pl.col("created_at").dt.epoch("us"), "is_follow")
+            .drop_nulls()
+            .collect()
+        )
+
+        return cls.from_events(
+            frame["src"].to_numpy(),
+            frame["dst"].to_numpy(),
+            frame["created_at"].to_numpy(),
+            frame["is_follow"].to_numpy(),
+            len(index),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "TemporalEdges":
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ["src", "dst", "start", "end", "end_order"]
+        }
+
+        return cls(n_nodes=meta["n_nodes"], **arrays)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+
+        for name in ["src", "dst", "start", "end", "end_order"]:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"n_nodes": self.n_nodes, "n_edges": len(self)}, f)
+
+    def graph_at(self, time: Time) -> csr_matrix:
+        """Follow graph as of `time` (midnight UTC for a date)."""
+
+        time = to_us(time)
+        stop = np.searchsorted(self.start, time, side="right")
+        active = self.end[:stop] > time
+
+        return self._to_csr(np.flatnonzero(active))
+
+    def graph_between(self, t0: Time, t1: Time) -> csr_matrix:
+        """Every follow that stood at some point in `[t0, t1)`."""
+
+        t0, t1 = to_us(t0), to_us(t1)
+        stop = np.searchsorted(self.start, t1, side="left")
+        active = self.end[:stop] > t0
+
+        return self._to_csr(np.flatnonzero(active))
+
+    def changes(self, t0: Time, t1: Time) -> EdgeChanges:
+        """Edges in `graph_at(t1)` but not `graph_at(t0)`, and the reverse."""
+
+        t0, t1 = to_us(t0), to_us(t1)
+        lo, hi = np.searchsorted(self.start, [t0, t1], side="right")
+        return self._changes(lo, hi, t0, t1)
+
+    def iter_days(self) -> t.Iterator[tuple[str, EdgeChanges]]:
+        """Net edge changes of each day, from the first follow onwards."""
+
+        for i, day in enumerate(self.days):
+            t0, t1 = self.day_starts[i] - 1, self.day_starts[i + 1] - 1
+            yield (
+                day,
+                self._changes(self.day_offsets[i], self.day_offsets[i + 1], t0, t1),
+            )
+
+    def _changes(self, lo: int, hi: int, t0: int, t1: int) -> EdgeChanges:
+        # Created in (t0, t1] and still standing at t1
+        added = np.arange(lo, hi)
+        added = added[self.end[added] > t1]
+
+        # Standing at t0 and ended in (t0, t1]
+        end_lo, end_hi = np.searchsorted(self.sorted_end, [t0, t1], side="right")
+        removed = self.end_order[end_lo:end_hi]
+        removed = removed[self.start[removed] <= t0]
+
+        # Unfollowed and followed again within the window
+        added_keys = self._keys(added)
+        removed_keys = self._keys(removed)
+        added = added[~np.isin(added_keys, removed_keys)]
+        removed = removed[~np.isin(removed_keys, added_keys)]
+
+        return EdgeChanges(
+            self.src[added], self.dst[added], self.src[removed], self.dst[removed]
+        )
+
+    def _keys(self, rows: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+        return self.src[rows].astype(np.int64) * self.n_nodes + self.dst[rows]
+
+    def _to_csr(self, rows: npt.NDArray[np.int64]) -> csr_matrix:
+        src, dst = dedup_edges(self.src[rows], self.dst[rows], self.n_nodes)
+        return to_csr(src, dst, self.n_nodes)
@@ -0,0 +1,141 @@
+"""
+Homophilous social networks for the synthetic polling electorate.
+
+Each voter has a capacity of contacts per belief category (R, D, O, non voting)
+from its reported social circle (`capacities`). `wire` fills it as
+notebooks/data-gen/polling.py did. Voters are visited in order, and for each
+category with capacity left, contacts are drawn with replacement among the
+holders of that belief who still have capacity, weighted by similarity. Then
+each contact loses capacity for the voter's own categories.
+
+Contacts are drawn among the voter's `n_candidates` most similar holders of
+each belief, rather than among all of them, leaving out identical voters, who
+could never be drawn. The candidates come from a KD-tree
+per category and are queried one block of voters at a time, so runtime and
+memory scale with n * n_candidates. Rather than rewiring everything until no
+voter is isolated, each voter left isolated is linked to one of its most similar
+voters, ignoring capacities.
+
+    capacity = capacities(s_soc_p, k)
+    conn = wire(values, s_own_p[:, :4] > 0, capacity, power=2, seed=0)
+"""
+
+import typing as t
+
+import numpy as np
+import numpy.typing as npt
+from scipy.sparse import csr_matrix
+
+from social_dynamics.graph import symmetric
+from social_dynamics.similarity import SimilarityIndex
+
+BLOCK_VOTERS = 4096  # Voters whose candidates are queried at once
+
+
+def capacities(soc_p: npt.NDArray, k: int) -> npt.NDArray[np.int64]:
+    """
+    (categories, n) number of contacts each voter should have in each category,
+    from the percentages of its social circle holding each belief. The last
+    category gets the rest of the k contacts.
+    """
+
+    capacity = np.round(k * soc_p[:, :3].T / 100).astype(np.int64)
+    return np.vstack([capacity, k - capacity.sum(axis=0)])
+
+
+def wire(
+    values: npt.NDArray,
+    holds: npt.NDArray[np.bool_],
+    capacity: npt.NDArray[np.integer],
+    power: float = 1.0,
+    n_candidates: int = 50,
+    seed: t.Optional[int] = None,
+) -> csr_matrix:
+    """
+    Symmetric (n, n) adjacency between voters with characteristics `values`.
+    `holds` is an (n, categories) mask of the beliefs each voter holds, and
+    `capacity` is as returned by `capacities`, and is not modified.
+    """
+
+    rng = np.random.default_rng(seed)
+    n, n_categories = holds.shape
+    remaining = np.array(capacity, dtype=np.int64)
+
+    indexes = [
+        SimilarityIndex(values, np.flatnonzero(holds[:, g]), power)
+        for g in range(n_categories)
+    ]
+
+    src: list[npt.NDArray[np.int64]] = []
+    dst: list[npt.NDArray[np.int64]] = []
+
+    for start in range(0, n, BLOCK_VOTERS):
+        rows = np.arange(start, min(start + BLOCK_VOTERS, n))
+
+        # Candidates of the voters that start with capacity in each category,
+        # by position in the block (-1 for the others)
+        candidates = []
+        for g, index in enumerate(indexes):
+            needed = rows[remaining[g, rows] > 0]
+            position = np.full(len(rows), -1)
+            position[needed - start] = np.arange(len(needed))
+            candidates.append(
+                (position, *index.query(n_candidates, needed, distinct=True))
+            )
+
+        for i, voter in enumerate(rows):
+            kinds = np.flatnonzero(holds[voter])
+
+            for g, (position, cand_idx, cand_sims) in enumerate(candidates):
+                need = remaining[g, voter]
+                if need <= 0:
+                    continue
+
+                pop, sims = cand_idx[position[i]], cand_sims[position[i]]
+                ok = pop >= 0
+                ok[ok] = remaining[g, pop[ok]] > 0
+                pop, sims = pop[ok], sims[ok]
+
+                total = sims.sum()
+                if len(pop) <= need or total == 0:
+                    continue
+
+                contacts = np.unique(rng.choice(pop, size=need, p=sims / total))
+                src.append(np.full(len(contacts), voter))
+                dst.append(contacts)
+
+                remaining[g, voter] -= len(contacts)
+                remaining[np.ix_(kinds, contacts)] -= 1
+
+    if src:
+        conn = symmetric(np.concatenate(src), np.concatenate(dst), n)
+    else:
+        conn = csr_matrix((n, n), dtype=np.int8)
+
+    isolated = np.flatnonzero(np.diff(conn.indptr) == 0)
+    if len(isolated) and n > 1:
+        contacts = _patch(values, isolated, power, n_candidates, rng)
+        conn = conn + symmetric(isolated, contacts, n)
+
+    conn.data[:] = 1  # Pairs linked more than once
+    return conn
+
+
+def _patch(
+    values: npt.NDArray,
+    isolated: npt.NDArray[np.int64],
+    power: float,
+    n_candidates: int,
+    rng: np.random.Generator,
+) -> npt.NDArray[np.int64]:
+    """A contact for each isolated voter, drawn among its most similar voters."""
+
+    idx, sims = SimilarityIndex(values, power=power).query(n_candidates, isolated)
+
+    # Uniform among the candidates if they are all identical to the voter
+    valid = idx >= 0
+    weights = np.where(sims.sum(axis=1, keepdims=True) > 0, sims, valid)
+    cumulative = np.cumsum(weights, axis=1)
+    draws = rng.random(len(isolated)) * cumulative[:, -1]
+    picks = (cumulative <= draws[:, np.newaxis]).sum(axis=1)
+    return idx[np.arange(len(isolated)), np.minimum(picks, valid.sum(axis=1) - 1)]
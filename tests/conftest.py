@@ -0,0 +1,81 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import types
+import typing as t
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, "scripts")
+
+# The crawlers import their helpers as top-level modules, as when run from scripts/
+for path in [ROOT, SCRIPTS]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _load_script(name: str) -> types.ModuleType:
+    """Import scripts/<name>.py, whose file names aren't valid module names."""
+
+    spec = importlib.util.spec_from_file_location(
+        name.replace("-", "_"), os.path.join(SCRIPTS, f"{name}.py")
+    )
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def load_script() -> t.Callable[[str], types.ModuleType]:
+    return _load_script
+
+
+def _script_command(name: str, *args: str) -> list[str]:
+    return [sys.executable, os.path.join(SCRIPTS, f"{name}.py"), *args]
+
+
+# Scripts run as from scripts/, with the package importable
+_SCRIPT_ENV = {**os.environ, "PYTHONPATH": os.pathsep.join([ROOT, SCRIPTS])}
+
+
+@pytest.fixture
+def run_script(tmp_path) -> t.Callable[..., str]:
+    """Run scripts/<name>.py in `tmp_path`, returning its stdout."""
+
+    def run(name: str, *args: str) -> str:
+        return subprocess.run(
+            _script_command(name, *args),
+            cwd=tmp_path,
+            env=_SCRIPT_ENV,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    return run
+
+
+@pytest.fixture
+def start_script(tmp_path) -> t.Iterator[t.Callable[..., subprocess.Popen]]:
+    """Start scripts/<name>.py in `tmp_path` without waiting for it to finish."""
+
+    started: list[subprocess.Popen] = []
+
+    def start(name: str, *args: str) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            _script_command(name, *args),
+            cwd=tmp_path,
+            env=_SCRIPT_ENV,
+            stdout=subprocess.DEVNULL,
+        )
+        started.append(proc)
+        return proc
+
+    yield start
+
+    for proc in started:
+        proc.kill()
+        proc.wait()
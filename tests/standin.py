@@ -0,0 +1,190 @@
+"""
+Local stand-in for the relay and the PLC directory, to test the crawlers.
+
+`StandIn` serves com.atproto.sync.getRepo from repos built with `build_car`
+(and `since=` diffs, if given), and PLC export pages from a list of operations,
+on a free local port. Responses can be delayed per DID, and `script` queues
+responses (e.g. a 429 with a Retry-After, or a cut-off CAR) that are sent
+instead of the normal ones, in order, for a path.
+
+    with StandIn(repos={did: build_car(did, records)}) as server:
+        crawl(dids, journal, relay=server.url)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from libipld import encode_cid, encode_dag_cbor  # type: ignore
+
+GET_REPO = "/xrpc/com.atproto.sync.getRepo"
+EXPORT = "/export"
+
+CHUNK_SIZE = 1 << 10  # Bytes written at a time, so responses really stream
+
+
+class Response(t.NamedTuple):
+    status: int
+    headers: dict[str, str]
+    body: bytes
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def block_cid(data: bytes) -> bytes:
+    """CIDv1, dag-cbor, sha2-256."""
+
+    return bytes([0x01, 0x71, 0x12, 0x20]) + hashlib.sha256(data).digest()
+
+
+def build_car(
+    did: str,
+    records: dict[str, dict[str, t.Any]],
+    rev: str = "3jzfcijpj2z2a",
+    omit: t.Collection[str] = (),
+) -> bytes:
+    """
+    CARv1 of a repo with `records` (rkey -> record) under one MST node, in the
+    getRepo order: commit, MST node, then records. Links are CID strings, which
+    is how libipld decodes them. The blocks of records in `omit` are left out,
+    as in a `since=` diff of a repo whose other records haven't changed.
+    """
+
+    blocks = []
+    entries = []
+    prev_key = ""
+    for rkey in sorted(records):
+        data = encode_dag_cbor(records[rkey])
+        cid = block_cid(data)
+        if rkey not in omit:
+            blocks.append((cid, data))
+
+        prefix = len(os.path.commonprefix([rkey, prev_key]))
+        entries.append(
+            {"p": prefix, "k": rkey[prefix:].encode(), "v": encode_cid(cid), "t": None}
+        )
+        prev_key = rkey
+
+    node = encode_dag_cbor({"e": entries, "l": None})
+    node_cid = block_cid(node)
+    commit = encode_dag_cbor(
+        {"did": did, "version": 3, "data": encode_cid(node_cid), "rev": rev}
+    )
+    commit_cid = block_cid(commit)
+
+    out = bytearray()
+    header = encode_dag_cbor({"version": 1, "roots": [encode_cid(commit_cid)]})
+    out += varint(len(header)) + header
+    for cid, data in [(commit_cid, commit), (node_cid, node), *blocks]:
+        out += varint(len(cid) + len(data)) + cid + data
+
+    return bytes(out)
+
+
+class StandIn:
+    def __init__(
+        self,
+        repos: t.Optional[dict[str, bytes]] = None,  # DID -> CAR
+        operations: t.Optional[list[dict[str, t.Any]]] = None,  # PLC export
+        delays: t.Optional[dict[str, float]] = None,  # DID -> seconds
+        diffs: t.Optional[dict[tuple[str, str], bytes]] = None,  # (DID, since) -> CAR
+    ):
+        self.repos = repos or {}
+        self.diffs = diffs or {}
+        self.operations = sorted(operations or [], key=lambda op: op["createdAt"])
+        self.delays = delays or {}
+        self.requests: list[tuple[str, dict[str, str]]] = []  # (path, params)
+
+        self._scripted: dict[str, list[Response]] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def script(
+        self,
+        path: str,
+        status: int,
+        headers: t.Optional[dict[str, str]] = None,
+        body: bytes = b"",
+    ) -> None:
+        """Send this response for the next request to `path` not yet scripted."""
+
+        with self._lock:
+            self._scripted.setdefault(path, []).append(
+                Response(status, headers or {}, body)
+            )
+
+    def respond(self, path: str, params: dict[str, str]) -> Response:
+        with self._lock:
+            self.requests.append((path, params))
+            scripted = self._scripted.get(path)
+            if scripted:
+                return scripted.pop(0)
+
+        if path == GET_REPO:
+            did = params.get("did", "")
+            time.sleep(self.delays.get(did, 0.0))
+            car = self.diffs.get((did, params.get("since", "")), self.repos.get(did))
+            if car is None:
+                return Response(400, {}, b'{"error":"RepoNotFound"}')
+            return Response(200, {"Content-Type": "application/vnd.ipld.car"}, car)
+
+        if path == EXPORT:
+            after = params.get("after", "")
+            limit = int(params.get("limit", 10))
+            page = [op for op in self.operations if op["createdAt"] > after][:limit]
+            body = "\n".join(json.dumps(op) for op in page).encode()
+            return Response(200, {"Content-Type": "application/jsonlines"}, body)
+
+        return Response(404, {}, b"")
+
+    def _handler(self) -> type[BaseHTTPRequestHandler]:
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                res = standin.respond(url.path, params)
+
+                self.send_response(res.status)
+                for name, value in res.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(res.body)))
+                self.end_headers()
+                for start in range(0, len(res.body), CHUNK_SIZE):
+                    self.wfile.write(res.body[start : start + CHUNK_SIZE])
+
+            def log_message(self, *args: t.Any) -> None:
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "StandIn":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: t.Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
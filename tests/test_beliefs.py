@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from social_dynamics.beliefs import sample, social_field, update
+
+N_BELIEFS = 3
+
+
+def kronecker_probs(h_ind, h_soc, w, beta):
+    """Boltzmann probabilities as in notebooks/belief-modeling.py."""
+
+    kronecker = np.repeat(np.eye(N_BELIEFS)[np.newaxis], len(h_ind), axis=0)
+    d_ind = np.sum((kronecker - h_ind[:, np.newaxis, :]) ** 2, axis=2)
+    d_soc = np.sum((kronecker - h_soc[:, np.newaxis, :]) ** 2, axis=2)
+    factors = np.exp(-beta * ((1 - w) * d_ind + w * d_soc))
+    return factors / factors.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def network():
+    rng = np.random.default_rng(0)
+    n = 40
+    adj = (rng.random((n, n)) < 0.1).astype(np.int8)
+    np.fill_diagonal(adj, 0)
+    adj[0] = 0  # No neighbors
+
+    h_ind = rng.dirichlet(np.ones(N_BELIEFS), n)
+    beliefs = rng.integers(0, N_BELIEFS, n)
+    return adj, h_ind, beliefs
+
+
+def mean_field(adj, beliefs):
+    counts = adj @ np.eye(N_BELIEFS)[beliefs]
+    return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+
+def test_update_matches_kronecker(network):
+    adj, h_ind, beliefs = network
+    probs, new = update(csr_matrix(adj), beliefs, h_ind, w=0.3, beta=2.0)
+
+    h_soc = mean_field(adj, beliefs)
+    assert probs == pytest.approx(kronecker_probs(h_ind, h_soc, 0.3, 2.0), abs=1e-6)
+    assert new.shape == beliefs.shape and ((new >= 0) & (new < N_BELIEFS)).all()
+
+
+def test_ensemble_matches_each_member(network):
+    adj, h_ind, beliefs = network
+    rng = np.random.default_rng(1)
+    members = np.stack([beliefs, rng.integers(0, N_BELIEFS, len(beliefs))])
+    w, beta = np.array([0.2, 0.7]), np.array([0.5, 3.0])
+
+    probs, _ = update(csr_matrix(adj), members, h_ind, w=w, beta=beta)
+
+    assert probs.shape == (2, len(beliefs), N_BELIEFS)
+    for r in range(2):
+        h_soc = mean_field(adj, members[r])
+        expected = kronecker_probs(h_ind, h_soc, w[r], beta[r])
+        assert probs[r] == pytest.approx(expected, abs=1e-6)
+
+
+def test_majority_field(network):
+    adj, _, beliefs = network
+    field = social_field(csr_matrix(adj), beliefs, N_BELIEFS, xsocag=1)
+
+    counts = adj @ np.eye(N_BELIEFS)[beliefs]
+    assert field[0].tolist() == [0, 0, 0]
+    for v in range(1, len(beliefs)):
+        assert field[v].sum() == 1
+        assert counts[v, field[v].argmax()] == counts[v].max()
+
+
+def test_sample_follows_probabilities():
+    rng = np.random.default_rng(0)
+    probs = np.tile([0.2, 0.0, 0.8], (20_000, 1))
+
+    counts = np.bincount(sample(probs, rng), minlength=N_BELIEFS) / len(probs)
+    assert counts == pytest.approx([0.2, 0.0, 0.8], abs=0.01)
@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import time
+
+import pytest
+from journal import Journal
+from ratelimit import RateLimiter
+from standin import GET_REPO, StandIn, build_car
+
+DAYS = ["2023-01-01", "2023-01-02", "2023-01-03", "2023-01-04", "2023-01-05"]
+
+
+def make_repo(did: str, rng: random.Random) -> bytes:
+    records = {}
+    for i in range(rng.randint(1, 20)):
+        day = rng.choice(DAYS)
+        records[f"app.bsky.feed.like/3k{i:04d}"] = {
+            "$type": "app.bsky.feed.like",
+            "createdAt": f"{day}T00:00:{i % 60:02d}.000Z",
+            "subject": {"uri": f"at://did:plc:other/app.bsky.feed.post/{i}"},
+        }
+
+    return build_car(did, records)
+
+
+@pytest.fixture
+def crawler(load_script, tmp_path):
+    module = load_script("crawl-repos")
+    module.limiter = RateLimiter(1000.0, burst=100, backoff=0.01)
+
+    def crawl(server: StandIn, workers: int, name: str) -> str:
+        out = tmp_path / name
+        out.mkdir()
+        module.STREAM_DIR = str(out)
+        dids = [(did, "2023-01-01T00:00:00.000Z") for did in server.repos]
+        module.crawl(
+            dids,
+            Journal(str(tmp_path / f"{name}.journal")),
+            workers=workers,
+            relay=server.url,
+            checkpoint_every=5,
+            log=False,
+        )
+        return str(out)
+
+    crawl.module = module
+
+    return crawl
+
+
+def read_days(out: str) -> dict[str, list[str]]:
+    days = {}
+    for name in sorted(os.listdir(out)):
+        with open(os.path.join(out, name)) as f:
+            days[name] = f.read().splitlines()
+
+    return days
+
+
+def test_concurrent_crawl_keeps_did_order(crawler):
+    rng = random.Random(0)
+    dids = [f"did:plc:user{i:02d}" for i in range(24)]
+    repos = {did: make_repo(did, rng) for did in dids}
+
+    # Earlier DIDs answer slower, so they finish after the ones submitted later
+    delays = {did: 0.02 * (len(dids) - i) for i, did in enumerate(dids)}
+    with StandIn(repos, delays=delays) as server:
+        serial = read_days(crawler(server, workers=1, name="serial"))
+        concurrent = read_days(crawler(server, workers=8, name="concurrent"))
+
+    assert set(serial) == {f"{day}.jsonl" for day in DAYS}
+    assert concurrent == serial
+
+    # Within a day, records come repo by repo in dids.csv order
+    for lines in concurrent.values():
+        order = [dids.index(json.loads(line)["did"]) for line in lines]
+        assert order == sorted(order)
+
+
+def test_crawl_writes_every_record_once(crawler):
+    rng = random.Random(1)
+    dids = [f"did:plc:user{i:02d}" for i in range(10)]
+    repos = {did: make_repo(did, rng) for did in dids}
+
+    with StandIn(repos) as server:
+        days = read_days(crawler(server, workers=4, name="out"))
+
+    uris = [json.loads(line).get("uri") for lines in days.values() for line in lines]
+    records = [uri for uri in uris if uri is not None]
+    profiles = [uri for uri in uris if uri is None]
+
+    assert len(records) == len(set(records))
+    assert len(profiles) == len(dids)
+
+
+def test_drops_records_with_short_created_at(crawler):
+    records = {
+        "app.bsky.feed.like/3k0000": {
+            "$type": "app.bsky.feed.like",
+            "createdAt": "2023-01",
+        },
+        "app.bsky.feed.like/3k0001": {
+            "$type": "app.bsky.feed.like",
+            "createdAt": "2023-01-02T00:00:00.000Z",
+        },
+    }
+
+    with StandIn({"did:plc:short": build_car("did:plc:short", records)}) as server:
+        days = read_days(crawler(server, workers=2, name="out"))
+
+    assert set(days) == {"2023-01-01.jsonl", "2023-01-02.jsonl"}
+    assert [json.loads(line)["createdAt"] for line in days["2023-01-02.jsonl"]] == [
+        "2023-01-02T00:00:00.000Z"
+    ]
+
+
+def test_retries_cut_off_repo(crawler):
+    rng = random.Random(2)
+    dids = [f"did:plc:user{i:02d}" for i in range(4)]
+    repos = {did: make_repo(did, rng) for did in dids}
+
+    with StandIn(repos) as server:
+        clean = read_days(crawler(server, workers=2, name="clean"))
+        car = repos[dids[0]]
+        server.script(GET_REPO, 200, body=car[: len(car) // 2])
+        retried = read_days(crawler(server, workers=2, name="retried"))
+
+    assert retried == clean
+
+
+def test_failed_repo_is_not_journaled(crawler, tmp_path):
+    rng = random.Random(3)
+    dids = [f"did:plc:user{i:02d}" for i in range(4)]
+    repos = {did: make_repo(did, rng) for did in dids}
+
+    with StandIn(repos) as server:
+        # One worker, so the first DID gets every scripted response
+        car = repos[dids[0]]
+        for _ in range(crawler.module.REPO_ATTEMPTS):
+            server.script(GET_REPO, 200, body=car[: len(car) // 2])
+        days = read_days(crawler(server, workers=1, name="out"))
+
+    journal = Journal(str(tmp_path / "out.journal"))
+    journaled = [did for entry in journal.entries() for did in entry["dids"]]
+    assert journaled == dids[1:]
+
+    written = {json.loads(line)["did"] for lines in days.values() for line in lines}
+    assert written == set(journaled)
+
+
+def journal_entries(path) -> list[dict]:
+    """Complete entries of a journal that's still being written."""
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return [json.loads(line) for line in f.read().split("\n")[:-1]]
+
+
+def test_resume_after_kill_matches_uninterrupted_crawl(
+    run_script, start_script, tmp_path
+):
+    rng = random.Random(4)
+    dids = [f"did:plc:user{i:02d}" for i in range(12)]
+    repos = {did: make_repo(did, rng) for did in dids}
+
+    # Over the sink's flush threshold, so it's on disk before the next checkpoint
+    big = {
+        f"app.bsky.feed.post/3k{i:04d}": {
+            "$type": "app.bsky.feed.post",
+            "createdAt": "2023-01-02T00:00:00.000Z",
+            "text": f"{i} " * 200,
+        }
+        for i in range(3000)
+    }
+    repos[dids[3]] = build_car(dids[3], big)
+
+    with open(tmp_path / "dids.csv", "w") as f:
+        f.write("did,created_at\n")
+        for did in dids:
+            f.write(f"{did},2023-01-01T00:00:00.000Z\n")
+
+    def args(server: StandIn, name: str, *extra: str) -> list[str]:
+        return [
+            *["--relay", server.url, "--dids", "dids.csv", "--workers", "1"],
+            *["--out", name, "--journal", f"{name}.journal"],
+            *["--checkpoint-every", "3", *extra],
+        ]
+
+    with StandIn(repos) as server:
+        run_script("crawl-repos", *args(server, "full"))
+
+    # Kill the run once records of the second batch are written, but before
+    # that batch is checkpointed
+    journal = tmp_path / "killed.journal"
+    day_file = tmp_path / "killed" / "2023-01-02.jsonl"
+    with StandIn(repos, delays={did: 1.0 for did in dids[4:]}) as server:
+        proc = start_script("crawl-repos", *args(server, "killed"))
+        deadline = time.monotonic() + 30
+        while True:
+            assert proc.poll() is None and time.monotonic() < deadline
+            entries = journal_entries(journal)
+            if len(entries) > 1 and day_file.exists():
+                if day_file.stat().st_size > entries[-1]["sizes"].get("2023-01-02", 0):
+                    break
+            time.sleep(0.05)
+
+        proc.kill()
+        proc.wait()
+
+    done = [did for entry in journal_entries(journal) for did in entry["dids"]]
+    assert done == dids[:3]
+
+    with StandIn(repos) as server:
+        run_script("crawl-repos", *args(server, "killed", "--resume"))
+        fetched = [params["did"] for _, params in server.requests]
+
+    assert fetched == dids[3:]
+    assert read_days(str(tmp_path / "killed")) == read_days(str(tmp_path / "full"))
@@ -0,0 +1,37 @@
+import csv
+import json
+import sqlite3
+
+from standin import EXPORT, StandIn
+
+
+def op(i: int, did: str) -> dict[str, str]:
+    return {"did": did, "createdAt": f"2023-01-01T00:00:{i:02d}.000Z"}
+
+
+def read_dids(path) -> list[str]:
+    with open(path) as f:
+        return [row[0] for row in csv.reader(f)][1:]
+
+
+def test_resume_after_record_without_created_at(run_script, tmp_path):
+    first = [op(0, "did:plc:a"), op(1, "did:plc:b"), op(2, "did:plc:c")]
+    page = [first[0], {"did": "did:plc:bad"}, *first[1:]]
+
+    with StandIn(operations=first) as server:
+        server.script(EXPORT, 200, body="\n".join(map(json.dumps, page)).encode())
+        run_script("crawl-users", "--plc", server.url)
+
+    assert read_dids(tmp_path / "dids.csv") == ["did:plc:a", "did:plc:b", "did:plc:c"]
+
+    # The export has moved on, with a later operation for a DID already seen
+    later = [op(3, "did:plc:c"), op(4, "did:plc:d")]
+    with StandIn(operations=first + later) as server:
+        run_script("crawl-users", "--plc", server.url, "--resume")
+
+    dids = read_dids(tmp_path / "dids.csv")
+    assert dids == ["did:plc:a", "did:plc:b", "did:plc:c", "did:plc:d"]
+
+    with sqlite3.connect(tmp_path / "dids.sqlite") as db:
+        index = [did for (did,) in db.execute("SELECT did FROM dids ORDER BY id")]
+    assert index == dids
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from scipy.sparse import random as sparse_random
+
+from social_dynamics import csrgraph
+from social_dynamics.csrgraph import CSRGraph, save_csr
+
+
+@pytest.fixture
+def adj():
+    return sparse_random(50, 50, density=0.08, format="csr", random_state=0)
+
+
+@pytest.mark.parametrize("in_edges", [True, False])
+def test_round_trip(adj, tmp_path, monkeypatch, in_edges):
+    monkeypatch.setattr(csrgraph, "CHUNK_EDGES", 16)  # Several chunks
+    save_csr(adj, str(tmp_path), in_edges=in_edges)
+    graph = CSRGraph(str(tmp_path))
+    dense = adj.toarray() != 0
+
+    assert len(graph) == 50 and graph.n_edges == adj.nnz
+    assert (graph.to_csr().toarray() == dense).all()
+    assert graph.out_degree().tolist() == dense.sum(axis=1).tolist()
+    assert graph.in_degree().tolist() == dense.sum(axis=0).tolist()
+    assert graph.in_degree([3, 7]).tolist() == dense[:, [3, 7]].sum(axis=0).tolist()
+    assert (graph.rows(10, 20).toarray() == dense[10:20]).all()
+
+    for node in [0, 17, 49]:
+        assert graph.neighbors(node).tolist() == np.flatnonzero(dense[node]).tolist()
+        for other in range(50):
+            assert graph.has_edge(node, other) == dense[node, other]
+
+    if in_edges:
+        assert graph.in_neighbors(5).tolist() == np.flatnonzero(dense[:, 5]).tolist()
+    else:
+        with pytest.raises(ValueError):
+            graph.in_neighbors(5)
+
+
+def test_subgraph(adj, tmp_path):
+    save_csr(adj, str(tmp_path))
+    graph = CSRGraph(str(tmp_path))
+    dense = adj.toarray() != 0
+
+    nodes = np.array([40, 3, 17, 8, 25, 0])
+    assert (graph.subgraph(nodes).toarray() == dense[np.ix_(nodes, nodes)]).all()
+    assert graph.subgraph([]).shape == (0, 0)
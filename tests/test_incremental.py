@@ -0,0 +1,63 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from social_dynamics.incremental import MetricsTracker
+from social_dynamics.temporal import DAY_US, TemporalEdges, to_us
+
+N_NODES = 30
+
+
+@pytest.fixture
+def edges():
+    """Sparse enough that unfollows split components, with a few triangles."""
+
+    rng = np.random.default_rng(1)
+    n = 150
+    times = to_us("2023-01-01") + rng.integers(0, 8 * DAY_US, n)
+    return TemporalEdges.from_events(
+        rng.integers(0, N_NODES, n),
+        rng.integers(0, N_NODES, n),
+        times,
+        rng.random(n) < 0.6,
+        N_NODES,
+    )
+
+
+def undirected(adj) -> nx.Graph:
+    graph = nx.Graph()
+    graph.add_nodes_from(range(adj.shape[0]))
+    graph.add_edges_from(zip(*adj.nonzero()))
+    return graph
+
+
+@pytest.mark.parametrize("exact", [True, False])
+def test_tracker_matches_networkx(edges, exact):
+    tracker = MetricsTracker(N_NODES, exact_components=exact)
+    seen = nx.Graph()
+
+    for (day, changes), end in zip(edges.iter_days(), edges.day_starts[1:] - 1):
+        row = tracker.update(day, changes)
+        adj = edges.graph_at(int(end))
+        graph = undirected(adj)
+        seen.add_edges_from(graph.edges)
+
+        triangles = nx.triangles(graph)
+        assert tracker.triangles6.tolist() == [6 * triangles[v] for v in range(N_NODES)]
+        assert row["triangles"] == sum(triangles.values()) // 3
+        assert row["edges"] == adj.nnz
+        assert row["undirected_edges"] == graph.number_of_edges()
+        assert row["transitivity"] == pytest.approx(nx.transitivity(graph))
+
+        active = [v for v in graph if graph.degree(v)]
+        clustering = nx.clustering(graph)
+        assert row["avg_clustering"] == pytest.approx(
+            np.mean([clustering[v] for v in active])
+        )
+
+        # Without exact components, removals are ignored
+        components = list(nx.connected_components(graph if exact else seen))
+        assert row["components"] == sum(len(c) > 1 for c in components)
+        assert row["largest_component"] == max(map(len, components), default=1)
+
+    assert tracker.table().height == len(edges.days)
@@ -0,0 +1,84 @@
+import csv
+import time
+
+import requests
+from ratelimit import RateLimiter
+from standin import EXPORT, StandIn
+
+OPERATIONS = [
+    {"did": f"did:plc:user{i:02d}", "createdAt": f"2023-01-01T00:00:{i:02d}.000Z"}
+    for i in range(5)
+]
+
+
+def test_waits_retry_after_on_429():
+    limiter = RateLimiter(100.0, burst=10, backoff=0.01)
+
+    with StandIn(operations=OPERATIONS) as server:
+        server.script(EXPORT, 429, {"Retry-After": "0.3"})
+        start = time.monotonic()
+        res = limiter.get(requests.Session(), f"{server.url}{EXPORT}")
+        elapsed = time.monotonic() - start
+
+    assert res.status_code == 200
+    assert elapsed >= 0.3
+    assert limiter.counters == {
+        "requests": 2,
+        "throttles": 1,
+        "retries": 1,
+        "failures": 0,
+    }
+    assert limiter.rate < limiter.max_rate  # Halved, then one success added back
+
+
+def test_backs_off_on_5xx(monkeypatch):
+    limiter = RateLimiter(100.0, burst=10)
+    attempts = []
+
+    def delay(attempt: int) -> float:
+        attempts.append(attempt)
+        return 0.0
+
+    monkeypatch.setattr(limiter, "delay", delay)
+
+    with StandIn(operations=OPERATIONS) as server:
+        server.script(EXPORT, 503)
+        server.script(EXPORT, 502)
+        res = limiter.get(requests.Session(), f"{server.url}{EXPORT}")
+
+    assert res.status_code == 200
+    assert attempts == [0, 1]
+    assert limiter.counters["retries"] == 2
+    assert limiter.counters["throttles"] == 0
+    assert limiter.rate == limiter.max_rate
+
+
+def test_returns_last_error_after_max_retries():
+    limiter = RateLimiter(100.0, burst=10, max_retries=2, backoff=0.01)
+
+    with StandIn(operations=OPERATIONS) as server:
+        for _ in range(3):
+            server.script(EXPORT, 503)
+        res = limiter.get(requests.Session(), f"{server.url}{EXPORT}")
+
+    assert res.status_code == 503
+    assert limiter.counters == {
+        "requests": 3,
+        "throttles": 0,
+        "retries": 2,
+        "failures": 1,
+    }
+
+
+def test_crawl_users_retries_throttled_export(run_script, tmp_path):
+    with StandIn(operations=OPERATIONS) as server:
+        server.script(EXPORT, 429, {"Retry-After": "0"})
+        out = run_script("crawl-users", "--plc", server.url)
+
+    assert "'throttles': 1" in out
+
+    with open(tmp_path / "dids.csv") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["did", "created_at"]] + [
+        [op["did"], op["createdAt"]] for op in OPERATIONS
+    ]
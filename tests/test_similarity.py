@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from social_dynamics.similarity import similarity, similarity_blocks, top_k_similar
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(0).normal(size=(60, 4))
+
+
+def dense_top_k(sims: np.ndarray, k: int, columns: np.ndarray) -> np.ndarray:
+    order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+    return columns[order]
+
+
+@pytest.mark.parametrize("power", [1.0, 2.0])
+def test_top_k_matches_dense_kernel(values, power):
+    sims = similarity(values, values, power)
+    np.fill_diagonal(sims, -1)  # Not its own candidate
+
+    idx, top = top_k_similar(values, 5, power)
+    assert idx.tolist() == dense_top_k(sims, 5, np.arange(60)).tolist()
+    assert top == pytest.approx(np.take_along_axis(sims, idx, axis=1))
+
+
+def test_top_k_among_candidates(values):
+    candidates = np.arange(0, 60, 3)
+    sims = similarity(values, values[candidates])
+    sims[candidates, np.arange(len(candidates))] = -1
+
+    idx, top = top_k_similar(values, 4, candidates=candidates)
+    assert idx.tolist() == dense_top_k(sims, 4, candidates).tolist()
+    assert top == pytest.approx(np.sort(sims, axis=1)[:, ::-1][:, :4])
+
+
+def test_fewer_candidates_than_k(values):
+    idx, top = top_k_similar(values, 3, candidates=np.array([0, 1]))
+    assert idx[0].tolist() == [1, -1, -1] and top[0, 1:].tolist() == [0, 0]
+    assert (idx[2:, :2] >= 0).all() and (idx[2:, 2] == -1).all()
+
+
+def test_blocks_match_dense_kernel(values):
+    blocks = list(similarity_blocks(values, 2.0, block_rows=7))
+    assert len(blocks) == 9
+    assert np.vstack([sims for _, sims in blocks]) == pytest.approx(
+        similarity(values, values, 2.0)
+    )
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from sink import DaySink, truncate_day_files
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_rejects_invalid_day(tmp_path):
+    with DaySink(str(tmp_path)) as sink:
+        with pytest.raises(ValueError):
+            sink.write_line("2023-01/../x", "{}\n")
+        with pytest.raises(ValueError):
+            sink.write_line('2023-01 {"', "{}\n")
+
+        sink.write_line("2023-01-01", "{}\n")
+
+    assert os.listdir(tmp_path) == ["2023-01-01.jsonl"]
+
+
+def test_failed_day_does_not_stop_writer(tmp_path):
+    os.mkdir(tmp_path / "2023-01-02.jsonl")  # Can't be opened as a file
+
+    with DaySink(str(tmp_path), flush_bytes=1) as sink:
+        sink.write_line("2023-01-01", "a\n")
+        sink.write_line("2023-01-02", "b\n")
+        sink.write_line("2023-01-03", "c\n")
+
+    assert sink.error is None
+    assert sink.write_errors == 1
+    assert read(tmp_path / "2023-01-01.jsonl") == "a\n"
+    assert read(tmp_path / "2023-01-03.jsonl") == "c\n"
+
+
+def test_checkpoint_rollback(tmp_path):
+    checkpoints = []
+    with DaySink(str(tmp_path)) as sink:
+        sink.write_line("2023-01-01", "a\n")
+        sink.checkpoint(checkpoints.append)
+        sink.write_line("2023-01-01", "b\n")
+        sink.write_line("2023-01-02", "c\n")
+
+    truncate_day_files(str(tmp_path), checkpoints[0])
+
+    assert os.listdir(tmp_path) == ["2023-01-01.jsonl"]
+    assert read(tmp_path / "2023-01-01.jsonl") == "a\n"
@@ -0,0 +1,14 @@
+import pytest
+
+from social_dynamics.sweep import parse_grid
+
+
+def test_parse_grid_types_values_as_defaults():
+    assert parse_grid(["w=0.1,0.3", "k=5"]) == {"w": [0.1, 0.3], "k": [5]}
+
+
+def test_parse_grid_rejects_unmodeled_values():
+    assert parse_grid(["xevents=1"]) == {"xevents": [1]}
+
+    with pytest.raises(ValueError, match="xevents is not modeled"):
+        parse_grid(["xevents=0,1"])
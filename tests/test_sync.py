@@ -0,0 +1,161 @@
+import json
+import os
+import typing as t
+from datetime import datetime, timezone
+
+import pytest
+from journal import Journal
+from standin import GET_REPO, StandIn, build_car
+from sync import RepoStore
+from utils import s32
+
+DID = "did:plc:alice"
+OTHER = "did:plc:bob"
+
+
+def rkey(i: int) -> str:
+    return f"app.bsky.feed.like/3k{i:04d}"
+
+
+def like(i: int, day: str) -> tuple[str, dict[str, t.Any]]:
+    return rkey(i), {
+        "$type": "app.bsky.feed.like",
+        "createdAt": f"{day}T00:00:00.000Z",
+        "subject": {"uri": f"at://did:plc:other/app.bsky.feed.post/{i}"},
+    }
+
+
+def rev_at(time: str) -> str:
+    moment = datetime.fromisoformat(time).replace(tzinfo=timezone.utc)
+    return s32.encode(int(moment.timestamp() * 1e6)) + "22"
+
+
+BEFORE = dict([like(0, "2023-01-01"), like(1, "2023-01-02"), like(2, "2023-01-02")])
+AFTER = {
+    **{key: record for key, record in BEFORE.items() if key != rkey(1)},
+    **dict([like(3, "2023-01-03"), like(4, "2023-01-05")]),
+}
+REV = "3jzfcijpj2z2a"
+DIFF_REV = rev_at("2023-01-04T12:00:00")
+
+OTHER_CAR = build_car(OTHER, dict([like(9, "2023-01-02")]))
+DIFF = build_car(DID, AFTER, rev=DIFF_REV, omit=BEFORE.keys())
+
+
+@pytest.fixture
+def sync(run_script, tmp_path):
+    with open(tmp_path / "dids.csv", "w") as f:
+        f.write("did,created_at\n")
+        for did in [DID, OTHER]:
+            f.write(f"{did},2023-01-01T00:00:00.000Z\n")
+
+    def run(server: StandIn, *args: str) -> str:
+        return run_script(
+            "crawl-repos",
+            *["--relay", server.url, "--workers", "1", "--sync", "state.db"],
+            *["--dids", "dids.csv", "--out", "stream", "--journal", "journal"],
+            *args,
+        )
+
+    return run
+
+
+def read_days(out) -> dict[str, list[dict]]:
+    days = {}
+    for name in sorted(os.listdir(out)):
+        with open(os.path.join(out, name)) as f:
+            days[name] = [json.loads(line) for line in f]
+
+    return days
+
+
+def first_server() -> StandIn:
+    return StandIn({DID: build_car(DID, BEFORE, rev=REV), OTHER: OTHER_CAR})
+
+
+def second_server() -> StandIn:
+    return StandIn(
+        {DID: build_car(DID, AFTER, rev=DIFF_REV), OTHER: OTHER_CAR},
+        diffs={(DID, REV): DIFF},
+    )
+
+
+def new_lines(before, after) -> dict[str, list[dict]]:
+    """Lines appended to each day file, checking nothing else changed."""
+
+    added = {}
+    for name, lines in after.items():
+        assert lines[: len(before.get(name, []))] == before.get(name, [])
+        if len(lines) > len(before.get(name, [])):
+            added[name] = lines[len(before.get(name, [])) :]
+
+    return added
+
+
+def test_sync_appends_created_and_deleted_records(sync, tmp_path):
+    with first_server() as server:
+        sync(server)
+    before = read_days(tmp_path / "stream")
+
+    assert [record["$type"] for record in before["2023-01-01.jsonl"]] == [
+        "app.bsky.actor.profile",
+        "app.bsky.feed.like",
+        "app.bsky.actor.profile",
+    ]
+
+    with second_server() as server:
+        sync(server)
+        assert (GET_REPO, {"did": DID, "since": REV}) in server.requests
+    after = read_days(tmp_path / "stream")
+
+    assert new_lines(before, after) == {
+        "2023-01-03.jsonl": [
+            {"did": DID, "uri": f"at://{DID}/{rkey(3)}", **AFTER[rkey(3)]}
+        ],
+        "2023-01-04.jsonl": [
+            {
+                "did": DID,
+                "$type": "com.atproto.repo.deleteRecord",
+                "createdAt": "2023-01-04T12:00:00.000000Z",
+                "uri": f"at://{DID}/{rkey(1)}",
+                "collection": "app.bsky.feed.like",
+            }
+        ],
+        "2023-01-05.jsonl": [
+            {"did": DID, "uri": f"at://{DID}/{rkey(4)}", **AFTER[rkey(4)]}
+        ],
+    }
+
+    store = RepoStore(str(tmp_path / "state.db"))
+    assert store.get(DID).rev == DIFF_REV
+    store.close()
+
+
+def test_failed_diff_is_resumed(sync, load_script, tmp_path):
+    with first_server() as server:
+        sync(server)
+    with second_server() as server:
+        sync(server)
+    expected = read_days(tmp_path / "stream")
+
+    # Start over, and cut off every attempt at the diff
+    (tmp_path / "state.db").unlink()
+    with first_server() as server:
+        sync(server)
+    with second_server() as server:
+        for _ in range(load_script("crawl-repos").REPO_ATTEMPTS):
+            server.script(GET_REPO, 200, body=DIFF[: len(DIFF) // 2])
+        sync(server)
+
+    entries = list(Journal(str(tmp_path / "journal")).entries())
+    assert [did for entry in entries for did in entry["dids"]] == [OTHER]
+
+    store = RepoStore(str(tmp_path / "state.db"))
+    assert store.get(DID).rev == REV
+    store.close()
+
+    with second_server() as server:
+        sync(server, "--resume")
+        assert [params["did"] for _, params in server.requests] == [DID]
+
+    assert read_days(tmp_path / "stream") == expected
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from social_dynamics.temporal import DAY_US, TemporalEdges, to_us
+
+N_NODES = 6
+START = to_us("2023-01-01")
+
+
+@pytest.fixture
+def events():
+    """Follows and removals over five days, with repeats and same-time pairs."""
+
+    rng = np.random.default_rng(0)
+    n = 200
+    src = rng.integers(0, N_NODES, n)
+    dst = rng.integers(0, N_NODES, n)
+    times = START + rng.integers(0, 5 * DAY_US, n)
+    times[:20] = times[20:40]  # Events at the same instant
+    times[40] = START + 2 * DAY_US  # Exactly at midnight
+    is_follow = rng.random(n) < 0.6
+
+    return src, dst, times, is_follow
+
+
+def replay(events, time: int) -> set[tuple[int, int]]:
+    """Follows standing at `time`, applying each event in turn."""
+
+    src, dst, times, is_follow = events
+    following = {}
+    # Removals come after follows at the same instant
+    for i in np.lexsort((~is_follow, times)):
+        if times[i] <= time and src[i] != dst[i]:
+            following[int(src[i]), int(dst[i])] = bool(is_follow[i])
+
+    return {pair for pair, follows in following.items() if follows}
+
+
+def edge_set(adj) -> set[tuple[int, int]]:
+    coo = adj.tocoo()
+    return set(zip(coo.row.tolist(), coo.col.tolist()))
+
+
+def test_graph_at_matches_replay(events):
+    edges = TemporalEdges.from_events(*events, N_NODES)
+
+    for time in [START - 1, START + 2 * DAY_US, *events[2][::10], START + 9 * DAY_US]:
+        assert edge_set(edges.graph_at(int(time))) == replay(events, time)
+
+
+def test_iter_days_adds_up_to_replay(events):
+    edges = TemporalEdges.from_events(*events, N_NODES)
+    assert edges.days == [f"2023-01-0{day}" for day in range(1, 6)]
+
+    graph: set[tuple[int, int]] = set()
+    for (day, changes), end in zip(edges.iter_days(), edges.day_starts[1:] - 1):
+        added = set(zip(changes.added_src.tolist(), changes.added_dst.tolist()))
+        removed = set(zip(changes.removed_src.tolist(), changes.removed_dst.tolist()))
+
+        assert not added & graph and removed <= graph
+        graph = (graph - removed) | added
+        assert graph == replay(events, end)
+
+
+def test_save_and_load(events, tmp_path):
+    edges = TemporalEdges.from_events(*events, N_NODES)
+    edges.save(str(tmp_path / "edges"))
+    loaded = TemporalEdges.load(str(tmp_path / "edges"))
+
+    time = START + 3 * DAY_US
+    assert edge_set(loaded.graph_at(time)) == edge_set(edges.graph_at(time))
+    assert loaded.days == edges.days
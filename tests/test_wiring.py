@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from social_dynamics import wiring
+from social_dynamics.similarity import SimilarityIndex
+
+
+@pytest.fixture
+def patched(monkeypatch):
+    """(isolated voter, contact) pairs added by `wire` after its capacity pass."""
+
+    pairs = []
+    patch = wiring._patch
+
+    def record(values, isolated, *args):
+        contacts = patch(values, isolated, *args)
+        pairs.extend(zip(isolated.tolist(), contacts.tolist()))
+        return contacts
+
+    monkeypatch.setattr(wiring, "_patch", record)
+    return pairs
+
+
+def test_duplicates_are_wired_within_capacity(patched):
+    # The nearest candidates of the identical voters are each other
+    rng = np.random.default_rng(0)
+    values = np.vstack([np.zeros((4, 3)), rng.random((26, 3)) + 1])
+    holds = np.ones((30, 1), dtype=bool)
+    capacity = np.full((1, 30), 2)
+
+    conn = wiring.wire(values, holds, capacity, n_candidates=4, seed=0)
+
+    isolated = [voter for voter, _ in patched]
+    assert not set(isolated) & set(range(4))
+
+    # Edges from the capacity pass never exceed it
+    wired = conn.toarray()
+    for voter, contact in patched:
+        wired[voter, contact] = wired[contact, voter] = 0
+    assert (wired.sum(axis=1) <= capacity[0]).all()
+    assert (wired == wired.T).all() and not wired.diagonal().any()
+
+    assert (np.diff(conn.indptr) >= 1).all()
+    assert (capacity == 2).all()
+
+
+def test_isolated_voters_get_a_similar_contact(patched):
+    rng = np.random.default_rng(1)
+    values = rng.random((20, 3))
+    holds = np.ones((20, 1), dtype=bool)
+    capacity = np.full((1, 20), 3)
+    capacity[0, 5] = 0
+
+    conn = wiring.wire(values, holds, capacity, n_candidates=4, seed=0)
+
+    # A voter without capacity is never drawn, and gets one contact regardless
+    assert 5 in [voter for voter, _ in patched]
+    contacts = conn.indices[conn.indptr[5] : conn.indptr[6]]
+    assert len(contacts) == 1
+
+    nearest, _ = SimilarityIndex(values).query(4, [5])
+    assert contacts[0] in nearest[0]
+
+
+def test_distinct_query_skips_identical_candidates():
+    values = np.array([[0.0], [0.0], [0.0], [1.0], [2.0], [3.0]])
+    index = SimilarityIndex(values)
+
+    idx, sims = index.query(2, [0])
+    assert idx.tolist() == [[1, 2]] and sims.tolist() == [[0, 0]]
+
+    idx, sims = index.query(4, [0], distinct=True)
+    assert idx.tolist() == [[3, 4, 5, -1]]
+    assert (sims[0, :3] > 0).all() and sims[0, 3] == 0
+
+    # Rows with and without duplicates are queried together
+    idx, _ = index.query(1, [0, 5], distinct=True)
+    assert idx.tolist() == [[3], [4]]